@@ -0,0 +1,159 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from .run import BASELINE_DIR, RESULTS_DIR, _git_commit
+
+# Cold-start report. Imports src.main in fresh interpreters, the way a
+# serverless instance boots, and reports the wall time to a ready app, the
+# app's own startup phases (services and each router, see
+# src/routers/__init__.py) and a per-module breakdown from `python -X
+# importtime` (routers are loaded through importlib, so their own code is
+# only in the app phases; their imports still show up in the breakdown).
+# Baselines work like bench.run; --compare exits non-zero when
+# the total regresses by more than --threshold percent.
+#
+#   cd backend
+#   python -m bench.coldstart --save-baseline
+#   python -m bench.coldstart --compare bench/baselines/coldstart.json
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENTRY = "src.main"
+
+_TIMED_IMPORT = (
+    "import json, time\n"
+    "started = time.perf_counter()\n"
+    f"import {ENTRY} as main\n"
+    "print(json.dumps({'total': time.perf_counter() - started, 'phases': main.import_seconds}))\n"
+)
+
+
+def _child_env() -> dict:
+    env = dict(os.environ)
+    # Bytecode is cached on a real deployment too; only imports are measured.
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return env
+
+
+def timed_import() -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", _TIMED_IMPORT], cwd=BACKEND_DIR, env=_child_env(), capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def parse_importtime(stderr: str) -> Tuple[Dict[str, float], Dict[str, float]]:
+    """Return ({module: cumulative seconds} for the entry's direct imports, {src.* module: cumulative seconds})."""
+    children: Dict[str, float] = {}
+    pending: Dict[str, float] = {}
+    own: Dict[str, float] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        name = name[1:]
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        name = name.strip()
+        seconds = int(cumulative) / 1e6
+        if name.startswith("src."):
+            own[name] = seconds
+        if depth == 1:
+            pending[name] = seconds
+        elif depth == 0:
+            if name == ENTRY:
+                children = pending
+            pending = {}
+    return children, own
+
+
+def importtime() -> Tuple[Dict[str, float], Dict[str, float]]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {ENTRY}"],
+        cwd=BACKEND_DIR, env=_child_env(), capture_output=True, text=True, check=True,
+    )
+    return parse_importtime(result.stderr)
+
+
+def _median(samples: List[Dict[str, float]]) -> Dict[str, float]:
+    keys = {key for sample in samples for key in sample}
+    return {key: statistics.median(sample.get(key, 0.0) for sample in samples) for key in keys}
+
+
+def measure(runs: int) -> dict:
+    # One throwaway run so every measured run finds the bytecode cache warm.
+    timed_import()
+    timed = [timed_import() for _ in range(runs)]
+    breakdowns = [importtime() for _ in range(runs)]
+    return {
+        "total_ms": statistics.median(sample["total"] for sample in timed) * 1000,
+        "phases_ms": {key: value * 1000 for key, value in _median([sample["phases"] for sample in timed]).items()},
+        "imports_ms": {key: value * 1000 for key, value in _median([children for children, _ in breakdowns]).items()},
+        "own_modules_ms": {key: value * 1000 for key, value in _median([own for _, own in breakdowns]).items()},
+    }
+
+
+def report(result: dict, top: int, baseline: Optional[dict] = None) -> List[str]:
+    def change(section: str, key: str, value: float) -> str:
+        if baseline is None:
+            return ""
+        old = baseline.get(section, {}).get(key) if section else baseline.get("total_ms")
+        if not old:
+            return f"{'new':>9}"
+        return f"{(value - old) / old * 100:+8.1f}%"
+
+    lines = [f"{'ready in':<40}{result['total_ms']:>9.1f} ms{change('', 'total_ms', result['total_ms'])}", "", "app phases"]
+    for name, value in sorted(result["phases_ms"].items(), key=lambda item: -item[1]):
+        if name != "total":
+            lines.append(f"  {name:<38}{value:>9.1f} ms{change('phases_ms', name, value)}")
+    lines += ["", f"top {top} imports of {ENTRY} (cumulative, with -X importtime overhead)"]
+    for name, value in sorted(result["imports_ms"].items(), key=lambda item: -item[1])[:top]:
+        lines.append(f"  {name:<38}{value:>9.1f} ms{change('imports_ms', name, value)}")
+    return lines
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Measure how long the API takes to import in a fresh process.")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per measurement (median is reported)")
+    parser.add_argument("--top", type=int, default=15, help="imports to list")
+    parser.add_argument("--out", help="where to write the JSON result (default: bench/results/coldstart-<time>.json)")
+    parser.add_argument("--save-baseline", action="store_true", help="also store the result as bench/baselines/coldstart.json")
+    parser.add_argument("--compare", help="baseline JSON to compare this run against")
+    parser.add_argument("--threshold", type=float, default=20, help="allowed regression of the total, in percent")
+    args = parser.parse_args(argv)
+
+    result = measure(args.runs)
+    result["meta"] = {
+        "runs": args.runs,
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "recorded_at": datetime.now().isoformat(timespec="seconds"),
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    out = args.out or os.path.join(RESULTS_DIR, f"coldstart-{datetime.now():%Y%m%d-%H%M%S}.json")
+    paths = [out] + ([os.path.join(BASELINE_DIR, "coldstart.json")] if args.save_baseline else [])
+    for path in paths:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+    if baseline:
+        print(f"compared with {args.compare} (commit {baseline.get('meta', {}).get('commit')})")
+    print("\n".join(report(result, args.top, baseline)))
+    print("wrote " + ", ".join(paths))
+    if baseline and baseline.get("total_ms") and result["total_ms"] > baseline["total_ms"] * (1 + args.threshold / 100):
+        sys.exit(f"cold start regressed by more than {args.threshold:g}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,592 @@
+import asyncio
+import random
+import re
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import jwt
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+# In-memory stand-in for the parts of PostgREST, GoTrue and the RPC functions
+# that the backend talks to, so the API can be load tested without touching
+# a real Supabase project. It understands the query syntax postgrest-py
+# generates (select with embeds, eq/gt/lt/in/ilike/cs filters, or/and
+# groups, order, limit/offset, single) and injects a configurable latency
+# into every round trip to model the network hop to Supabase.
+
+JWT_SECRET = "bench-jwt-secret"
+
+# (table, embedded table) -> foreign key column on the outer table
+FOREIGN_KEYS = {
+    ("likes", "tracks"): "track_id",
+    ("comments", "users"): "user_id",
+    ("live_streams", "users"): "dj_id",
+    ("dj_applications", "users"): "user_id",
+}
+
+# Columns with equality indexes in the fake.
+INDEXED_COLUMNS = ("id", "user_id", "track_id")
+
+# Columns that must be unique together, reported as Postgres error 23505.
+UNIQUE_KEYS = {
+    "likes": ("track_id", "user_id"),
+}
+
+# Mirrors the vip_plans seed in src/main.py: plan -> (price, days)
+VIP_PLANS = {"monthly": (99, 30), "yearly": (999, 365), "lifetime": (4999, None)}
+
+GENRES = ["pop", "hip-hop", "edm", "rock", "r&b", "jazz", "classical", "thangyat"]
+WORDS = [
+    "love", "night", "dream", "fire", "rain", "summer", "heart", "city", "moon", "gold",
+    "yangon", "mandalay", "bagan", "river", "dance", "remix", "live", "acoustic", "mix", "beat",
+    "အချစ်", "ည", "မိုး", "နှလုံး", "ကြယ်", "သီချင်း",
+]
+
+
+def create_token(user_id: str, expires_in: int = 24 * 3600) -> str:
+    now = datetime.now()
+    claims = {"sub": user_id, "aud": "authenticated", "role": "authenticated", "exp": now + timedelta(seconds=expires_in), "iat": now}
+    return jwt.encode(claims, JWT_SECRET, algorithm="HS256")
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.tables: Dict[str, List[dict]] = {}
+        self.idempotency: Dict[Tuple[str, str], dict] = {}
+        # Equality indexes and sorted copies, built on first use so reads
+        # don't spend the fake's CPU on full scans and sorts.
+        self._indexes: Dict[Tuple[str, str], Dict[str, List[dict]]] = {}
+        self._ordered: Dict[Tuple[str, str], List[dict]] = {}
+
+    def rows(self, table: str) -> List[dict]:
+        return self.tables.setdefault(table, [])
+
+    def lookup(self, table: str, column: str, value: Any) -> List[dict]:
+        index = self._indexes.get((table, column))
+        if index is None:
+            index = self._indexes[(table, column)] = {}
+            for row in self.rows(table):
+                index.setdefault(str(row.get(column)), []).append(row)
+        return index.get(str(value), [])
+
+    def find(self, table: str, row_id: Any) -> Optional[dict]:
+        rows = self.lookup(table, "id", row_id)
+        return rows[0] if rows else None
+
+    def ordered(self, table: str, order: str) -> List[dict]:
+        rows = self._ordered.get((table, order))
+        if rows is None:
+            rows = self._ordered[(table, order)] = _sort(self.rows(table), order)
+        return rows
+
+    def changed(self, table: str, reindex: bool = False) -> None:
+        for key in [key for key in self._ordered if key[0] == table]:
+            del self._ordered[key]
+        if reindex:
+            for key in [key for key in self._indexes if key[0] == table]:
+                del self._indexes[key]
+
+    def insert(self, table: str, row: dict) -> dict:
+        row = {"id": str(uuid.uuid4()), "created_at": datetime.now().isoformat(), **row}
+        unique = UNIQUE_KEYS.get(table)
+        if unique:
+            for existing in self.lookup(table, unique[0], row.get(unique[0])):
+                if all(str(existing.get(column)) == str(row.get(column)) for column in unique):
+                    raise UniqueViolation(table)
+        self.rows(table).append(row)
+        for (indexed_table, column), index in self._indexes.items():
+            if indexed_table == table:
+                index.setdefault(str(row.get(column)), []).append(row)
+        self.changed(table)
+        return row
+
+    def delete(self, table: str, rows: List[dict]) -> None:
+        removed = {id(row) for row in rows}
+        self.tables[table] = [row for row in self.rows(table) if id(row) not in removed]
+        for (indexed_table, column), index in self._indexes.items():
+            if indexed_table == table:
+                for row in rows:
+                    bucket = index.get(str(row.get(column)), [])
+                    bucket[:] = [other for other in bucket if id(other) not in removed]
+        self.changed(table)
+
+    def seed(self, users: int, tracks: int, likes_per_user: int, comments_per_track: int, seed: int = 0) -> List[dict]:
+        """Fill the tables deterministically; returns the user rows."""
+        rng = random.Random(seed)
+        start = datetime(2024, 1, 1)
+        user_rows = []
+        for i in range(users):
+            user_rows.append(self.insert("users", {
+                "email": f"user{i}@bench.example.com",
+                "username": f"user{i}",
+                "avatar_url": None,
+                "is_vip": False,
+                "vip_expires_at": None,
+                "is_dj": i % 20 == 0,
+                "is_admin": i == 0,
+                "wallet_balance": 1_000_000_000,
+                "created_at": (start + timedelta(minutes=i)).isoformat(),
+                "updated_at": (start + timedelta(minutes=i)).isoformat(),
+            }))
+        track_rows = []
+        for i in range(tracks):
+            created_at = (start + timedelta(minutes=7 * i + rng.randint(0, 6))).isoformat()
+            track_rows.append(self.insert("tracks", {
+                "title": " ".join(rng.sample(WORDS, rng.randint(1, 3))).title(),
+                "artist": f"Artist {rng.randint(1, max(1, tracks // 10))}",
+                "description": None,
+                "audio_url": f"https://cdn.bench.local/audio/{i}.mp3",
+                "cover_url": None,
+                "duration": rng.randint(90, 420),
+                "genre": rng.choice(GENRES),
+                "tags": rng.sample(WORDS, 2),
+                "is_vip_only": rng.random() < 0.1,
+                "is_approved": True,
+                "user_id": rng.choice(user_rows)["id"],
+                "plays_count": rng.randint(0, 100_000),
+                "likes_count": 0,
+                "created_at": created_at,
+                "updated_at": created_at,
+            }))
+        for user in user_rows:
+            for track in rng.sample(track_rows, min(likes_per_user, len(track_rows))):
+                self.insert("likes", {"track_id": track["id"], "user_id": user["id"]})
+                track["likes_count"] += 1
+        for track in track_rows:
+            for _ in range(comments_per_track):
+                self.insert("comments", {
+                    "track_id": track["id"],
+                    "user_id": rng.choice(user_rows)["id"],
+                    "content": " ".join(rng.sample(WORDS, 4)),
+                })
+        return user_rows
+
+
+class UniqueViolation(Exception):
+    pass
+
+
+def _split_top_level(text: str) -> List[str]:
+    # Split on commas outside parentheses, braces and double quotes.
+    parts, depth, quoted, current = [], 0, False, []
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char in "({":
+            depth += 1
+        elif not quoted and char in ")}":
+            depth -= 1
+        elif char == "," and depth == 0 and not quoted:
+            parts.append("".join(current).strip())
+            current = []
+            continue
+        current.append(char)
+    if current:
+        parts.append("".join(current).strip())
+    return [part for part in parts if part]
+
+
+def _unquote(value: str) -> str:
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return value[1:-1]
+    return value
+
+
+def _coerce(row_value: Any, value: str) -> Any:
+    if isinstance(row_value, bool):
+        return value.lower() == "true"
+    if isinstance(row_value, (int, float)):
+        try:
+            return type(row_value)(float(value))
+        except ValueError:
+            return value
+    return value
+
+
+def _compare(row_value: Any, value: str, op: Callable[[Any, Any], bool]) -> bool:
+    if row_value is None:
+        return False
+    target = _coerce(row_value, value)
+    if isinstance(target, str):
+        row_value = str(row_value)
+    return op(row_value, target)
+
+
+def _like(pattern: str) -> "re.Pattern":
+    escaped = re.escape(pattern).replace("\\*", ".*").replace("%", ".*")
+    return re.compile(f"^{escaped}$", re.IGNORECASE | re.DOTALL)
+
+
+def _condition(column: str, expression: str) -> Callable[[dict], bool]:
+    negate = expression.startswith("not.")
+    if negate:
+        expression = expression[4:]
+    op, _, value = expression.partition(".")
+    if op == "eq":
+        value = _unquote(value)
+        check = lambda row: _compare(row.get(column), value, lambda a, b: a == b)
+    elif op == "neq":
+        value = _unquote(value)
+        check = lambda row: not _compare(row.get(column), value, lambda a, b: a == b)
+    elif op in ("gt", "gte", "lt", "lte"):
+        value = _unquote(value)
+        compare = {
+            "gt": lambda a, b: a > b, "gte": lambda a, b: a >= b,
+            "lt": lambda a, b: a < b, "lte": lambda a, b: a <= b,
+        }[op]
+        check = lambda row: _compare(row.get(column), value, compare)
+    elif op == "in":
+        values = {_unquote(item) for item in _split_top_level(value.strip("()"))}
+        check = lambda row: str(row.get(column)) in values
+    elif op in ("like", "ilike"):
+        pattern = _like(_unquote(value))
+        check = lambda row: row.get(column) is not None and bool(pattern.match(str(row.get(column))))
+    elif op == "cs":
+        wanted = {_unquote(item) for item in _split_top_level(value.strip("{}"))}
+        check = lambda row: wanted.issubset(set(row.get(column) or ()))
+    elif op == "is":
+        check = lambda row: (row.get(column) is None) if value == "null" else (row.get(column) is (value == "true"))
+    else:
+        raise ValueError(f"Unsupported filter operator: {op}")
+    return (lambda row: not check(row)) if negate else check
+
+
+def _group(kind: str, body: str) -> Callable[[dict], bool]:
+    conditions = []
+    for term in _split_top_level(body):
+        match = re.match(r"^(and|or)\((.*)\)$", term)
+        if match:
+            conditions.append(_group(match.group(1), match.group(2)))
+        else:
+            column, _, expression = term.partition(".")
+            conditions.append(_condition(column, expression))
+    combine = all if kind == "and" else any
+    return lambda row: combine(condition(row) for condition in conditions)
+
+
+def _parse_select(select: str) -> Tuple[List[str], List[Tuple[str, List[str]]]]:
+    columns, embeds = [], []
+    for item in _split_top_level(select or "*"):
+        match = re.match(r"^(\w+)\((.*)\)$", item)
+        if match:
+            embeds.append((match.group(1), [column.strip() for column in _split_top_level(match.group(2))]))
+        else:
+            columns.append(item)
+    return columns, embeds
+
+
+def _project(row: dict, columns: List[str]) -> dict:
+    if not columns or "*" in columns:
+        return dict(row)
+    return {column: row.get(column) for column in columns}
+
+
+def _sort_key(value: Any) -> Tuple[int, Any]:
+    # Nulls last; mixed types compare as strings.
+    if value is None:
+        return (1, "")
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (0, value)
+    return (0, str(value))
+
+
+def _sort(rows: List[dict], order: str) -> List[dict]:
+    rows = list(rows)
+    for term in reversed(order.split(",")):
+        column, _, direction = term.partition(".")
+        rows.sort(key=lambda row: _sort_key(row.get(column)), reverse=direction.startswith("desc"))
+    return rows
+
+
+def create_app(db: FakeDatabase, latency: float = 0.0, jitter: float = 0.0, seed: int = 0) -> Starlette:
+    """Return the fake Supabase ASGI app; latency and jitter are in seconds."""
+    rng = random.Random(seed)
+
+    async def delay() -> None:
+        wait = latency + (rng.uniform(-jitter, jitter) if jitter else 0)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def error(status: int, code: str, message: str) -> JSONResponse:
+        return JSONResponse({"code": code, "message": message, "details": None, "hint": None}, status_code=status)
+
+    def bearer_user(request: Request) -> Optional[str]:
+        token = request.headers.get("authorization", "").replace("Bearer ", "")
+        try:
+            return jwt.decode(token, JWT_SECRET, algorithms=["HS256"], audience="authenticated")["sub"]
+        except jwt.InvalidTokenError:
+            return None
+
+    def select_rows(table: str, request: Request) -> List[dict]:
+        params = request.query_params
+        conditions = []
+        for key, value in params.multi_items():
+            if key in ("select", "order", "limit", "offset", "columns", "on_conflict"):
+                continue
+            if key in ("or", "and"):
+                conditions.append(_group(key, value.strip()[1:-1]))
+            else:
+                conditions.append(_condition(key, value))
+        candidates = db.ordered(table, params["order"]) if "order" in params else db.rows(table)
+        for column in INDEXED_COLUMNS:
+            if params.get(column, "").startswith("eq."):
+                candidates = db.lookup(table, column, _unquote(params[column][3:]))
+                if "order" in params:
+                    candidates = _sort(candidates, params["order"])
+                break
+        rows = [row for row in candidates if all(condition(row) for condition in conditions)]
+        offset = int(params.get("offset", 0))
+        limit = params.get("limit")
+        return rows[offset:offset + int(limit)] if limit is not None else rows[offset:]
+
+    def shape(table: str, rows: List[dict], select: Optional[str]) -> List[dict]:
+        columns, embeds = _parse_select(select)
+        shaped = []
+        for row in rows:
+            out = _project(row, columns)
+            for embedded, embedded_columns in embeds:
+                foreign_key = FOREIGN_KEYS.get((table, embedded), f"{embedded.rstrip('s')}_id")
+                target = db.find(embedded, row.get(foreign_key))
+                out[embedded] = _project(target, embedded_columns) if target else None
+            shaped.append(out)
+        return shaped
+
+    def respond(request: Request, table: str, rows: List[dict], status: int = 200) -> Response:
+        data = shape(table, rows, request.query_params.get("select"))
+        if "return=minimal" in request.headers.get("prefer", ""):
+            return Response(status_code=204 if status == 200 else status)
+        if request.headers.get("accept") == "application/vnd.pgrst.object+json":
+            if len(data) != 1:
+                return error(406, "PGRST116", "JSON object requested, multiple (or no) rows returned")
+            return JSONResponse(data[0], status_code=status)
+        return JSONResponse(data, status_code=status)
+
+    async def rest(request: Request) -> Response:
+        await delay()
+        table = request.path_params["table"]
+        if request.method in ("GET", "HEAD"):
+            return respond(request, table, select_rows(table, request))
+        if request.method == "POST":
+            body = await request.json()
+            try:
+                rows = [db.insert(table, row) for row in (body if isinstance(body, list) else [body])]
+            except UniqueViolation:
+                return error(409, "23505", f'duplicate key value violates unique constraint "{table}_unique"')
+            return respond(request, table, rows, 201)
+        if request.method == "PATCH":
+            body = await request.json()
+            rows = select_rows(table, request)
+            for row in rows:
+                row.update(body)
+            db.changed(table, reindex=True)
+            return respond(request, table, rows)
+        if request.method == "DELETE":
+            rows = select_rows(table, request)
+            db.delete(table, rows)
+            return respond(request, table, rows)
+        return error(405, "PGRST000", "Method not allowed")
+
+    def ledger(user_id: Optional[str], key: str, apply: Callable[[dict], dict]) -> Response:
+        user = db.find("users", user_id) if user_id else None
+        if user_id is None:
+            return error(400, "P0001", "not_authenticated")
+        if user is None:
+            return error(400, "P0001", "user_not_found")
+        stored = db.idempotency.get((user_id, key))
+        if stored is None:
+            result = apply(user)
+            if "error" in result:
+                return error(400, "P0001", result["error"])
+            stored = db.idempotency[(user_id, key)] = result
+        return JSONResponse(stored)
+
+    def admin_stats(hours: int, days: int) -> dict:
+        # Timestamps in the fake are naive; they are treated as UTC.
+        recharges = [row for row in db.rows("wallet_transactions") if row.get("type") == "recharge"]
+        purchases = db.rows("vip_purchases")
+        now = datetime.now()
+        events = [(row["created_at"], "registrations", 1) for row in db.rows("users")]
+        events += [(row["created_at"], "uploads", 1) for row in db.rows("tracks")]
+        events += [(row["created_at"], "vip_purchases", 1) for row in purchases]
+        events += [(row["created_at"], "vip_revenue", row["amount"]) for row in purchases]
+        events += [(row["created_at"], "recharges", 1) for row in recharges]
+        events += [(row["created_at"], "recharge_amount", row["amount"]) for row in recharges]
+        events += [(row["created_at"], "dj_applications", 1) for row in db.rows("dj_applications")]
+
+        def rollup(width: timedelta, count: int) -> List[dict]:
+            truncate = (lambda at: at.replace(minute=0, second=0, microsecond=0)) if width == timedelta(hours=1) else (
+                lambda at: at.replace(hour=0, minute=0, second=0, microsecond=0)
+            )
+            since = truncate(now) - width * (count - 1)
+            sums: Dict[Tuple[datetime, str], float] = {}
+            for created_at, metric, value in events:
+                at = datetime.fromisoformat(created_at)
+                if at >= since:
+                    key = (truncate(at), metric)
+                    sums[key] = sums.get(key, 0) + value
+            return [{"start": start.isoformat() + "+00:00", "metric": metric, "value": value} for (start, metric), value in sums.items()]
+
+        users = db.rows("users")
+        return {
+            "totals": {
+                "users": len(users),
+                "vip_users": sum(1 for user in users if user.get("is_vip") and (
+                    user.get("vip_expires_at") is None or datetime.fromisoformat(user["vip_expires_at"]) > now
+                )),
+                "tracks": len(db.rows("tracks")),
+                "vip_purchases": len(purchases),
+                "vip_revenue": sum(row["amount"] for row in purchases),
+                "recharges": len(recharges),
+                "recharge_amount": sum(row["amount"] for row in recharges),
+                "dj_applications": len(db.rows("dj_applications")),
+                "dj_applications_pending": sum(1 for row in db.rows("dj_applications") if row.get("status") == "pending"),
+            },
+            "hourly": rollup(timedelta(hours=1), hours),
+            "daily": rollup(timedelta(days=1), days),
+        }
+
+    async def rpc(request: Request) -> Response:
+        await delay()
+        function = request.path_params["function"]
+        params = await request.json()
+        if function == "apply_track_counter_deltas":
+            totals = []
+            for delta in params["deltas"]:
+                track = db.find("tracks", delta["track_id"])
+                if track:
+                    track["likes_count"] = max(track["likes_count"] + delta["likes"], 0)
+                    track["plays_count"] = max(track["plays_count"] + delta["plays"], 0)
+                    totals.append({"track_id": track["id"], "likes_count": track["likes_count"], "plays_count": track["plays_count"]})
+            db.changed("tracks")
+            return JSONResponse(totals)
+        if function == "apply_live_stream_viewer_deltas":
+            totals = []
+            for delta in params["deltas"]:
+                stream = db.find("live_streams", delta["stream_id"])
+                if stream:
+                    stream["viewers_count"] = max((stream.get("viewers_count") or 0) + delta["viewers"], 0)
+                    totals.append({"stream_id": stream["id"], "viewers_count": stream["viewers_count"]})
+            return JSONResponse(totals)
+        if function == "ledger_purchase_vip":
+            if params["p_plan_type"] not in VIP_PLANS:
+                return error(400, "P0001", "unknown_plan")
+            price, days = VIP_PLANS[params["p_plan_type"]]
+            if params["p_amount"] != price:
+                return error(400, "P0001", "price_mismatch")
+
+            def purchase(user: dict) -> dict:
+                if user["wallet_balance"] < price:
+                    return {"error": "insufficient_balance"}
+                expires_at = (datetime.now() + timedelta(days=days)).isoformat() if days else None
+                user["wallet_balance"] -= price
+                user["is_vip"], user["vip_expires_at"] = True, expires_at
+                db.insert("vip_purchases", {"user_id": user["id"], "plan_type": params["p_plan_type"], "amount": price})
+                db.insert("wallet_transactions", {"user_id": user["id"], "type": "vip_purchase", "amount": -price})
+                return {"wallet_balance": user["wallet_balance"], "is_vip": True, "vip_expires_at": expires_at}
+            return ledger(bearer_user(request), params["p_idempotency_key"], purchase)
+        if function == "ledger_recharge_wallet":
+            if params["p_amount"] <= 0:
+                return error(400, "P0001", "invalid_amount")
+            def recharge(user: dict) -> dict:
+                user["wallet_balance"] += params["p_amount"]
+                db.insert("wallet_transactions", {"user_id": user["id"], "type": "recharge", "amount": params["p_amount"]})
+                return {"wallet_balance": user["wallet_balance"]}
+            return ledger(bearer_user(request), params["p_idempotency_key"], recharge)
+        if function == "admin_stats_snapshot":
+            admin = db.find("users", bearer_user(request) or "")
+            if not admin or not admin.get("is_admin"):
+                return error(400, "P0001", "not_admin")
+            return JSONResponse(admin_stats(params["p_hours"], params["p_days"]))
+        return error(404, "PGRST202", f"Could not find the function public.{function}")
+
+    async def auth_user(request: Request) -> Response:
+        await delay()
+        user_id = bearer_user(request)
+        if user_id is None:
+            return JSONResponse({"code": 401, "msg": "invalid JWT"}, status_code=401)
+        user = db.find("users", user_id) or {}
+        return JSONResponse({
+            "id": user_id,
+            "aud": "authenticated",
+            "role": "authenticated",
+            "email": user.get("email"),
+            "app_metadata": {},
+            "user_metadata": {},
+            "created_at": user.get("created_at", datetime.now().isoformat()),
+        })
+
+    async def jwks(request: Request) -> Response:
+        return JSONResponse({"keys": []})
+
+    def auth_user_body(user_id: str, email: Optional[str]) -> dict:
+        return {
+            "id": user_id,
+            "aud": "authenticated",
+            "role": "authenticated",
+            "email": email,
+            "app_metadata": {},
+            "user_metadata": {},
+            "created_at": datetime.now().isoformat(),
+        }
+
+    async def signup(request: Request) -> Response:
+        # Email confirmation pending: a user but no session.
+        await delay()
+        body = await request.json()
+        return JSONResponse(auth_user_body(str(uuid.uuid4()), body.get("email")))
+
+    async def token(request: Request) -> Response:
+        # grant_type=password; any password is accepted for seeded emails.
+        await delay()
+        body = await request.json()
+        users = db.lookup("users", "email", body.get("email"))
+        if not users:
+            return JSONResponse({"error": "invalid_grant", "error_description": "Invalid login credentials"}, status_code=400)
+        user_id = str(users[0]["id"])
+        return JSONResponse({
+            "access_token": create_token(user_id),
+            "refresh_token": uuid.uuid4().hex,
+            "token_type": "bearer",
+            "expires_in": 24 * 3600,
+            "user": auth_user_body(user_id, body.get("email")),
+        })
+
+    async def logout(request: Request) -> Response:
+        await delay()
+        if bearer_user(request) is None:
+            return JSONResponse({"code": 401, "msg": "invalid JWT"}, status_code=401)
+        return Response(status_code=204)
+
+    return Starlette(routes=[
+        Route("/rest/v1/rpc/{function}", rpc, methods=["POST"]),
+        Route("/rest/v1/{table}", rest, methods=["GET", "HEAD", "POST", "PATCH", "DELETE"]),
+        Route("/auth/v1/user", auth_user, methods=["GET"]),
+        Route("/auth/v1/.well-known/jwks.json", jwks, methods=["GET"]),
+        Route("/auth/v1/signup", signup, methods=["POST"]),
+        Route("/auth/v1/token", token, methods=["POST"]),
+        Route("/auth/v1/logout", logout, methods=["POST"]),
+    ])
+
+
+def serve(port: int, options: dict, ready) -> None:
+    """Seed a database, report its user and track ids on `ready`, then serve it.
+
+    Runs in its own process so the fake's work doesn't share a GIL with the
+    API being measured.
+    """
+    import uvicorn
+
+    db = FakeDatabase()
+    users = db.seed(options["users"], options["tracks"], options["likes_per_user"], options["comments_per_track"], options["seed"])
+    ready.send({
+        "users": [user["id"] for user in users],
+        "tracks": [track["id"] for track in db.rows("tracks")],
+        "likes": [(like["user_id"], like["track_id"]) for like in db.rows("likes")],
+    })
+    ready.close()
+    app = create_app(db, options["latency"], options["jitter"], options["seed"])
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
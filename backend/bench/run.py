@@ -0,0 +1,365 @@
+import argparse
+import asyncio
+import importlib
+import json
+import multiprocessing
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from .fake_supabase import GENRES, JWT_SECRET, WORDS, create_token, serve
+
+# Load-test harness. Starts the fake Supabase (fake_supabase.py) in its own
+# process with seeded data and injected latency, points the API at it, then
+# drives a weighted mix of requests from concurrent virtual users through the
+# real ASGI app in backend/src/main.py. Reports requests/sec, latency
+# percentiles and upstream calls per request for each route, and writes the
+# result as a JSON baseline that later runs can be compared against.
+#
+# Baselines are machine-specific and not committed: record one on the
+# revision you are comparing against (git stash / checkout it), then switch
+# back and compare on the same machine.
+#
+#   cd backend
+#   python -m bench.run --mix browse --save-baseline
+#   python -m bench.run --mix browse --compare bench/baselines/browse.json
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+class VirtualUser:
+    def __init__(self, user_id: Optional[str], liked: set):
+        self.user_id = user_id
+        self.headers = {"Authorization": f"Bearer {create_token(user_id)}"} if user_id else {}
+        self.liked = liked
+
+
+class Workload:
+    def __init__(self, users: List[str], tracks: List[str], likes: List[Tuple[str, str]], anonymous_share: float, rng: random.Random):
+        liked: Dict[str, set] = {}
+        for user_id, track_id in likes:
+            liked.setdefault(user_id, set()).add(track_id)
+        self.users = [VirtualUser(user_id, liked.get(user_id, set())) for user_id in users]
+        self.tracks = tracks
+        self.anonymous_share = anonymous_share
+        self.rng = rng
+
+    def user(self, signed_in: bool = False) -> VirtualUser:
+        if not signed_in and self.rng.random() < self.anonymous_share:
+            return VirtualUser(None, set())
+        return self.rng.choice(self.users)
+
+    def track(self) -> str:
+        # Skewed towards a hot head of the catalogue, like real listening.
+        index = min(int(self.rng.paretovariate(1.2)) - 1, len(self.tracks) - 1)
+        return self.tracks[index]
+
+
+# An operation returns (name, method, path, route template, user, json body).
+Operation = Callable[[Workload], Tuple[str, str, str, str, VirtualUser, Optional[dict]]]
+
+
+def browse_tracks(w: Workload):
+    offset = w.rng.randrange(5) * 20
+    return "browse_tracks", "GET", f"/tracks?limit=20&offset={offset}", "/tracks", w.user(), None
+
+
+def browse_genre(w: Workload):
+    return "browse_genre", "GET", f"/tracks?limit=20&genre={w.rng.choice(GENRES)}", "/tracks", w.user(), None
+
+
+def search(w: Workload):
+    return "search", "GET", f"/tracks?query={w.rng.choice(WORDS)}&limit=20", "/tracks", w.user(), None
+
+
+def trending(w: Workload):
+    return "trending", "GET", f"/tracks/trending?genre={w.rng.choice(GENRES)}&limit=20", "/tracks/trending", w.user(), None
+
+
+def track_detail(w: Workload):
+    return "track_detail", "GET", f"/tracks/{w.track()}", "/tracks/{track_id}", w.user(), None
+
+
+def comments(w: Workload):
+    return "comments", "GET", f"/tracks/{w.track()}/comments?limit=20", "/tracks/{track_id}/comments", w.user(), None
+
+
+def play(w: Workload):
+    return "play", "POST", f"/tracks/{w.track()}/play", "/tracks/{track_id}/play", w.user(), None
+
+
+def like_toggle(w: Workload):
+    # Like a track the user hasn't liked, or unlike one they have, so the
+    # steady state neither exhausts the catalogue nor piles up 409s.
+    user = w.user(signed_in=True)
+    track_id = w.track()
+    if track_id in user.liked:
+        user.liked.discard(track_id)
+        return "unlike", "POST", f"/tracks/{track_id}/unlike", "/tracks/{track_id}/unlike", user, None
+    user.liked.add(track_id)
+    return "like", "POST", f"/tracks/{track_id}/like", "/tracks/{track_id}/like", user, None
+
+
+def users_me(w: Workload):
+    return "users_me", "GET", "/users/me", "/users/me", w.user(signed_in=True), None
+
+
+def favorites(w: Workload):
+    return "favorites", "GET", "/users/me/favorites?limit=20", "/users/me/favorites", w.user(signed_in=True), None
+
+
+def vip_purchase(w: Workload):
+    return "vip_purchase", "POST", "/vip/purchase", "/vip/purchase", w.user(signed_in=True), {"plan_type": "monthly", "amount": 99}
+
+
+MIXES: Dict[str, List[Tuple[Operation, int]]] = {
+    # A listener session: mostly catalogue reads, some likes and plays.
+    "browse": [
+        (browse_tracks, 20), (browse_genre, 10), (trending, 10), (search, 15), (track_detail, 15), (comments, 5),
+        (play, 8), (like_toggle, 8), (users_me, 5), (favorites, 3), (vip_purchase, 1),
+    ],
+    "read": [(browse_tracks, 35), (browse_genre, 10), (trending, 10), (search, 20), (track_detail, 25)],
+    "write": [(like_toggle, 45), (play, 45), (vip_purchase, 10)],
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _percentile(sorted_values: List[float], percentile: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(percentile / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, cwd=os.path.dirname(__file__)
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def start_fake_supabase(args) -> Tuple[multiprocessing.Process, str, dict]:
+    port = _free_port()
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    options = {
+        "users": args.users, "tracks": args.tracks, "likes_per_user": args.likes_per_user,
+        "comments_per_track": args.comments_per_track, "seed": args.seed,
+        "latency": args.latency_ms / 1000, "jitter": args.jitter_ms / 1000,
+    }
+    process = multiprocessing.get_context("spawn").Process(target=serve, args=(port, options, sender), daemon=True)
+    process.start()
+    seeded = receiver.recv()
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.1):
+                break
+        except OSError:
+            time.sleep(0.05)
+    return process, url, seeded
+
+
+def load_app(supabase_url: str):
+    # The API reads its settings at import time, so configure it first.
+    os.environ["SUPABASE_URL"] = supabase_url
+    os.environ["SUPABASE_ANON_KEY"] = "bench-anon-key"
+    os.environ["SUPABASE_JWT_SECRET"] = JWT_SECRET
+    os.environ.setdefault("SLOW_REQUEST_SAMPLE_RATE", "0")
+    # Virtual users share one client IP; measure the API, not the rate limits.
+    for group in ("AUTH", "SEARCH", "WRITES", "READS"):
+        os.environ.setdefault(f"RATE_LIMIT_{group}", "off")
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    main = importlib.import_module("src.main")
+    metrics = importlib.import_module("src.metrics")
+    search = importlib.import_module("src.search")
+    return main.app, metrics, search
+
+
+async def drive(app, metrics, search, workload: Workload, mix: List[Tuple[Operation, int]], args) -> dict:
+    operations, weights = zip(*mix)
+    samples: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    routes: Dict[str, Tuple[str, str]] = {}
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app), httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(200):
+            if search.search_index.ready:
+                break
+            await asyncio.sleep(0.05)
+
+        recording = False
+
+        async def virtual_user() -> None:
+            while not stopped.is_set():
+                operation = workload.rng.choices(operations, weights)[0]
+                name, method, path, route, user, body = operation(workload)
+                headers = dict(user.headers)
+                if name == "vip_purchase":
+                    headers["Idempotency-Key"] = str(uuid.uuid4())
+                start = time.perf_counter()
+                try:
+                    response = await client.request(method, path, headers=headers, json=body)
+                    failed = response.status_code >= 400 and response.status_code != 409
+                except httpx.HTTPError:
+                    failed = True
+                elapsed = time.perf_counter() - start
+                if recording:
+                    samples.setdefault(name, []).append(elapsed)
+                    routes[name] = (method, route)
+                    if failed:
+                        errors[name] = errors.get(name, 0) + 1
+
+        stopped = asyncio.Event()
+        users = [asyncio.create_task(virtual_user()) for _ in range(args.concurrency)]
+        await asyncio.sleep(args.warmup)
+        for metric in (metrics.http_request_upstream_calls, metrics.upstream_request_duration, metrics.upstream_requests_total):
+            metric.values.clear()
+        recording = True
+        started = time.perf_counter()
+        await asyncio.sleep(args.duration)
+        recording = False
+        elapsed = time.perf_counter() - started
+        stopped.set()
+        await asyncio.gather(*users)
+
+    report: Dict[str, dict] = {}
+    for name, values in sorted(samples.items()):
+        values.sort()
+        method, route = routes[name]
+        calls = metrics.http_request_upstream_calls.values.get((method, route))
+        report[name] = {
+            "route": f"{method} {route}",
+            "requests": len(values),
+            "errors": errors.get(name, 0),
+            "rps": round(len(values) / elapsed, 2),
+            "mean_ms": round(sum(values) / len(values) * 1000, 3),
+            "p50_ms": round(_percentile(values, 50) * 1000, 3),
+            "p95_ms": round(_percentile(values, 95) * 1000, 3),
+            "p99_ms": round(_percentile(values, 99) * 1000, 3),
+            # Shared by operations that hit the same route
+            "upstream_calls_per_request": round(calls[-1] / calls[-2], 3) if calls and calls[-2] else 0.0,
+        }
+    every = sorted(value for values in samples.values() for value in values)
+    total = {
+        "requests": len(every),
+        "errors": sum(errors.values()),
+        "rps": round(len(every) / elapsed, 2),
+        "p50_ms": round(_percentile(every, 50) * 1000, 3),
+        "p95_ms": round(_percentile(every, 95) * 1000, 3),
+        "p99_ms": round(_percentile(every, 99) * 1000, 3),
+        "upstream_calls_per_request": round(
+            sum(series[-1] for series in metrics.http_request_upstream_calls.values.values())
+            / max(1, sum(series[-2] for series in metrics.http_request_upstream_calls.values.values())), 3
+        ),
+    }
+    upstream = {
+        f"{service} {target} {operation}": {
+            "calls": int(series[-2]),
+            "mean_ms": round(series[-1] / series[-2] * 1000, 3),
+        }
+        for (service, target, operation), series in sorted(metrics.upstream_request_duration.values.items())
+        if series[-2]
+    }
+    return {"total": total, "routes": report, "upstream": upstream}
+
+
+def compare(result: dict, baseline: dict) -> List[str]:
+    def change(new: float, old: float) -> str:
+        if not old:
+            return "   n/a"
+        return f"{(new - old) / old * 100:+6.1f}%"
+
+    lines = [f"{'operation':<16}{'rps':>10}{'Δrps':>9}{'p95 ms':>10}{'Δp95':>9}{'p99 ms':>10}{'Δp99':>9}{'calls':>7}{'Δcalls':>8}"]
+    for name, stats in [("total", result["total"])] + list(result["routes"].items()):
+        old = baseline["total"] if name == "total" else baseline["routes"].get(name, {})
+        calls = stats.get("upstream_calls_per_request", 0)
+        lines.append(
+            f"{name:<16}{stats['rps']:>10.1f}{change(stats['rps'], old.get('rps', 0)):>9}"
+            f"{stats['p95_ms']:>10.2f}{change(stats['p95_ms'], old.get('p95_ms', 0)):>9}"
+            f"{stats['p99_ms']:>10.2f}{change(stats['p99_ms'], old.get('p99_ms', 0)):>9}"
+            f"{calls:>7.2f}{calls - old.get('upstream_calls_per_request', 0):>+8.2f}"
+        )
+    return lines
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Load-test the API against a local fake Supabase.")
+    parser.add_argument("--mix", choices=sorted(MIXES), default="browse")
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=20, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=3, help="unmeasured seconds before recording")
+    parser.add_argument("--latency-ms", type=float, default=20, help="injected latency per Supabase round trip")
+    parser.add_argument("--jitter-ms", type=float, default=5)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--tracks", type=int, default=2000)
+    parser.add_argument("--likes-per-user", type=int, default=20)
+    parser.add_argument("--comments-per-track", type=int, default=3)
+    parser.add_argument("--anonymous-share", type=float, default=0.3, help="share of read requests sent without a token")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="where to write the JSON result (default: bench/results/<mix>-<time>.json)")
+    parser.add_argument("--save-baseline", action="store_true", help="also store the result as bench/baselines/<mix>.json")
+    parser.add_argument("--compare", help="baseline JSON to compare this run against")
+    args = parser.parse_args(argv)
+
+    process, url, seeded = start_fake_supabase(args)
+    try:
+        app, metrics, search = load_app(url)
+        workload = Workload(seeded["users"], seeded["tracks"], seeded["likes"], args.anonymous_share, random.Random(args.seed))
+        result = asyncio.run(drive(app, metrics, search, workload, MIXES[args.mix], args))
+    finally:
+        process.terminate()
+        process.join()
+
+    result["meta"] = {
+        "mix": args.mix,
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "latency_ms": args.latency_ms,
+        "jitter_ms": args.jitter_ms,
+        "users": args.users,
+        "tracks": args.tracks,
+        "seed": args.seed,
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "recorded_at": datetime.now().isoformat(timespec="seconds"),
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    out = args.out or os.path.join(RESULTS_DIR, f"{args.mix}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    paths = [out] + ([os.path.join(BASELINE_DIR, f"{args.mix}.json")] if args.save_baseline else [])
+    for path in paths:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+    if baseline:
+        print(f"compared with {args.compare} (commit {baseline.get('meta', {}).get('commit')})")
+        print("\n".join(compare(result, baseline)))
+    else:
+        print(json.dumps({"total": result["total"], "routes": result["routes"]}, indent=2))
+    print("wrote " + ", ".join(paths))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+import os
+import sys
+
+# Entry point for Vercel's Python runtime (see vercel.json), which loads this
+# file as a top-level module. The app lives in the src package and uses
+# relative imports, so it is imported as src.main with backend/ on the path,
+# the same way `uvicorn src.main:app` runs it locally.
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.main import app  # noqa: E402
+
+__all__ = ["app"]
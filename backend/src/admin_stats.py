@@ -0,0 +1,180 @@
+import asyncio
+import collections
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from postgrest.exceptions import APIError
+
+from .db import get_client
+
+logger = logging.getLogger(__name__)
+
+# Admin dashboard statistics (GET /admin/stats) kept in memory. The write
+# routes (register, upload, VIP purchase, wallet recharge, DJ application and
+# approval) bump running totals and hourly/daily rollups as they succeed, so
+# reading the dashboard never scans a table. The admin_stats_snapshot RPC
+# recomputes everything in the database; it runs on the first read and again
+# in the background once a read finds the last one older than
+# reconcile_interval, which picks up other workers' writes, VIP expiries and
+# anything written outside the API. The RPC only answers admins, so it is
+# sent with the reading admin's access token (like src/ledger.py).
+
+TOTALS = (
+    "users", "vip_users", "tracks", "vip_purchases", "vip_revenue",
+    "recharges", "recharge_amount", "dj_applications", "dj_applications_pending",
+)
+ROLLUPS = ("registrations", "uploads", "vip_purchases", "vip_revenue", "recharges", "recharge_amount", "dj_applications")
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+
+def _bucket(at: float, width: int) -> int:
+    return int(at // width) * width
+
+
+def _timestamp(value: str) -> float:
+    at = datetime.fromisoformat(value)
+    if at.tzinfo is None:
+        at = at.replace(tzinfo=timezone.utc)
+    return at.timestamp()
+
+
+def _iso(at: float) -> str:
+    return datetime.fromtimestamp(at, timezone.utc).isoformat()
+
+
+class AdminStats:
+    def __init__(self, hours: int = 48, days: int = 30, reconcile_interval: float = 300.0, max_seen_keys: int = 10_000):
+        self.hours = hours
+        self.days = days
+        self.reconcile_interval = reconcile_interval
+        self.max_seen_keys = max_seen_keys
+        self.totals: Dict[str, float] = dict.fromkeys(TOTALS, 0)
+        # bucket start (epoch seconds, UTC) -> rollup -> value
+        self._hourly: Dict[int, Dict[str, float]] = {}
+        self._daily: Dict[int, Dict[str, float]] = {}
+        # Ledger idempotency keys already counted, so a retried purchase or
+        # recharge that returns the stored result is not counted twice.
+        self._seen_keys: "collections.OrderedDict[Tuple[str, str], None]" = collections.OrderedDict()
+        self.reconciled_at: Optional[float] = None
+        self._reconciling: Optional[asyncio.Future] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.reconciled_at is not None
+
+    def _first_time(self, user_id: str, idempotency_key: Optional[str]) -> bool:
+        if not idempotency_key:
+            return True
+        key = (user_id, idempotency_key)
+        if key in self._seen_keys:
+            return False
+        self._seen_keys[key] = None
+        if len(self._seen_keys) > self.max_seen_keys:
+            self._seen_keys.popitem(last=False)
+        return True
+
+    def _add(self, totals: Dict[str, float], rollups: Dict[str, float], at: Optional[float] = None) -> None:
+        at = time.time() if at is None else at
+        for name, delta in totals.items():
+            self.totals[name] = max(self.totals[name] + delta, 0)
+        for buckets, width in ((self._hourly, HOUR), (self._daily, DAY)):
+            bucket = buckets.setdefault(_bucket(at, width), {})
+            for name, delta in rollups.items():
+                bucket[name] = bucket.get(name, 0) + delta
+        self._trim(at)
+
+    def _trim(self, now: float) -> None:
+        for buckets, width, keep in ((self._hourly, HOUR, self.hours), (self._daily, DAY, self.days)):
+            oldest = _bucket(now, width) - (keep - 1) * width
+            for start in [start for start in buckets if start < oldest]:
+                del buckets[start]
+
+    def user_registered(self) -> None:
+        self._add({"users": 1}, {"registrations": 1})
+
+    def track_uploaded(self, count: int = 1) -> None:
+        self._add({"tracks": count}, {"uploads": count})
+
+    def vip_purchased(self, user_id: str, amount: float, new_vip: bool, idempotency_key: Optional[str] = None) -> None:
+        if self._first_time(user_id, idempotency_key):
+            self._add(
+                {"vip_purchases": 1, "vip_revenue": amount, "vip_users": 1 if new_vip else 0},
+                {"vip_purchases": 1, "vip_revenue": amount},
+            )
+
+    def wallet_recharged(self, user_id: str, amount: float, idempotency_key: Optional[str] = None) -> None:
+        if self._first_time(user_id, idempotency_key):
+            self._add({"recharges": 1, "recharge_amount": amount}, {"recharges": 1, "recharge_amount": amount})
+
+    def dj_applied(self) -> None:
+        self._add({"dj_applications": 1, "dj_applications_pending": 1}, {"dj_applications": 1})
+
+    def dj_application_reviewed(self) -> None:
+        self._add({"dj_applications_pending": -1}, {})
+
+    def replace(self, snapshot: dict, at: Optional[float] = None) -> None:
+        """Load totals and rollups computed by admin_stats_snapshot."""
+        self.totals = {name: snapshot["totals"].get(name) or 0 for name in TOTALS}
+        self._hourly, self._daily = {}, {}
+        for key, buckets, width in (("hourly", self._hourly, HOUR), ("daily", self._daily, DAY)):
+            for row in snapshot.get(key) or ():
+                if row["metric"] in ROLLUPS:
+                    bucket = buckets.setdefault(_bucket(_timestamp(row["start"]), width), {})
+                    bucket[row["metric"]] = row["value"]
+        self.reconciled_at = time.time() if at is None else at
+        self._trim(self.reconciled_at)
+
+    async def _reconcile(self, access_token: str) -> None:
+        builder = get_client().rpc("admin_stats_snapshot", {"p_hours": self.hours, "p_days": self.days})
+        builder.headers["Authorization"] = f"Bearer {access_token}"
+        try:
+            response = await builder.execute()
+        except APIError as e:
+            if e.message == "not_admin":
+                raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+            raise
+        self.replace(response.data)
+
+    def reconcile(self, access_token: str) -> "asyncio.Future":
+        # Concurrent callers share the reconciliation in progress.
+        if self._reconciling is None:
+            self._reconciling = asyncio.ensure_future(self._reconcile(access_token))
+            self._reconciling.add_done_callback(self._reconciled)
+        return self._reconciling
+
+    def _reconciled(self, future: "asyncio.Future") -> None:
+        self._reconciling = None
+        if not future.cancelled() and future.exception() is not None:
+            logger.warning("Admin stats reconciliation failed: %s", future.exception())
+
+    async def snapshot(self, access_token: str) -> dict:
+        if not self.ready:
+            await asyncio.shield(self.reconcile(access_token))
+        elif time.time() - self.reconciled_at >= self.reconcile_interval:
+            self.reconcile(access_token)
+        return self.as_dict()
+
+    def _series(self, buckets: Dict[int, Dict[str, float]], width: int, count: int, now: float) -> List[dict]:
+        # Dense series, oldest first, with empty buckets as zeros.
+        newest = _bucket(now, width)
+        series = []
+        for start in range(newest - (count - 1) * width, newest + 1, width):
+            bucket = buckets.get(start, {})
+            series.append({"start": _iso(start), **{name: bucket.get(name, 0) for name in ROLLUPS}})
+        return series
+
+    def as_dict(self, now: Optional[float] = None) -> dict:
+        now = time.time() if now is None else now
+        users = self.totals["users"]
+        return {
+            "totals": dict(self.totals),
+            "vip_conversion_rate": self.totals["vip_users"] / users if users else 0.0,
+            "hourly": self._series(self._hourly, HOUR, self.hours, now),
+            "daily": self._series(self._daily, DAY, self.days, now),
+            "reconciled_at": _iso(self.reconciled_at) if self.reconciled_at is not None else None,
+        }
@@ -0,0 +1,329 @@
+import asyncio
+import collections
+import contextvars
+import ipaddress
+import math
+import os
+import time
+from typing import Deque, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+import httpx
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .metrics import admission_rejections_total, upstream_coalesced_total, upstream_in_flight, upstream_queue_wait, upstream_shed_total
+from .responses import dumps
+from .singleflight import SingleFlight
+
+# Admission control in front of Supabase, so a traffic spike turns into fast
+# 429/503 answers instead of a growing queue and slow upstream round trips.
+#
+# AdmissionMiddleware applies a token bucket per user (verified bearer token)
+# or per client IP, with separate limits per route group: auth (always per
+# IP), search, writes and reads. Limits are "rate,burst" in requests per
+# second, from RATE_LIMIT_<GROUP>; "off" disables a group. Behind a reverse
+# proxy (Vercel, nginx, a load balancer) the socket peer is the proxy, so
+# TRUSTED_PROXIES lists the proxy addresses or networks (comma-separated, or
+# "*" for whatever the direct peer is) whose X-Forwarded-For / X-Real-IP
+# headers name the real client; other peers' headers are ignored.
+#
+# AdmissionTransport wraps the shared httpx transport from db.py. Identical
+# concurrent GETs (same URL and headers, so the same caller identity) share
+# one round trip, and at most UPSTREAM_MAX_IN_FLIGHT calls run at once; a
+# bounded number wait up to UPSTREAM_MAX_WAIT seconds for a slot and the rest
+# are shed with UpstreamOverloaded, which the middleware answers with 503.
+
+DEFAULT_LIMITS = {
+    "auth": "0.2,10",
+    "search": "3,15",
+    "writes": "5,30",
+    "reads": "30,120",
+}
+
+UPSTREAM_MAX_IN_FLIGHT = int(os.getenv("UPSTREAM_MAX_IN_FLIGHT", "64"))
+UPSTREAM_MAX_QUEUE = int(os.getenv("UPSTREAM_MAX_QUEUE", "256"))
+UPSTREAM_MAX_WAIT = float(os.getenv("UPSTREAM_MAX_WAIT", "2"))
+# Paths that are never rate limited.
+EXEMPT_PATHS = ("/", "/metrics")
+
+
+class UpstreamOverloaded(Exception):
+    pass
+
+
+class TrustedProxies:
+    def __init__(self, value: str):
+        entries = [entry.strip() for entry in value.split(",") if entry.strip()]
+        self.any_peer = "*" in entries
+        self.networks = [ipaddress.ip_network(entry, strict=False) for entry in entries if entry != "*"]
+
+    def __bool__(self) -> bool:
+        return self.any_peer or bool(self.networks)
+
+    def _listed(self, address: str) -> bool:
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        return any(ip in network for network in self.networks)
+
+    def client_ip(self, scope: Scope) -> Optional[str]:
+        """The caller's address: the socket peer, or the forwarded client when the peer is a trusted proxy."""
+        client = scope.get("client")
+        peer = client[0] if client else None
+        if not self or peer is None or not (self.any_peer or self._listed(peer)):
+            return peer
+        forwarded, real_ip = [], None
+        for name, value in scope["headers"]:
+            if name == b"x-forwarded-for":
+                forwarded += [hop.strip() for hop in value.decode("latin-1").split(",") if hop.strip()]
+            elif name == b"x-real-ip":
+                real_ip = value.decode("latin-1").strip()
+        # Each proxy appends the address it received from, so read right to
+        # left past our own proxies; anything further left is client-supplied.
+        for hop in reversed(forwarded):
+            if not self._listed(hop):
+                return hop
+        if forwarded:
+            return forwarded[0]
+        return real_ip or peer
+
+
+trusted_proxies = TrustedProxies(os.getenv("TRUSTED_PROXIES", ""))
+
+
+class RateLimiter:
+    """Token buckets keyed by caller; the least recently seen keys are dropped past max_keys."""
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 100_000):
+        self.rate, self.burst, self.max_keys = rate, burst, max_keys
+        # key -> (tokens, updated)
+        self._buckets: "collections.OrderedDict[str, Tuple[float, float]]" = collections.OrderedDict()
+
+    def allow(self, key: str, now: Optional[float] = None) -> Tuple[bool, float]:
+        """Take one token for key. Returns (allowed, seconds until a token is available)."""
+        now = time.monotonic() if now is None else now
+        tokens, updated = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1 - tokens) / self.rate
+
+
+def parse_limit(value: str) -> Optional[RateLimiter]:
+    value = value.strip().lower()
+    if value in ("", "0", "off", "none"):
+        return None
+    rate, _, burst = value.partition(",")
+    return RateLimiter(float(rate), float(burst or rate))
+
+
+def limiters_from_env() -> Dict[str, Optional[RateLimiter]]:
+    return {group: parse_limit(os.getenv(f"RATE_LIMIT_{group.upper()}", default)) for group, default in DEFAULT_LIMITS.items()}
+
+
+def route_group(method: str, path: str, query_string: bytes) -> str:
+    if path.startswith("/auth/"):
+        return "auth"
+    if method == "GET" and path == "/tracks" and parse_qs(query_string.decode("latin-1")).get("query", [""])[0].strip():
+        return "search"
+    # Batch lookups are POSTed but only read.
+    if method in ("POST", "PUT", "PATCH", "DELETE") and path != "/tracks/batch":
+        return "writes"
+    return "reads"
+
+
+class _RequestState:
+    __slots__ = ("shed",)
+
+    def __init__(self):
+        self.shed = False
+
+
+# Set by AdmissionMiddleware for the request being served.
+_request_state: contextvars.ContextVar[Optional[_RequestState]] = contextvars.ContextVar("admission_state", default=None)
+
+
+def _mark_shed() -> None:
+    state = _request_state.get()
+    if state is not None:
+        state.shed = True
+
+
+async def _send_json(send: Send, status: int, detail: str, retry_after: float) -> None:
+    body = dumps({"detail": detail})
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware: per-caller rate limits, and 503 for requests shed upstream."""
+
+    def __init__(self, app: ASGIApp, limiters: Optional[Dict[str, Optional[RateLimiter]]] = None):
+        self.app = app
+        self.limiters = limiters_from_env() if limiters is None else limiters
+
+    async def _caller(self, scope: Scope, group: str) -> str:
+        ip = f"ip:{trusted_proxies.client_ip(scope) or 'unknown'}"
+        if group == "auth":
+            return ip
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                scheme, _, token = value.decode("latin-1").partition(" ")
+                if scheme.lower() == "bearer" and token:
+                    from .auth import verify_token
+
+                    try:
+                        user_id = await verify_token(token)
+                    except Exception:
+                        # Invalid tokens are rejected by the route itself.
+                        user_id = None
+                    if user_id:
+                        return f"user:{user_id}"
+                break
+        return ip
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+        group = route_group(scope["method"], scope["path"], scope.get("query_string", b""))
+        limiter = self.limiters.get(group)
+        if limiter is not None:
+            allowed, retry_after = limiter.allow(await self._caller(scope, group))
+            if not allowed:
+                admission_rejections_total.inc(group, "rate_limited")
+                await _send_json(send, 429, "Too many requests", retry_after)
+                return
+
+        state = _RequestState()
+        token = _request_state.set(state)
+        replaced = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal replaced
+            # Routes turn every exception into a 500 (401 in the auth
+            # dependencies); when the cause was upstream shedding, tell the
+            # client to retry instead.
+            if message["type"] == "http.response.start" and message["status"] >= 400 and state.shed:
+                replaced = True
+                admission_rejections_total.inc(group, "upstream_overloaded")
+                await _send_json(send, 503, "Service overloaded, retry shortly", 1)
+                return
+            if not replaced:
+                await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_state.reset(token)
+
+
+class UpstreamLimiter:
+    """Bounded concurrency with a bounded, time-limited FIFO of waiters."""
+
+    def __init__(self, limit: int, max_queue: int, max_wait: float):
+        self.limit, self.max_queue, self.max_wait = limit, max_queue, max_wait
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = collections.deque()
+
+    async def acquire(self) -> None:
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            raise UpstreamOverloaded("Upstream queue is full")
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # A released slot is handed straight to the waiter (see release).
+            await asyncio.wait_for(waiter, self.max_wait)
+        except asyncio.TimeoutError:
+            raise UpstreamOverloaded(f"No upstream slot within {self.max_wait:g}s") from None
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if not waiter.done() or waiter.cancelled():
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+
+    def release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+# (status, raw headers, raw body, extensions) of a finished upstream response
+_Result = Tuple[int, List[Tuple[bytes, bytes]], bytes, dict]
+
+
+def _response(result: _Result) -> httpx.Response:
+    status, headers, body, extensions = result
+    return httpx.Response(status, headers=headers, stream=httpx.ByteStream(body), extensions=extensions)
+
+
+class AdmissionTransport(httpx.AsyncBaseTransport):
+    def __init__(self, transport: httpx.AsyncBaseTransport, limiter: Optional[UpstreamLimiter] = None):
+        self._transport = transport
+        self.limiter = limiter or UpstreamLimiter(UPSTREAM_MAX_IN_FLIGHT, UPSTREAM_MAX_QUEUE, UPSTREAM_MAX_WAIT)
+        # keyed by (method, url, headers)
+        self._calls = SingleFlight()
+
+    async def _send(self, request: httpx.Request) -> _Result:
+        start = time.perf_counter()
+        try:
+            await self.limiter.acquire()
+        except UpstreamOverloaded:
+            upstream_shed_total.inc()
+            _mark_shed()
+            raise
+        upstream_queue_wait.observe(time.perf_counter() - start)
+        upstream_in_flight.inc()
+        try:
+            response = await self._transport.handle_async_request(request)
+            # The body is read while holding the slot, so the slot bounds the
+            # work in progress upstream. Raw bytes: httpx decodes
+            # Content-Encoding above the transport.
+            try:
+                body = b"".join([chunk async for chunk in response.stream])
+            finally:
+                await response.aclose()
+            return response.status_code, response.headers.raw, body, dict(response.extensions)
+        finally:
+            upstream_in_flight.dec()
+            self.limiter.release()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if request.method not in ("GET", "HEAD"):
+            return _response(await self._send(request))
+        key = (request.method, str(request.url), tuple(request.headers.raw))
+        if key in self._calls:
+            upstream_coalesced_total.inc()
+        try:
+            return _response(await self._calls.run(key, lambda: self._send(request)))
+        except UpstreamOverloaded:
+            # Also for followers of a call that was shed.
+            _mark_shed()
+            raise
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
@@ -0,0 +1,93 @@
+import subprocess
+from typing import Optional
+
+# Pure decode-and-measure step of the audio pipeline, run in worker
+# processes (see audio_pipeline.py). The file is decoded once by ffmpeg to
+# mono 48 kHz float PCM; duration, waveform peaks and integrated loudness are
+# all computed from that one buffer with NumPy/SciPy. Kept free of app
+# imports so pool processes start quickly.
+
+SAMPLE_RATE = 48000
+
+# ITU-R BS.1770-4 K-weighting at 48 kHz: high-shelf pre-filter, then the
+# RLB high-pass.
+_SHELF_B = (1.53512485958697, -2.69169618940638, 1.19839281085285)
+_SHELF_A = (1.0, -1.69065929318241, 0.73248077421585)
+_HIGHPASS_B = (1.0, -2.0, 1.0)
+_HIGHPASS_A = (1.0, -1.99004745483398, 0.99007225036621)
+
+ABSOLUTE_GATE = -70.0
+RELATIVE_GATE = -10.0
+
+# ffmpeg would otherwise also open file:, concat:, subfile: and playlists
+# that point anywhere; sources are storage URLs checked by the pipeline.
+_PROTOCOLS = {"https": "https,tls,tcp", "http": "http,tcp"}
+_DEMUXERS = "mp3,mov,ogg,flac,wav,aac,matroska"
+
+
+def decode(source: str, timeout: float = 300.0):
+    """Decode `source` (an http(s) URL) to a mono float32 array at SAMPLE_RATE."""
+    import numpy as np
+
+    scheme = source.partition("://")[0].lower()
+    if scheme not in _PROTOCOLS:
+        raise ValueError(f"Unsupported audio source: {scheme or source!r}")
+    result = subprocess.run(
+        [
+            "ffmpeg", "-nostdin", "-v", "error",
+            "-protocol_whitelist", _PROTOCOLS[scheme], "-format_whitelist", _DEMUXERS, "-i", source,
+            "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "f32le", "-",
+        ],
+        capture_output=True,
+        timeout=timeout,
+        check=False,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {result.stderr.decode(errors='replace').strip()[-500:]}")
+    return np.frombuffer(result.stdout, dtype=np.float32)
+
+
+def peaks(samples, points: int) -> bytes:
+    """Max absolute amplitude per bucket, as int8 in 0..127 (127 = full scale)."""
+    import numpy as np
+
+    if not len(samples):
+        return b""
+    points = min(points, len(samples))
+    edges = np.linspace(0, len(samples), points + 1).astype(np.int64)[:-1]
+    maxima = np.maximum.reduceat(np.abs(samples), edges)
+    return np.clip(np.rint(maxima * 127), 0, 127).astype(np.int8).tobytes()
+
+
+def integrated_loudness(samples) -> Optional[float]:
+    """Gated integrated loudness in LUFS (BS.1770-4, mono), or None for silence."""
+    import numpy as np
+    from scipy.signal import lfilter
+
+    weighted = lfilter(_HIGHPASS_B, _HIGHPASS_A, lfilter(_SHELF_B, _SHELF_A, samples.astype(np.float64)))
+    block, step = int(0.4 * SAMPLE_RATE), int(0.1 * SAMPLE_RATE)
+    if len(weighted) < block:
+        return None
+    # Mean square of every 400 ms block with 75% overlap, from a running sum.
+    energy = np.concatenate(([0.0], np.cumsum(weighted * weighted)))
+    starts = np.arange(0, len(weighted) - block + 1, step)
+    power = (energy[starts + block] - energy[starts]) / block
+    with np.errstate(divide="ignore"):
+        loudness = -0.691 + 10 * np.log10(power)
+    gated = power[loudness > ABSOLUTE_GATE]
+    if not len(gated):
+        return None
+    relative = -0.691 + 10 * np.log10(gated.mean()) + RELATIVE_GATE
+    gated = power[(loudness > ABSOLUTE_GATE) & (loudness > relative)]
+    return round(float(-0.691 + 10 * np.log10(gated.mean())), 2)
+
+
+def analyze(source: str, points: int = 1000, timeout: float = 300.0) -> dict:
+    """Return duration (seconds), int8 peaks and integrated loudness of `source`."""
+    samples = decode(source, timeout)
+    return {
+        "duration": round(len(samples) / SAMPLE_RATE, 3),
+        "peaks": peaks(samples, points),
+        "loudness_lufs": integrated_loudness(samples),
+        "sample_rate": SAMPLE_RATE,
+    }
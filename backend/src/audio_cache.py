@@ -0,0 +1,324 @@
+import asyncio
+import contextlib
+import hashlib
+import json
+import logging
+import mimetypes
+import mmap
+import os
+import re
+import tempfile
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import httpx
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from .origins import check_audio_url
+from .singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Range-aware audio delivery for GET /tracks/{id}/stream. Audio is fetched
+# from the origin (the track's audio_url) in fixed-size chunks with Range
+# requests and kept in a bounded on-disk cache, evicted least recently used
+# by bytes. Concurrent misses on the same chunk share one origin fetch, and
+# the chunk after the one being sent is fetched ahead so sequential playback
+# rarely waits on the origin. Cached chunks are sent with the server's
+# zero-copy extension when it offers one, otherwise from an mmap of the
+# chunk file. Only storage URLs are fetched (see origins.py), redirects are
+# followed only while they stay on an allowed origin, and files larger than
+# max_file_bytes are refused.
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+MAX_REDIRECTS = 3
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+class AudioTooLarge(Exception):
+    pass
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Return the inclusive (start, end) of a single-range header, or None for the whole file.
+
+    Multi-range and malformed headers are ignored (whole file, 200), as
+    RFC 9110 allows; unsatisfiable ranges raise RangeNotSatisfiable.
+    """
+    if not header:
+        return None
+    match = _RANGE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first == "":
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable()
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise RangeNotSatisfiable()
+    return start, end
+
+
+class _Meta:
+    __slots__ = ("size", "content_type")
+
+    def __init__(self, size: int, content_type: str):
+        self.size = size
+        self.content_type = content_type
+
+
+class ChunkCache:
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int,
+        chunk_size: int = 256 * 1024,
+        timeout: float = 30.0,
+        max_file_bytes: int = 200 * 1024 ** 2,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self.max_file_bytes = max_file_bytes
+        self.timeout = timeout
+        # chunk file path -> size, least recently used first
+        self._lru: "OrderedDict[str, int]" = OrderedDict()
+        self._bytes = 0
+        self._meta: Dict[str, _Meta] = {}
+        self._fetches = SingleFlight()
+        self._http: Optional[httpx.AsyncClient] = None
+        self._loaded = False
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, url: str) -> str:
+        return hashlib.sha1(url.encode()).hexdigest()
+
+    def _path(self, url: str, index: int) -> str:
+        key = self._key(url)
+        return os.path.join(self.directory, key[:2], f"{key}.{index}")
+
+    def _meta_path(self, url: str) -> str:
+        key = self._key(url)
+        return os.path.join(self.directory, key[:2], f"{key}.meta")
+
+    def _scan(self) -> None:
+        # Rebuild the LRU from the files a previous process left behind.
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith(".meta") or name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                files.append((stat.st_atime, path, stat.st_size))
+        for _, path, size in sorted(files):
+            self._lru[path] = size
+            self._bytes += size
+
+    async def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            self._loaded = True
+            os.makedirs(self.directory, exist_ok=True)
+            await asyncio.to_thread(self._scan)
+            self._evict()
+
+    def _client(self) -> httpx.AsyncClient:
+        if self._http is None:
+            # Redirects are followed by _get, which checks every hop.
+            self._http = httpx.AsyncClient(follow_redirects=False, timeout=httpx.Timeout(self.timeout))
+        return self._http
+
+    @contextlib.asynccontextmanager
+    async def _get(self, url: str, headers: dict):
+        for _ in range(MAX_REDIRECTS + 1):
+            check_audio_url(url)
+            response = await self._client().send(self._client().build_request("GET", url, headers=headers), stream=True)
+            if response.next_request is None:
+                try:
+                    yield response
+                finally:
+                    await response.aclose()
+                return
+            await response.aclose()
+            url = str(response.next_request.url)
+        raise RuntimeError("Too many redirects from the audio origin")
+
+    async def close(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    def _evict(self) -> None:
+        while self._bytes > self.max_bytes and self._lru:
+            path, size = self._lru.popitem(last=False)
+            self._bytes -= size
+            try:
+                # Readers that already opened the file keep their handle.
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def _store(self, path: str, data: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    async def describe(self, url: str) -> Tuple[int, str]:
+        """Return (size, content_type) of the audio at `url`."""
+        await self._ensure_loaded()
+        meta = self._meta.get(url)
+        if meta is None:
+            meta = await asyncio.to_thread(self._read_meta, url)
+        if meta is None:
+            # The first chunk's response carries the total size.
+            await self._fetches.run((url, 0), lambda: self._fetch(url, 0))
+            meta = self._meta.get(url)
+            if meta is None:
+                raise RuntimeError("Origin did not report the audio size")
+        return meta.size, meta.content_type
+
+    def _read_meta(self, url: str) -> Optional[_Meta]:
+        try:
+            with open(self._meta_path(url)) as f:
+                meta = _Meta(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+        self._meta[url] = meta
+        return meta
+
+    def _remember_meta(self, url: str, size: int, content_type: Optional[str]) -> None:
+        content_type = content_type or mimetypes.guess_type(url)[0] or "application/octet-stream"
+        self._meta[url] = _Meta(size, content_type)
+        path = self._meta_path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"size": size, "content_type": content_type}, f)
+
+    def _add(self, path: str, size: int) -> None:
+        if path in self._lru:
+            self._bytes -= self._lru.pop(path)
+        self._lru[path] = size
+        self._bytes += size
+        self._evict()
+
+    async def _fetch(self, url: str, index: int) -> None:
+        self.misses += 1
+        start = index * self.chunk_size
+        headers = {"Range": f"bytes={start}-{start + self.chunk_size - 1}"}
+        async with self._get(url, headers) as response:
+            if response.status_code == 206:
+                total = response.headers.get("content-range", "").rpartition("/")[2]
+                if total.isdigit() and int(total) > self.max_file_bytes:
+                    raise AudioTooLarge(f"Audio file is larger than {self.max_file_bytes} bytes")
+                data = bytearray()
+                async for part in response.aiter_bytes():
+                    data += part
+                    if len(data) > self.chunk_size:
+                        raise RuntimeError("Origin sent more than the requested range")
+                data = bytes(data)
+                if total.isdigit():
+                    await asyncio.to_thread(self._remember_meta, url, int(total), response.headers.get("content-type"))
+                path = self._path(url, index)
+                await asyncio.to_thread(self._store, path, data)
+                self._add(path, len(data))
+                return
+            if response.status_code == 416:
+                raise RangeNotSatisfiable()
+            response.raise_for_status()
+            length = response.headers.get("content-length", "")
+            if length.isdigit() and int(length) > self.max_file_bytes:
+                raise AudioTooLarge(f"Audio file is larger than {self.max_file_bytes} bytes")
+            # Origin ignored Range: split the whole body into chunks.
+            size, buffer, chunk = 0, bytearray(), 0
+            async for data in response.aiter_bytes():
+                buffer += data
+                if size + len(buffer) > self.max_file_bytes:
+                    raise AudioTooLarge(f"Audio file is larger than {self.max_file_bytes} bytes")
+                while len(buffer) >= self.chunk_size:
+                    await self._store_chunk(url, chunk, bytes(buffer[:self.chunk_size]))
+                    del buffer[:self.chunk_size]
+                    size += self.chunk_size
+                    chunk += 1
+            if buffer:
+                await self._store_chunk(url, chunk, bytes(buffer))
+                size += len(buffer)
+            await asyncio.to_thread(self._remember_meta, url, size, response.headers.get("content-type"))
+
+    async def _store_chunk(self, url: str, index: int, data: bytes) -> None:
+        path = self._path(url, index)
+        await asyncio.to_thread(self._store, path, data)
+        self._add(path, len(data))
+
+    async def open_chunk(self, url: str, index: int):
+        """Return an open binary file for chunk `index`, fetching it on a miss."""
+        await self._ensure_loaded()
+        path = self._path(url, index)
+        for _ in range(2):
+            if path in self._lru:
+                try:
+                    # No await between the LRU check and open, so the file
+                    # can't be evicted in between.
+                    f = open(path, "rb")
+                except FileNotFoundError:
+                    self._bytes -= self._lru.pop(path)
+                else:
+                    self._lru.move_to_end(path)
+                    self.hits += 1
+                    return f
+            await self._fetches.run((url, index), lambda: self._fetch(url, index))
+        raise FileNotFoundError(path)
+
+    def prefetch(self, url: str, index: int) -> None:
+        if self._path(url, index) in self._lru or (url, index) in self._fetches:
+            return
+        task = asyncio.create_task(self._fetches.run((url, index), lambda: self._fetch(url, index)))
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+
+class RangeResponse(Response):
+    """Streams bytes [start, end] of a cached origin file."""
+
+    def __init__(self, cache: ChunkCache, url: str, size: int, start: int, end: int, status_code: int, headers: dict, media_type: str):
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.cache = cache
+        self.url = url
+        self.size = size
+        self.start = start
+        self.end = end
+        self.headers["content-length"] = str(end - start + 1 if size else 0)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope.get("method") == "HEAD" or not self.size:
+            await send({"type": "http.response.body", "body": b""})
+            return
+        zerocopy = "http.response.zerocopysend" in scope.get("extensions", {})
+        chunk_size = self.cache.chunk_size
+        last_chunk = (self.size - 1) // chunk_size
+        position = self.start
+        while position <= self.end:
+            index = position // chunk_size
+            if index < last_chunk:
+                self.cache.prefetch(self.url, index + 1)
+            offset = position - index * chunk_size
+            count = min(self.end + 1, (index + 1) * chunk_size) - position
+            with await self.cache.open_chunk(self.url, index) as f:
+                more = position + count <= self.end
+                if zerocopy:
+                    await send({"type": "http.response.zerocopysend", "file": f.fileno(), "offset": offset, "count": count, "more_body": more})
+                else:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                        await send({"type": "http.response.body", "body": mapped[offset:offset + count], "more_body": more})
+            position += count
@@ -0,0 +1,150 @@
+import asyncio
+import base64
+import logging
+import shutil
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Callable, List, Optional, Tuple
+
+from .audio_analysis import analyze
+from .db import get_client
+from .origins import is_allowed_audio_url
+from .recommender import numeric_available
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Upload-time audio analysis. upload_track() only enqueues the new track;
+# worker tasks hand each job to a process pool that decodes the file once
+# and measures its real duration, a ~1k point int8 waveform and integrated
+# loudness (audio_analysis.py). Results go to the track_audio_analysis table
+# and the track's duration/loudness_lufs columns. Failed jobs are retried
+# with exponential backoff; tracks that still have no analysis row (queue
+# full, worker restarted) are picked up again by the backfill at startup.
+#
+# Requires ffmpeg on PATH and numpy/scipy; without them uploads work as
+# before and nothing is analyzed.
+
+Job = Tuple[str, str, int]  # (track_id, audio_url, attempt)
+
+
+class AudioPipeline:
+    def __init__(
+        self,
+        workers: int = 2,
+        queue_size: int = 1000,
+        max_attempts: int = 3,
+        retry_delay: float = 30.0,
+        points: int = 1000,
+        timeout: float = 300.0,
+        backfill_limit: int = 1000,
+        on_result: Optional[Callable[[str], None]] = None,
+    ):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.points = points
+        self.timeout = timeout
+        self.backfill_limit = backfill_limit
+        self.on_result = on_result
+        self._queue: "asyncio.Queue[Job]" = asyncio.Queue(maxsize=queue_size)
+        self._pool: Optional["ProcessPoolExecutor"] = None
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def enabled(self) -> bool:
+        return self._pool is not None
+
+    def submit(self, track_id: str, audio_url: str, attempt: int = 1) -> bool:
+        """Queue a track for analysis without waiting; False if it wasn't queued."""
+        if not self.enabled or not audio_url:
+            return False
+        if not is_allowed_audio_url(audio_url):
+            # ffmpeg fetches the URL itself; only storage URLs are analyzed.
+            logger.warning("Track %s has an audio_url outside storage; not analyzed", track_id)
+            return False
+        try:
+            self._queue.put_nowait((str(track_id), audio_url, attempt))
+            return True
+        except asyncio.QueueFull:
+            logger.warning("Audio analysis queue full; track %s left for the next backfill", track_id)
+            return False
+
+    async def _store(self, track_id: str, result: dict) -> None:
+        await get_client().table("track_audio_analysis").upsert({
+            "track_id": track_id,
+            "duration": result["duration"],
+            "loudness_lufs": result["loudness_lufs"],
+            "peaks": base64.b64encode(result["peaks"]).decode(),
+            "points": len(result["peaks"]),
+            "sample_rate": result["sample_rate"],
+            "analyzed_at": datetime.now(timezone.utc).isoformat(),
+        }, on_conflict="track_id").execute()
+        await get_client().table("tracks").update({
+            "duration": round(result["duration"]),
+            "loudness_lufs": result["loudness_lufs"],
+        }).eq("id", track_id).execute()
+
+    async def _work(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            track_id, audio_url, attempt = await self._queue.get()
+            try:
+                result = await loop.run_in_executor(self._pool, analyze, audio_url, self.points, self.timeout)
+                await self._store(track_id, result)
+                if self.on_result:
+                    self.on_result(track_id)
+            except Exception:
+                if attempt >= self.max_attempts:
+                    logger.exception("Audio analysis of track %s failed after %d attempts", track_id, attempt)
+                else:
+                    delay = self.retry_delay * 2 ** (attempt - 1)
+                    logger.warning("Audio analysis of track %s failed; retrying in %.0fs", track_id, delay, exc_info=True)
+                    loop.call_later(delay, self.submit, track_id, audio_url, attempt + 1)
+            finally:
+                self._queue.task_done()
+
+    async def backfill(self) -> None:
+        # Tracks without an analysis row (anti-join on the embedded table).
+        response = await (
+            get_client().table("tracks")
+            .select("id, audio_url, track_audio_analysis(track_id)")
+            .is_("track_audio_analysis", "null")
+            .limit(self.backfill_limit)
+            .execute()
+        )
+        for row in response.data:
+            if not is_allowed_audio_url(row.get("audio_url") or ""):
+                continue
+            if not self.submit(row["id"], row.get("audio_url")):
+                break
+
+    async def _backfill(self) -> None:
+        try:
+            await self.backfill()
+        except Exception:
+            logger.exception("Audio analysis backfill failed")
+
+    def start(self) -> None:
+        if self._pool is not None:
+            return
+        if shutil.which("ffmpeg") is None or not numeric_available():
+            logger.warning("ffmpeg or numpy/scipy not available; audio analysis is disabled")
+            return
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._backfill()))
+
+    async def stop(self) -> None:
+        # Queued jobs are dropped; the next backfill picks them up again.
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
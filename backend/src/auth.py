@@ -0,0 +1,117 @@
+import asyncio
+import os
+from typing import Optional
+
+import jwt
+from fastapi import Header, HTTPException, status
+
+from .cache import TTLCache
+from .db import get_client
+
+# Tokens are verified locally (HS256 project secret, or the project's JWKS for
+# asymmetric keys) and profiles are served from a per-process TTL cache, so an
+# authenticated request normally costs no upstream round trip before the
+# route runs. Writes that change a profile call invalidate_user(); the TTL
+# bounds staleness across workers.
+
+JWT_AUDIENCE = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
+
+_profile_cache = TTLCache(
+    maxsize=int(os.getenv("USER_PROFILE_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("USER_PROFILE_CACHE_TTL", "60")),
+)
+_jwks_client: Optional[jwt.PyJWKClient] = None
+
+
+def _get_jwks_client() -> jwt.PyJWKClient:
+    global _jwks_client
+    if _jwks_client is None:
+        jwks_url = f"{os.getenv('SUPABASE_URL')}/auth/v1/.well-known/jwks.json"
+        _jwks_client = jwt.PyJWKClient(jwks_url, cache_keys=True, lifespan=3600)
+    return _jwks_client
+
+
+async def verify_token(token: str) -> Optional[str]:
+    """Return the user id (`sub` claim) of a valid access token.
+
+    Returns None when the token cannot be checked locally, in which case the
+    caller falls back to asking GoTrue. Raises jwt.InvalidTokenError for
+    tokens that are checked and rejected.
+    """
+    algorithm = jwt.get_unverified_header(token).get("alg")
+    secret = os.getenv("SUPABASE_JWT_SECRET")
+    if algorithm == "HS256" and secret:
+        key = secret
+    elif algorithm in ("RS256", "ES256") and jwt.algorithms.has_crypto:
+        # PyJWKClient fetches with urllib; keys are cached, so this only
+        # blocks a thread when the key set is first loaded or rotated.
+        signing_key = await asyncio.to_thread(_get_jwks_client().get_signing_key_from_jwt, token)
+        key = signing_key.key
+    else:
+        return None
+    claims = jwt.decode(token, key, algorithms=[algorithm], audience=JWT_AUDIENCE)
+    return claims["sub"]
+
+
+async def get_user_profile(user_id: str) -> Optional[dict]:
+    profile = _profile_cache.get(user_id)
+    if profile is None:
+        response = await get_client().table("users").select("*").eq("id", user_id).single().execute()
+        profile = response.data
+        if profile:
+            _profile_cache.set(user_id, profile)
+    return dict(profile) if profile else None
+
+
+def invalidate_user(user_id: str) -> None:
+    _profile_cache.pop(user_id)
+
+
+def update_cached_user(user_id: str, fields: dict) -> None:
+    # Apply fields a write just returned so the next request needn't refetch.
+    profile = _profile_cache.get(user_id)
+    if profile is not None:
+        _profile_cache.set(user_id, {**profile, **fields})
+
+
+def get_access_token(token: Optional[str] = Header(None, alias="Authorization")) -> str:
+    # For calls that must run as the user (auth.uid()) rather than as the service.
+    if not token:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authorization header missing")
+    return token.replace("Bearer ", "")
+
+
+# Dependency to get current user
+async def get_current_user(token: Optional[str] = Header(None, alias="Authorization")):
+    if not token:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authorization header missing")
+    try:
+        # Remove "Bearer " prefix
+        token = token.replace("Bearer ", "")
+        user_id = await verify_token(token)
+        if user_id is None:
+            user_response = await get_client().auth.get_user(token)
+            if not user_response or not user_response.user:
+                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid authentication token")
+            user_id = user_response.user.id
+        # Fetch user profile from 'users' table
+        user_profile = await get_user_profile(user_id)
+        if user_profile:
+            return user_profile
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User profile not found")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=str(e))
+
+
+async def get_optional_user(token: Optional[str] = Header(None, alias="Authorization")):
+    # Like get_current_user, but anonymous requests get None instead of a 401.
+    # So do requests with an invalid or expired token, or no profile: these
+    # routes work without a user, so a stale token shouldn't break them.
+    if not token:
+        return None
+    try:
+        return await get_current_user(token)
+    except HTTPException:
+        return None
@@ -0,0 +1,232 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional, Set, Tuple
+
+from fastapi import Request, Response
+
+from .responses import JSONResponse, dumps
+from .singleflight import SingleFlight
+
+
+class TTLCache:
+    """Bounded in-process LRU cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        self._data[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+_MISSING = object()
+
+
+class ResponseCache:
+    """Read-through cache for JSON-able route results with stale-while-revalidate.
+
+    Entries are fresh for `ttl` seconds and may then be served for a further
+    `stale_ttl` seconds while a single background task reloads them. Each
+    entry carries tags (e.g. "track:<id>") so writes can drop exactly the
+    entries they affect, and a strong ETag derived from its content.
+    """
+
+    def __init__(self, maxsize: int = 2048, ttl: float = 30.0, stale_ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._tags: Dict[str, Set[Hashable]] = {}
+        self._loads = SingleFlight()
+        self._background: Set[asyncio.Task] = set()
+        # Invalidation clock. A load only keeps its value if none of the
+        # value's tags was invalidated after the load began; writes to other
+        # tags don't cost it its entry. _invalidated is tag -> clock of its
+        # last invalidation, oldest first, and only needs to reach back to
+        # the oldest load still running (_load_starts: clock -> loads).
+        self._clock = 0
+        self._cleared_at = 0
+        self._invalidated: "OrderedDict[str, int]" = OrderedDict()
+        self._load_starts: Dict[int, int] = {}
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        tags: Callable[[Any], Iterable[str]] = lambda value: (),
+        keep: Callable[[Any], bool] = lambda value: True,
+    ) -> Tuple[Any, str]:
+        """Return (value, etag) for `key`, calling `loader` on a miss.
+
+        `tags` maps the loaded value to the invalidation tags it depends on;
+        values for which `keep` is false are returned but not cached.
+        Concurrent misses on the same key share one `loader` call.
+        """
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None:
+            if now < entry.fresh_until:
+                self._entries.move_to_end(key)
+                return entry.value, entry.etag
+            if now < entry.stale_until:
+                self._entries.move_to_end(key)
+                if key not in self._loads:
+                    task = asyncio.create_task(self._loads.run(key, lambda: self._load(key, loader, tags, keep)))
+                    self._background.add(task)
+                    task.add_done_callback(self._finish_background)
+                return entry.value, entry.etag
+        return await self._loads.run(key, lambda: self._load(key, loader, tags, keep))
+
+    async def _load(self, key, loader, tags, keep) -> Tuple[Any, str]:
+        started = self._clock
+        self._load_starts[started] = self._load_starts.get(started, 0) + 1
+        try:
+            value = await loader()
+            etag = make_etag(value)
+            # A write that invalidated one of its tags while we were loading
+            # may have made this value stale already; return it but don't keep it.
+            if not keep(value):
+                return value, etag
+            value_tags = frozenset(tags(value))
+            if self._cleared_at <= started and all(self._invalidated.get(tag, -1) <= started for tag in value_tags):
+                self._store(key, value, etag, value_tags)
+            return value, etag
+        finally:
+            self._load_finished(started)
+
+    def _load_finished(self, started: int) -> None:
+        remaining = self._load_starts.pop(started) - 1
+        if remaining:
+            self._load_starts[started] = remaining
+        if not self._load_starts:
+            self._invalidated.clear()
+            return
+        oldest = min(self._load_starts)
+        while self._invalidated and next(iter(self._invalidated.values())) <= oldest:
+            self._invalidated.popitem(last=False)
+
+    def _finish_background(self, task: asyncio.Task) -> None:
+        self._background.discard(task)
+        if not task.cancelled():
+            # Failed revalidations keep serving the stale entry until it expires.
+            task.exception()
+
+    def _store(self, key: Hashable, value: Any, etag: str, tags: Iterable[str]) -> None:
+        self._drop(key)
+        now = time.monotonic()
+        tags = frozenset(tags)
+        self._entries[key] = _Entry(value, etag, now + self.ttl, now + self.ttl + self.stale_ttl, tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.maxsize:
+            self._drop(next(iter(self._entries)))
+
+    def _drop(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def _mark_invalidated(self, tags: Iterable[str]) -> None:
+        self._clock += 1
+        if self._load_starts:
+            for tag in tags:
+                self._invalidated.pop(tag, None)
+                self._invalidated[tag] = self._clock
+
+    def invalidate(self, *tags: str) -> None:
+        if not tags:
+            return
+        self._mark_invalidated(tags)
+        for tag in tags:
+            for key in list(self._tags.get(tag, ())):
+                self._drop(key)
+
+    def update(self, tags: Iterable[str], change: Callable[[Any], Any]) -> None:
+        """Rewrite the entries carrying any of `tags` in place with `change(value)`.
+
+        For writes whose effect on a cached value is known, e.g. new counts,
+        so the entries needn't be dropped. Loads in flight for these tags are
+        not kept, as after invalidate().
+        """
+        tags = list(tags)
+        if not tags:
+            return
+        self._mark_invalidated(tags)
+        keys = set()
+        for tag in tags:
+            keys.update(self._tags.get(tag, ()))
+        for key in keys:
+            entry = self._entries[key]
+            value = change(entry.value)
+            if value is not entry.value:
+                entry.value, entry.etag = value, make_etag(value)
+
+    def clear(self) -> None:
+        self._clock += 1
+        self._cleared_at = self._clock
+        self._entries.clear()
+        self._tags.clear()
+
+
+class _Entry:
+    __slots__ = ("value", "etag", "fresh_until", "stale_until", "tags")
+
+    def __init__(self, value, etag, fresh_until, stale_until, tags):
+        self.value = value
+        self.etag = etag
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+        self.tags = tags
+
+
+def make_etag(value: Any) -> str:
+    return '"%s"' % hashlib.sha1(dumps(value, sort_keys=True)).hexdigest()
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def cached_json_response(request: Request, value: Any, etag: str) -> Response:
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=value, headers=headers)
@@ -0,0 +1,181 @@
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+from .db import get_client
+
+logger = logging.getLogger(__name__)
+
+# Write-behind aggregation of per-track like and play counts. Likes/unlikes
+# and plays only bump an in-memory delta; a background task folds all pending
+# deltas into one apply_track_counter_deltas RPC every flush interval, so hot
+# tracks take one row update per interval instead of one per event. Reads
+# served by this worker overlay the not-yet-persisted deltas, and the FastAPI
+# lifespan drains whatever is pending on shutdown.
+#
+# With write_through (serverless, where no flush loop runs between requests)
+# the route that recorded a delta calls persist(), which flushes right away;
+# a failed flush keeps the deltas for the next request to retry.
+
+
+def map_track_rows(data: Any, change: Callable[[dict], dict]) -> Any:
+    """Apply `change` to each track row in a row, a list of rows or a {"data": [...]} page.
+
+    Returns `data` itself when `change` returned every row unchanged.
+    """
+    if isinstance(data, list):
+        rows = [change(row) if isinstance(row, dict) else row for row in data]
+        return rows if any(new is not old for new, old in zip(rows, data)) else data
+    if isinstance(data, dict) and isinstance(data.get("data"), list):
+        rows = map_track_rows(data["data"], change)
+        return data if rows is data["data"] else {**data, "data": rows}
+    if isinstance(data, dict):
+        return change(data)
+    return data
+
+
+def with_totals(data: Any, totals: Dict[str, dict]) -> Any:
+    """Set likes_count/plays_count of the rows in `data` from flushed totals (track_id -> row)."""
+    def change(row: dict) -> dict:
+        total = totals.get(str(row.get("id")))
+        if total is None:
+            return row
+        counts = {column: total[column] for column in ("likes_count", "plays_count") if column in row}
+        return {**row, **counts} if counts else row
+    return map_track_rows(data, change)
+
+
+class TrackCounterAggregator:
+    def __init__(
+        self,
+        flush_interval: float = 2.0,
+        max_pending: int = 5000,
+        on_flush: Optional[Callable[[List[dict]], None]] = None,
+        write_through: bool = False,
+    ):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.on_flush = on_flush
+        self.write_through = write_through
+        # track_id -> [likes_delta, plays_delta]
+        self._pending: Dict[str, List[int]] = {}
+        self._flushing: Dict[str, List[int]] = {}
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def add_like(self, track_id: str, delta: int = 1) -> None:
+        self._add(track_id, delta, 0)
+
+    def add_play(self, track_id: str, count: int = 1) -> None:
+        self._add(track_id, 0, count)
+
+    def _add(self, track_id: str, likes: int, plays: int) -> None:
+        entry = self._pending.setdefault(track_id, [0, 0])
+        entry[0] += likes
+        entry[1] += plays
+        if len(self._pending) >= self.max_pending:
+            self._wakeup.set()
+
+    def pending_delta(self, track_id: str) -> List[int]:
+        likes = plays = 0
+        for source in (self._flushing, self._pending):
+            entry = source.get(track_id)
+            if entry:
+                likes += entry[0]
+                plays += entry[1]
+        return [likes, plays]
+
+    def overlay(self, data: Any) -> Any:
+        """Return `data` with unflushed deltas added to its track counts.
+
+        Accepts a track row, a list of rows or a {"data": [...]} page, and
+        returns `data` itself when nothing it contains has pending deltas.
+        """
+        if not self._pending and not self._flushing:
+            return data
+        return map_track_rows(data, self._overlay_row)
+
+    def _overlay_row(self, row: dict) -> dict:
+        if "id" not in row:
+            return row
+        likes, plays = self.pending_delta(str(row["id"]))
+        if not likes and not plays:
+            return row
+        row = dict(row)
+        if "likes_count" in row:
+            row["likes_count"] = (row["likes_count"] or 0) + likes
+        if "plays_count" in row:
+            row["plays_count"] = (row["plays_count"] or 0) + plays
+        return row
+
+    async def flush(self) -> None:
+        async with self._lock:
+            if not self._pending:
+                return
+            self._flushing, self._pending = self._pending, {}
+            deltas = [
+                {"track_id": track_id, "likes": likes, "plays": plays}
+                # Sorted so concurrent flushes from several workers lock rows
+                # in the same order.
+                for track_id, (likes, plays) in sorted(self._flushing.items())
+                if likes or plays
+            ]
+            totals: List[dict] = []
+            try:
+                if deltas:
+                    response = await get_client().rpc("apply_track_counter_deltas", {"deltas": deltas}).execute()
+                    totals = response.data or []
+            except BaseException:
+                # Fold the batch back in (also on cancellation mid-request);
+                # it is retried on the next flush.
+                for track_id, (likes, plays) in self._flushing.items():
+                    entry = self._pending.setdefault(track_id, [0, 0])
+                    entry[0] += likes
+                    entry[1] += plays
+                raise
+            else:
+                if self.on_flush:
+                    # The resulting track_id/likes_count/plays_count rows.
+                    self.on_flush(totals)
+            finally:
+                self._flushing = {}
+
+    async def persist(self) -> None:
+        """With write_through, flush now instead of waiting for the loop."""
+        if not self.write_through:
+            return
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Track counter write failed; retrying on the next request")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Track counter flush failed")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the flush loop and persist everything still pending."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Dropping unflushed track counters on shutdown")
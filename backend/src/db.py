@@ -0,0 +1,96 @@
+import os
+from typing import TYPE_CHECKING, Optional
+
+import httpx
+
+from .admission import AdmissionTransport
+from .metrics import InstrumentedTransport
+
+if TYPE_CHECKING:
+    from gotrue import AsyncGoTrueClient
+    from supabase import AsyncClient
+
+# Async data-access layer. Every route awaits its Supabase calls through the
+# client returned by get_client(), so a slow PostgREST/GoTrue round trip only
+# suspends the request that made it instead of freezing the whole worker.
+# supabase (with its auth, storage and realtime clients) is only imported
+# when the client is first created, which keeps it out of cold-start imports.
+#
+# The shared client only ever carries the anon key. Signing in, up or out on
+# it would make supabase-py switch its PostgREST/storage Authorization header
+# to that user's session for every later request in the process, so those
+# calls use a throwaway GoTrue client per request (new_auth_client()).
+
+# Postgres error code PostgREST reports for unique constraint violations.
+UNIQUE_VIOLATION = "23505"
+# ... and for foreign keys that point at a missing row.
+FOREIGN_KEY_VIOLATION = "23503"
+
+_http_client: Optional[httpx.AsyncClient] = None
+_client: Optional["AsyncClient"] = None
+
+
+def _create_http_client() -> httpx.AsyncClient:
+    # Shared HTTP/2 connection pool used by the PostgREST, GoTrue, storage and
+    # functions clients. Bounds are per worker process. The transport is
+    # wrapped so every round trip is timed per table/operation (see
+    # metrics.py), and outside that admitted and coalesced (see admission.py),
+    # so time spent waiting for a slot is not counted as upstream latency.
+    transport = httpx.AsyncHTTPTransport(
+        http2=True,
+        limits=httpx.Limits(
+            max_connections=int(os.getenv("SUPABASE_HTTP_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("SUPABASE_HTTP_MAX_KEEPALIVE", "20")),
+        ),
+    )
+    return httpx.AsyncClient(
+        transport=AdmissionTransport(InstrumentedTransport(transport)),
+        follow_redirects=True,
+        timeout=httpx.Timeout(float(os.getenv("SUPABASE_HTTP_TIMEOUT", "10"))),
+    )
+
+
+def get_client() -> "AsyncClient":
+    """Return the process-wide async Supabase client, creating it on first use."""
+    global _http_client, _client
+    if _client is None:
+        from supabase import AsyncClient, AsyncClientOptions
+
+        supabase_url = os.getenv("SUPABASE_URL")
+        supabase_anon_key = os.getenv("SUPABASE_ANON_KEY")
+        if not supabase_url or not supabase_anon_key:
+            raise ValueError("Supabase URL and Anon Key must be set in .env file")
+        _http_client = _create_http_client()
+        options = AsyncClientOptions(
+            httpx_client=_http_client,
+            persist_session=False,
+            auto_refresh_token=False,
+        )
+        _client = AsyncClient(supabase_url, supabase_anon_key, options)
+    return _client
+
+
+def new_auth_client() -> "AsyncGoTrueClient":
+    """Return a GoTrue client for one request's sign-up/sign-in/sign-out.
+
+    It shares the connection pool but not the session of get_client().
+    """
+    from gotrue import AsyncGoTrueClient, AsyncMemoryStorage
+
+    client = get_client()
+    return AsyncGoTrueClient(
+        url=client.auth_url,
+        headers={"apikey": client.supabase_key, "Authorization": f"Bearer {client.supabase_key}"},
+        auto_refresh_token=False,
+        persist_session=False,
+        storage=AsyncMemoryStorage(),
+        http_client=_http_client,
+    )
+
+
+async def close_client() -> None:
+    global _http_client, _client
+    if _http_client is not None:
+        await _http_client.aclose()
+    _http_client = None
+    _client = None
@@ -0,0 +1,46 @@
+from typing import Optional, Sequence
+
+from fastapi import HTTPException, status
+
+# Sparse fieldsets: `?fields=a,b,c` picks the columns a response carries and
+# is pushed down into the PostgREST select, so unused columns are neither
+# read, transferred nor serialized. List routes default to lean projections
+# (what a card or table row shows); `fields=*` asks for whole rows.
+
+TRACK_FIELDS = (
+    "id", "title", "artist", "description", "audio_url", "cover_url", "duration", "genre", "tags",
+    "is_vip_only", "is_approved", "user_id", "plays_count", "likes_count", "loudness_lufs",
+    "created_at", "updated_at",
+)
+# TrackCard plus the audio URL the player needs and created_at for cursors.
+TRACK_LIST_FIELDS = (
+    "id", "title", "artist", "audio_url", "cover_url", "duration", "genre", "tags",
+    "is_vip_only", "plays_count", "likes_count", "created_at",
+)
+
+USER_FIELDS = (
+    "id", "email", "username", "avatar_url", "is_vip", "vip_expires_at", "is_dj", "is_admin",
+    "wallet_balance", "created_at", "updated_at",
+)
+# Wallet data is only returned when asked for.
+USER_LIST_FIELDS = ("id", "email", "username", "avatar_url", "is_vip", "vip_expires_at", "is_dj", "is_admin", "created_at")
+
+WALLET_TRANSACTION_FIELDS = ("id", "user_id", "type", "amount", "description", "created_at")
+WALLET_TRANSACTION_LIST_FIELDS = ("id", "type", "amount", "description", "created_at")
+
+# Always selected: row identity and the keyset cursor position.
+REQUIRED_FIELDS = ("id", "created_at")
+
+
+def select_fields(fields: Optional[str], allowed: Sequence[str], default: Sequence[str]) -> str:
+    """Turn a `fields` query parameter into a PostgREST select list."""
+    if fields is None or not fields.strip():
+        names = list(default)
+    elif fields.strip() == "*":
+        names = list(allowed)
+    else:
+        names = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = [name for name in names if name not in allowed]
+        if unknown:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown fields: {', '.join(unknown)}")
+    return ", ".join(dict.fromkeys([*REQUIRED_FIELDS, *names]))
@@ -0,0 +1,83 @@
+import uuid
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException, status
+from postgrest.exceptions import APIError
+
+from .db import get_client
+
+# Wallet and VIP operations. Each one is a single RPC to a plpgsql function
+# that checks and updates the balance, writes the purchase/transaction rows
+# and records the result under the caller's idempotency key in one
+# transaction. A retried request with the same key gets the stored result
+# back instead of being charged twice. The functions identify the user with
+# auth.uid(), so the RPC is sent with the caller's own access token rather
+# than the service's anon key.
+
+# Prices and durations live in the vip_plans table and are applied by
+# ledger_purchase_vip itself; this only rejects unknown plans early.
+VIP_PLANS = ("monthly", "yearly", "lifetime")
+
+# Error messages raised by the ledger functions, mapped to API errors.
+_LEDGER_ERRORS = {
+    "insufficient_balance": (status.HTTP_400_BAD_REQUEST, "Insufficient wallet balance"),
+    "user_not_found": (status.HTTP_404_NOT_FOUND, "User profile not found"),
+    "not_authenticated": (status.HTTP_401_UNAUTHORIZED, "Invalid authentication token"),
+    "unknown_plan": (status.HTTP_400_BAD_REQUEST, "Unknown VIP plan"),
+    "price_mismatch": (status.HTTP_409_CONFLICT, "Amount does not match the plan price"),
+    "invalid_amount": (status.HTTP_400_BAD_REQUEST, "Amount must be positive"),
+}
+
+
+async def _call(function: str, params: dict, access_token: str) -> dict:
+    builder = get_client().rpc(function, params)
+    builder.headers["Authorization"] = f"Bearer {access_token}"
+    try:
+        response = await builder.execute()
+    except APIError as e:
+        if e.message in _LEDGER_ERRORS:
+            status_code, detail = _LEDGER_ERRORS[e.message]
+            raise HTTPException(status_code=status_code, detail=detail)
+        raise
+    return response.data
+
+
+def vip_active(user: Optional[dict]) -> bool:
+    if not user or not user.get("is_vip"):
+        return False
+    if user.get("vip_expires_at") is None:
+        # Lifetime plans have no expiry
+        return True
+    expires_at = datetime.fromisoformat(user["vip_expires_at"])
+    return expires_at > datetime.now(expires_at.tzinfo)
+
+
+def _idempotency_key(key: Optional[str]) -> str:
+    # Without a client key the call is still atomic, just not deduplicated.
+    return key or str(uuid.uuid4())
+
+
+async def purchase_vip(access_token: str, plan_type: str, amount: float, idempotency_key: Optional[str] = None) -> dict:
+    """Charge the wallet and grant VIP; returns wallet_balance, is_vip and vip_expires_at."""
+    if plan_type not in VIP_PLANS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unknown VIP plan")
+    if amount <= 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Amount must be positive")
+    # The function charges the plan's own price and sets its expiry; `amount`
+    # is what the client was shown and must match.
+    return await _call("ledger_purchase_vip", {
+        "p_plan_type": plan_type,
+        "p_amount": amount,
+        "p_idempotency_key": _idempotency_key(idempotency_key),
+    }, access_token)
+
+
+async def recharge_wallet(access_token: str, amount: float, idempotency_key: Optional[str] = None) -> dict:
+    """Credit the wallet; returns wallet_balance."""
+    if amount <= 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Amount must be positive")
+    return await _call("ledger_recharge_wallet", {
+        "p_amount": amount,
+        "p_idempotency_key": _idempotency_key(idempotency_key),
+    }, access_token)
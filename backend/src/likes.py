@@ -0,0 +1,33 @@
+from typing import Any, Iterable, Set
+
+from .db import get_client
+
+# Bulk "liked by me" lookups: one likes query per track list instead of one
+# existence check per rendered TrackCard.
+
+
+def track_ids_in(data: Any) -> list:
+    if isinstance(data, dict) and isinstance(data.get("data"), list):
+        data = data["data"]
+    if isinstance(data, dict):
+        data = [data]
+    return [str(row["id"]) for row in data if isinstance(row, dict) and "id" in row]
+
+
+async def liked_track_ids(user_id: str, track_ids: Iterable[str]) -> Set[str]:
+    track_ids = list(dict.fromkeys(track_ids))
+    if not track_ids:
+        return set()
+    response = await get_client().table("likes").select("track_id").eq("user_id", user_id).in_("track_id", track_ids).execute()
+    return {str(row["track_id"]) for row in response.data}
+
+
+def annotate_liked(data: Any, liked: Set[str]) -> Any:
+    """Return a copy of a track row, row list or {"data": [...]} page with `liked_by_me` set."""
+    if isinstance(data, list):
+        return [annotate_liked(row, liked) for row in data]
+    if isinstance(data, dict) and isinstance(data.get("data"), list):
+        return {**data, "data": annotate_liked(data["data"], liked)}
+    if isinstance(data, dict) and "id" in data:
+        return {**data, "liked_by_me": str(data["id"]) in liked}
+    return data
@@ -0,0 +1,252 @@
+import asyncio
+import json
+import logging
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from .db import get_client
+
+logger = logging.getLogger(__name__)
+
+# In-process pub/sub for the live page. Clients open /live/ws (optionally
+# with ?category=) and get a snapshot of live streams, then pushed
+# stream_started / stream_ended / viewers events instead of re-polling
+# GET /live/streams. Each connection has a bounded send queue drained by its
+# own task; a client that falls that far behind is disconnected rather than
+# buffering without limit. Viewer joins/leaves are kept as in-memory deltas
+# and persisted in one RPC per interval, which returns the resulting totals
+# that are then broadcast as one coalesced viewers event per category.
+#
+# Only streams this worker knows about (from a snapshot or stream_started)
+# are counted, so a client can't queue viewer deltas the RPC would reject.
+# A viewer is the signed-in user (?token=) or, for anonymous sockets, the
+# client IP: each counts once per stream however many sockets it opens, so
+# reconnect loops and extra tabs don't inflate viewers_count. Ending a stream
+# persists its pending delta before the stream is forgotten.
+#
+# Events only reach sockets connected to the worker that handled the write;
+# with several workers, clients still see other workers' streams on their
+# next snapshot.
+
+ALL_CATEGORIES = "*"
+
+
+class _Connection:
+    def __init__(self, websocket: WebSocket, viewer: str, queue_size: int):
+        self.websocket = websocket
+        self.viewer = viewer
+        self.queue: "asyncio.Queue[Optional[str]]" = asyncio.Queue(maxsize=queue_size)
+        self.category = ALL_CATEGORIES
+        self.watching: Optional[str] = None
+        self.closed = False
+
+    def send(self, message: str) -> bool:
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def pump(self) -> None:
+        while True:
+            message = await self.queue.get()
+            if message is None:
+                return
+            await self.websocket.send_text(message)
+
+
+class LiveHub:
+    def __init__(self, send_queue_size: int = 64, flush_interval: float = 5.0):
+        self.send_queue_size = send_queue_size
+        self.flush_interval = flush_interval
+        self._subscribers: Dict[str, Set[_Connection]] = {}
+        # stream_id -> category for streams this worker knows about
+        self._stream_categories: Dict[str, str] = {}
+        # stream_id -> viewer -> open connections watching it
+        self._watchers: Dict[str, Dict[str, int]] = {}
+        self._viewer_deltas: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def connection_count(self) -> int:
+        return sum(len(connections) for connections in self._subscribers.values())
+
+    def _subscribe(self, connection: _Connection, category: str) -> None:
+        self._unsubscribe(connection)
+        connection.category = category
+        self._subscribers.setdefault(category, set()).add(connection)
+
+    def _unsubscribe(self, connection: _Connection) -> None:
+        connections = self._subscribers.get(connection.category)
+        if connections is not None:
+            connections.discard(connection)
+            if not connections:
+                del self._subscribers[connection.category]
+
+    def publish(self, category: Optional[str], event: dict) -> None:
+        # Serialize once per event, not once per subscriber.
+        message = json.dumps(event, separators=(",", ":"), default=str)
+        targets = list(self._subscribers.get(ALL_CATEGORIES, ()))
+        if category:
+            targets += self._subscribers.get(category, ())
+        for connection in targets:
+            if not connection.send(message):
+                self._drop(connection)
+
+    def _drop(self, connection: _Connection) -> None:
+        # Slow consumer: stop queueing for it and let its pump close the socket.
+        if connection.closed:
+            return
+        connection.closed = True
+        self._unsubscribe(connection)
+        self._watch(connection, None)
+        while not connection.queue.empty():
+            connection.queue.get_nowait()
+        connection.queue.put_nowait(None)
+
+    def stream_started(self, stream: dict) -> None:
+        self._stream_categories[str(stream["id"])] = stream.get("category")
+        self.publish(stream.get("category"), {"type": "stream_started", "stream": stream})
+
+    async def stream_ended(self, stream_id: str, category: Optional[str] = None) -> None:
+        delta = self._viewer_deltas.pop(stream_id, 0)
+        try:
+            await self._apply_viewer_deltas({stream_id: delta} if delta else {})
+        except Exception:
+            # Requeued; the next periodic flush retries it.
+            logger.exception("Live viewer count flush failed for ended stream %s", stream_id)
+        category = self._stream_categories.pop(stream_id, category)
+        self._watchers.pop(stream_id, None)
+        self.publish(category, {"type": "stream_ended", "stream_id": stream_id})
+
+    def remember(self, streams: List[dict]) -> None:
+        for stream in streams:
+            self._stream_categories[str(stream["id"])] = stream.get("category")
+
+    def _known_stream(self, value) -> Optional[str]:
+        try:
+            stream_id = str(uuid.UUID(str(value)))
+        except ValueError:
+            return None
+        return stream_id if stream_id in self._stream_categories else None
+
+    def _watch(self, connection: _Connection, stream_id: Optional[str]) -> None:
+        if connection.watching == stream_id:
+            return
+        for current, delta in ((connection.watching, -1), (stream_id, 1)):
+            # The previous stream may have ended since; its count is gone.
+            if current is None or current not in self._stream_categories:
+                continue
+            watchers = self._watchers.setdefault(current, {})
+            if delta < 0 and connection.viewer not in watchers:
+                continue
+            sockets = watchers.get(connection.viewer, 0) + delta
+            if sockets > 0:
+                watchers[connection.viewer] = sockets
+            else:
+                watchers.pop(connection.viewer, None)
+                if not watchers:
+                    del self._watchers[current]
+            # Only a viewer's first socket joining and last socket leaving count.
+            if sockets == (1 if delta > 0 else 0):
+                self._viewer_deltas[current] = self._viewer_deltas.get(current, 0) + delta
+        connection.watching = stream_id
+
+    async def serve(self, websocket: WebSocket, viewer: str, category: Optional[str], snapshot: Callable[[Optional[str]], Awaitable[list]]) -> None:
+        """Run one client connection until it disconnects.
+
+        `viewer` identifies who is watching ("user:<id>" or "ip:<address>").
+        Client messages: {"action": "subscribe", "category": ...},
+        {"action": "watch", "stream_id": ...} and {"action": "unwatch"}.
+        """
+        await websocket.accept()
+        connection = _Connection(websocket, viewer, self.send_queue_size)
+        self._subscribe(connection, category or ALL_CATEGORIES)
+        pump = asyncio.create_task(connection.pump())
+        try:
+            streams = await snapshot(category)
+            self.remember(streams)
+            connection.send(json.dumps({"type": "snapshot", "streams": streams}, separators=(",", ":"), default=str))
+            receiver = asyncio.create_task(self._receive(connection, snapshot))
+            done, _ = await asyncio.wait({pump, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            receiver.cancel()
+            for task in done:
+                if not task.cancelled() and task.exception() and not isinstance(task.exception(), WebSocketDisconnect):
+                    logger.warning("Live socket closed with error: %r", task.exception())
+        finally:
+            pump.cancel()
+            self._unsubscribe(connection)
+            self._watch(connection, None)
+            if connection.closed:
+                try:
+                    await websocket.close(code=1013)
+                except Exception:
+                    pass
+
+    async def _receive(self, connection: _Connection, snapshot) -> None:
+        while True:
+            message = await connection.websocket.receive_json()
+            action = message.get("action") if isinstance(message, dict) else None
+            if action == "subscribe":
+                category = message.get("category") or None
+                self._subscribe(connection, category or ALL_CATEGORIES)
+                streams = await snapshot(category)
+                self.remember(streams)
+                connection.send(json.dumps({"type": "snapshot", "streams": streams}, separators=(",", ":"), default=str))
+            elif action == "watch":
+                stream_id = self._known_stream(message.get("stream_id"))
+                if stream_id is not None:
+                    self._watch(connection, stream_id)
+            elif action == "unwatch":
+                self._watch(connection, None)
+
+    async def flush_viewers(self) -> None:
+        deltas = {stream_id: delta for stream_id, delta in self._viewer_deltas.items() if delta}
+        self._viewer_deltas = {}
+        await self._apply_viewer_deltas(deltas)
+
+    async def _apply_viewer_deltas(self, deltas: Dict[str, int]) -> None:
+        if not deltas:
+            return
+        try:
+            response = await get_client().rpc(
+                "apply_live_stream_viewer_deltas",
+                {"deltas": [{"stream_id": stream_id, "viewers": delta} for stream_id, delta in sorted(deltas.items())]},
+            ).execute()
+        except BaseException:
+            for stream_id, delta in deltas.items():
+                self._viewer_deltas[stream_id] = self._viewer_deltas.get(stream_id, 0) + delta
+            raise
+        by_category: Dict[Optional[str], Dict[str, int]] = {}
+        for row in response.data or []:
+            stream_id = str(row["stream_id"])
+            by_category.setdefault(self._stream_categories.get(stream_id), {})[stream_id] = row["viewers_count"]
+        for category, counts in by_category.items():
+            self.publish(category, {"type": "viewers", "counts": counts})
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush_viewers()
+            except Exception:
+                logger.exception("Live viewer count flush failed")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush_viewers()
+        except Exception:
+            logger.exception("Dropping unflushed live viewer counts on shutdown")
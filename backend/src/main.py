@@ -1,30 +1,77 @@
+import time
 
-from fastapi import FastAPI, Depends, HTTPException, status
+_started = time.perf_counter()
+
+from fastapi import FastAPI, Header, HTTPException, status
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List
-from datetime import datetime
+from contextlib import asynccontextmanager
+from typing import Optional
 from dotenv import load_dotenv
+import asyncio
+import hmac
+import logging
 import os
 
-from supabase import create_client, Client
-
-load_dotenv()
+from .admission import AdmissionMiddleware
+from .db import get_client, close_client
+from .metrics import MetricsMiddleware, app_startup_seconds, render_metrics
+from .responses import CompressionMiddleware, JSONResponse
+from .routers import ROUTERS, enabled_routers, import_seconds, include_routers
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY")
+logger = logging.getLogger(__name__)
 
-if not SUPABASE_URL or not SUPABASE_ANON_KEY:
-    raise ValueError("Supabase URL and Anon Key must be set in .env file")
+load_dotenv()
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
+# Nothing here connects to Supabase or needs its settings: the client is
+# created in the lifespan hook, or on first use with LAZY_INIT=1, which also
+# leaves the catalogue-wide indexes (search, trending, recommender, audio
+# analysis) unstarted so a cold serverless instance answers its first
+# request straight away; those routes use their database fallbacks. Likes,
+# plays and play history are then written on the request path (see
+# services.py), since nothing may run between requests.
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    from .search import refresh_search_index_forever
+    from .services import LAZY_INIT, audio_cache, audio_pipeline, live_hub, play_history, recommender, track_counters, trending
+
+    search_refresh = None
+    live_hub.start()
+    if not LAZY_INIT:
+        track_counters.start()
+        play_history.start()
+        get_client()
+        search_refresh = asyncio.create_task(
+            refresh_search_index_forever(float(os.getenv("SEARCH_INDEX_REFRESH_INTERVAL", "300")))
+        )
+        trending.start()
+        recommender.start()
+        audio_pipeline.start()
+    yield
+    await audio_pipeline.stop()
+    await recommender.stop()
+    await trending.stop()
+    await live_hub.stop()
+    if search_refresh is not None:
+        search_refresh.cancel()
+    await track_counters.stop()
+    await play_history.stop()
+    await audio_cache.close()
+    await close_client()
 
 app = FastAPI(
     title="BeatMM Pro Backend API",
     description="API for BeatMM Pro music streaming platform",
     version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=JSONResponse,
 )
 
+# Per-user/IP rate limits and 503s for requests shed upstream. Added first so
+# it runs inside CORS and rejected requests still carry CORS headers.
+app.add_middleware(AdmissionMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Allow all origins for now, restrict in production
@@ -33,451 +80,41 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Dependency to get current user
-async def get_current_user(token: str = Depends(lambda x: x.headers.get("Authorization"))):
-    if not token:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authorization header missing")
-    try:
-        # Remove "Bearer " prefix
-        token = token.replace("Bearer ", "")
-        user_response = supabase.auth.get_user(token)
-        if user_response.user:
-            # Fetch user profile from 'users' table
-            user_profile = supabase.from("users").select("*").eq("id", user_response.user.id).single().execute()
-            if user_profile.data:
-                return user_profile.data
-            else:
-                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User profile not found")
-        else:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid authentication token")
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=str(e))
-
-# Models
-class UserCreate(BaseModel):
-    email: EmailStr
-    password: str
-    username: str
-
-class UserLogin(BaseModel):
-    email: EmailStr
-    password: str
-
-class UserProfileUpdate(BaseModel):
-    username: Optional[str] = None
-    avatar_url: Optional[str] = None
-
-class TrackCreate(BaseModel):
-    title: str
-    artist: str
-    description: Optional[str] = None
-    audio_url: str
-    cover_url: Optional[str] = None
-    duration: int
-    genre: str
-    tags: List[str] = []
-    is_vip_only: bool = False
+# JSON bodies above the threshold go out brotli/gzip compressed.
+app.add_middleware(CompressionMiddleware, minimum_size=int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1024")))
 
-class CommentCreate(BaseModel):
-    content: str
-    track_id: str
+# Per-route latency/status and per-call Supabase timings, served at /metrics
+# to scrapers that send `Authorization: Bearer $METRICS_TOKEN`. Without
+# METRICS_TOKEN the route doesn't exist (404): route names, upstream targets
+# and traffic volumes aren't for the public.
+app.add_middleware(MetricsMiddleware)
 
-class VipPurchaseCreate(BaseModel):
-    plan_type: str  # e.g., monthly, yearly, lifetime
-    amount: float
-
-class WalletRecharge(BaseModel):
-    amount: float
-
-class LiveStreamCreate(BaseModel):
-    title: str
-    description: Optional[str] = None
-    category: str
-
-class DjApplicationCreate(BaseModel):
-    real_name: str
-    experience: str
-    portfolio_url: Optional[str] = None
-
-class AdminTrackUpdate(BaseModel):
-    is_approved: Optional[bool] = None
-    is_vip_only: Optional[bool] = None
-
-# Routes
 @app.get("/", tags=["Root"])
 async def read_root():
     return {"message": "Welcome to BeatMM Pro API!"}
 
-# Auth Routes
-@app.post("/auth/register", tags=["Auth"])
-async def register_user(user: UserCreate):
-    try:
-        # Sign up user with Supabase Auth
-        auth_response = supabase.auth.sign_up({"email": user.email, "password": user.password})
-        if auth_response.user:
-            # Create user profile in 'users' table
-            user_profile_data = {
-                "id": auth_response.user.id,
-                "email": user.email,
-                "username": user.username,
-                "is_vip": False,
-                "wallet_balance": 100, # New user bonus
-                "created_at": datetime.now().isoformat(),
-                "updated_at": datetime.now().isoformat(),
-            }
-            supabase.from("users").insert(user_profile_data).execute()
-            return {"message": "User registered successfully. Please check your email for verification.", "user_id": auth_response.user.id}
-        else:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=auth_response.session.user.identities[0].identity_data)
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
-
-@app.post("/auth/login", tags=["Auth"])
-async def login_user(user: UserLogin):
-    try:
-        auth_response = supabase.auth.sign_in_with_password({"email": user.email, "password": user.password})
-        if auth_response.user:
-            return {"message": "Login successful", "access_token": auth_response.session.access_token, "token_type": "bearer"}
-        else:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid credentials")
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
-
-@app.post("/auth/logout", tags=["Auth"])
-async def logout_user(current_user: dict = Depends(get_current_user)):
-    try:
-        supabase.auth.sign_out()
-        return {"message": "Logout successful"}
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
-
-# User Routes
-@app.get("/users/me", tags=["Users"])
-async def get_my_profile(current_user: dict = Depends(get_current_user)):
-    return current_user
-
-@app.put("/users/me", tags=["Users"])
-async def update_my_profile(profile_update: UserProfileUpdate, current_user: dict = Depends(get_current_user)):
-    try:
-        update_data = profile_update.dict(exclude_unset=True)
-        update_data["updated_at"] = datetime.now().isoformat()
-        response = supabase.from("users").update(update_data).eq("id", current_user["id"]).execute()
-        return {"message": "Profile updated successfully", "data": response.data}
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
-
-@app.get("/users/{user_id}/tracks", tags=["Users"])
-async def get_user_tracks(user_id: str):
-    try:
-        response = supabase.from("tracks").select("*").eq("user_id", user_id).order("created_at", desc=True).execute()
-        return response.data
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
-
-@app.get("/users/me/history", tags=["Users"])
-async def get_my_play_history(current_user: dict = Depends(get_current_user)):
-    try:
-        # This would typically involve a 'play_history' table linked to users and tracks
-        # For now, returning a placeholder
-        return {"message": "Play history feature coming soon", "user_id": current_user["id"]}
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
-
-@app.get("/users/me/favorites", tags=["Users"])
-async def get_my_favorites(current_user: dict = Depends(get_current_user)):
-    try:
-        response = supabase.from("likes").select("track_id").eq("user_id", current_user["id"]).execute()
-        track_ids = [item["track_id"] for item in response.data]
-        if track_ids:
-            tracks_response = supabase.from("tracks").select("*").in_("id", track_ids).execute()
-            return tracks_response.data
-        return []
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
-
-# Tracks Routes
-@app.post("/tracks", tags=["Tracks"])
-async def upload_track(track: TrackCreate, current_user: dict = Depends(get_current_user)):
-    try:
-        track_data = track.dict()
-        track_data["user_id"] = current_user["id"]
-        track_data["plays_count"] = 0
-        track_data["likes_count"] = 0
-        track_data["created_at"] = datetime.now().isoformat()
-        track_data["updated_at"] = datetime.now().isoformat()
-        response = supabase.from("tracks").insert(track_data).execute()
-        return {"message": "Track uploaded successfully", "data": response.data}
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
-
-@app.get("/tracks", tags=["Tracks"])
-async def get_tracks(query: Optional[str] = None, genre: Optional[str] = None, limit: int = 20, offset: int = 0):
-    try:
-        tracks_query = supabase.from("tracks").select("*")
-        if query:
-            tracks_query = tracks_query.or_(f"title.ilike.%{query}%", f"artist.ilike.%{query}%", f"tags.cs.{{\"{query}\"}}")
-        if genre:
-            tracks_query = tracks_query.eq("genre", genre)
-        response = tracks_query.order("created_at", desc=True).range(offset, offset + limit - 1).execute()
-        return response.data
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
-
-@app.get("/tracks/{track_id}", tags=["Tracks"])
-async def get_track_details(track_id: str):
-    try:
-        response = supabase.from("tracks").select("*").eq("id", track_id).single().execute()
-        if response.data:
-            return response.data
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Track not found")
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
-
-@app.post("/tracks/{track_id}/comments", tags=["Tracks"])
-async def add_comment_to_track(track_id: str, comment: CommentCreate, current_user: dict = Depends(get_current_user)):
-    try:
-        comment_data = {
-            "track_id": track_id,
-            "user_id": current_user["id"],
-            "content": comment.content,
-            "created_at": datetime.now().isoformat()
-        }
-        response = supabase.from("comments").insert(comment_data).execute()
-        return {"message": "Comment added successfully", "data": response.data}
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
-
-@app.get("/tracks/{track_id}/comments", tags=["Tracks"])
-async def get_track_comments(track_id: str):
-    try:
-        response = supabase.from("comments").select("*, users(username, avatar_url)").eq("track_id", track_id).order("created_at", desc=True).execute()
-        return response.data
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
-
-@app.post("/tracks/{track_id}/like", tags=["Tracks"])
-async def like_track(track_id: str, current_user: dict = Depends(get_current_user)):
-    try:
-        # Check if already liked
-        existing_like = supabase.from("likes").select("id").eq("track_id", track_id).eq("user_id", current_user["id"]).single().execute()
-        if existing_like.data:
-            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Track already liked by this user")
-
-        # Add like
-        supabase.from("likes").insert({"track_id": track_id, "user_id": current_user["id"], "created_at": datetime.now().isoformat()}).execute()
-        # Increment likes_count in tracks table (using RPC for atomic update)
-        supabase.rpc("increment_likes_count", {"track_id": track_id}).execute()
-        return {"message": "Track liked successfully"}
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
-
-@app.post("/tracks/{track_id}/unlike", tags=["Tracks"])
-async def unlike_track(track_id: str, current_user: dict = Depends(get_current_user)):
-    try:
-        # Check if liked
-        existing_like = supabase.from("likes").select("id").eq("track_id", track_id).eq("user_id", current_user["id"]).single().execute()
-        if not existing_like.data:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Track not liked by this user")
-
-        # Remove like
-        supabase.from("likes").delete().eq("track_id", track_id).eq("user_id", current_user["id"]).execute()
-        # Decrement likes_count in tracks table (using RPC for atomic update)
-        supabase.rpc("decrement_likes_count", {"track_id": track_id}).execute()
-        return {"message": "Track unliked successfully"}
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
-
-# VIP Routes
-@app.post("/vip/purchase", tags=["VIP"])
-async def purchase_vip(vip_purchase: VipPurchaseCreate, current_user: dict = Depends(get_current_user)):
-    try:
-        # Deduct from wallet (simplified, real implementation needs more checks)
-        user_profile = supabase.from("users").select("wallet_balance").eq("id", current_user["id"]).single().execute().data
-        if not user_profile or user_profile["wallet_balance"] < vip_purchase.amount:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Insufficient wallet balance")
-
-        new_balance = user_profile["wallet_balance"] - vip_purchase.amount
-        supabase.from("users").update({"wallet_balance": new_balance}).eq("id", current_user["id"]).execute()
-
-        # Update VIP status and record purchase
-        expires_at = None
-        if vip_purchase.plan_type == "monthly":
-            expires_at = (datetime.now() + timedelta(days=30)).isoformat()
-        elif vip_purchase.plan_type == "yearly":
-            expires_at = (datetime.now() + timedelta(days=365)).isoformat()
-        # For lifetime, expires_at remains None or a very distant future date
-
-        supabase.from("users").update({"is_vip": True, "vip_expires_at": expires_at}).eq("id", current_user["id"]).execute()
-        supabase.from("vip_purchases").insert({
-            "user_id": current_user["id"],
-            "plan_type": vip_purchase.plan_type,
-            "amount": vip_purchase.amount,
-            "expires_at": expires_at,
-            "created_at": datetime.now().isoformat()
-        }).execute()
-
-        # Record wallet transaction
-        supabase.from("wallet_transactions").insert({
-            "user_id": current_user["id"],
-            "type": "payment",
-            "amount": -vip_purchase.amount,
-            "description": f"购买VIP套餐: {vip_purchase.plan_type}",
-            "created_at": datetime.now().isoformat()
-        }).execute()
-
-        return {"message": "VIP purchased successfully"}
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
-
-# Wallet Routes
-@app.post("/wallet/recharge", tags=["Wallet"])
-async def recharge_wallet(recharge: WalletRecharge, current_user: dict = Depends(get_current_user)):
-    try:
-        user_profile = supabase.from("users").select("wallet_balance").eq("id", current_user["id"]).single().execute().data
-        if not user_profile:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User profile not found")
-
-        new_balance = user_profile["wallet_balance"] + recharge.amount
-        supabase.from("users").update({"wallet_balance": new_balance}).eq("id", current_user["id"]).execute()
-
-        supabase.from("wallet_transactions").insert({
-            "user_id": current_user["id"],
-            "type": "recharge",
-            "amount": recharge.amount,
-            "description": f"钱包充值: {recharge.amount}",
-            "created_at": datetime.now().isoformat()
-        }).execute()
-
-        return {"message": "Wallet recharged successfully", "new_balance": new_balance}
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
-
-@app.get("/wallet/transactions", tags=["Wallet"])
-async def get_wallet_transactions(current_user: dict = Depends(get_current_user)):
-    try:
-        response = supabase.from("wallet_transactions").select("*").eq("user_id", current_user["id"]).order("created_at", desc=True).execute()
-        return response.data
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
-
-# Live Stream Routes
-@app.post("/live/streams", tags=["Live Streams"])
-async def create_live_stream(stream: LiveStreamCreate, current_user: dict = Depends(get_current_user)):
-    try:
-        stream_data = stream.dict()
-        stream_data["dj_id"] = current_user["id"]
-        stream_data["is_live"] = True
-        stream_data["viewers_count"] = 0
-        stream_data["started_at"] = datetime.now().isoformat()
-        stream_data["created_at"] = datetime.now().isoformat()
-        response = supabase.from("live_streams").insert(stream_data).execute()
-        return {"message": "Live stream created successfully", "data": response.data}
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
-
-@app.get("/live/streams", tags=["Live Streams"])
-async def get_live_streams(is_live: Optional[bool] = None, category: Optional[str] = None):
-    try:
-        streams_query = supabase.from("live_streams").select("*, users(username, avatar_url)")
-        if is_live is not None:
-            streams_query = streams_query.eq("is_live", is_live)
-        if category:
-            streams_query = streams_query.eq("category", category)
-        response = streams_query.order("started_at", desc=True).execute()
-        return response.data
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
-
-@app.post("/live/streams/{stream_id}/end", tags=["Live Streams"])
-async def end_live_stream(stream_id: str, current_user: dict = Depends(get_current_user)):
-    try:
-        # Only the DJ who started the stream can end it
-        stream = supabase.from("live_streams").select("dj_id").eq("id", stream_id).single().execute().data
-        if not stream or stream["dj_id"] != current_user["id"]:
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to end this stream")
-
-        supabase.from("live_streams").update({"is_live": False, "ended_at": datetime.now().isoformat()}).eq("id", stream_id).execute()
-        return {"message": "Live stream ended"}
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
-
-# DJ Routes
-@app.post("/dj/apply", tags=["DJ"])
-async def apply_for_dj(application: DjApplicationCreate, current_user: dict = Depends(get_current_user)):
-    try:
-        application_data = application.dict()
-        application_data["user_id"] = current_user["id"]
-        application_data["status"] = "pending"
-        application_data["created_at"] = datetime.now().isoformat()
-        response = supabase.from("dj_applications").insert(application_data).execute()
-        return {"message": "DJ application submitted successfully", "data": response.data}
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
-
-@app.get("/dj/status", tags=["DJ"])
-async def get_dj_status(current_user: dict = Depends(get_current_user)):
-    try:
-        response = supabase.from("dj_applications").select("*").eq("user_id", current_user["id"]).order("created_at", desc=True).limit(1).single().execute()
-        if response.data:
-            return response.data
-        return {"status": "not_applied"}
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
-
-# Admin Routes (requires admin role, not implemented yet)
-@app.get("/admin/users", tags=["Admin"])
-async def get_all_users(current_user: dict = Depends(get_current_user)):
-    # Placeholder for admin check
-    if not current_user.get("is_admin"): # Assume an 'is_admin' field in user profile
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
-    try:
-        response = supabase.from("users").select("*").order("created_at", desc=True).execute()
-        return response.data
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
-
-@app.put("/admin/tracks/{track_id}", tags=["Admin"])
-async def update_track_by_admin(track_id: str, update_data: AdminTrackUpdate, current_user: dict = Depends(get_current_user)):
-    # Placeholder for admin check
-    if not current_user.get("is_admin"): 
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
-    try:
-        response = supabase.from("tracks").update(update_data.dict(exclude_unset=True)).eq("id", track_id).execute()
-        return {"message": "Track updated by admin", "data": response.data}
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
-
-@app.get("/admin/dj_applications", tags=["Admin"])
-async def get_dj_applications(status: Optional[str] = None, current_user: dict = Depends(get_current_user)):
-    # Placeholder for admin check
-    if not current_user.get("is_admin"): 
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
-    try:
-        query = supabase.from("dj_applications").select("*, users(username, email)")
-        if status:
-            query = query.eq("status", status)
-        response = query.order("created_at", desc=True).execute()
-        return response.data
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
-
-@app.post("/admin/dj_applications/{application_id}/approve", tags=["Admin"])
-async def approve_dj_application(application_id: str, current_user: dict = Depends(get_current_user)):
-    # Placeholder for admin check
-    if not current_user.get("is_admin"): 
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
-    try:
-        # Update application status
-        supabase.from("dj_applications").update({"status": "approved"}).eq("id", application_id).execute()
-        
-        # Get user_id from application and update user role/status
-        application_data = supabase.from("dj_applications").select("user_id").eq("id", application_id).single().execute().data
-        if application_data and application_data["user_id"]:
-            supabase.from("users").update({"is_dj": True}).eq("id", application_data["user_id"]).execute() # Assume 'is_dj' field
-
-        return {"message": "DJ application approved"}
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+@app.get("/metrics", tags=["Root"], include_in_schema=False)
+async def metrics(authorization: Optional[str] = Header(None, alias="Authorization")):
+    expected = os.getenv("METRICS_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), expected.encode()):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token", headers={"WWW-Authenticate": "Bearer"})
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+include_routers(app, enabled_routers(os.getenv("API_ROUTERS", ",".join(ROUTERS))))
+
+# Startup report: how long importing and building the app took, by phase.
+# `python -m bench.coldstart` breaks the imports down per module.
+import_seconds["total"] = time.perf_counter() - _started
+for phase, seconds in import_seconds.items():
+    app_startup_seconds.set(seconds, phase)
+logger.info(
+    "App ready in %.0f ms (%s)",
+    import_seconds["total"] * 1000,
+    ", ".join(f"{phase} {seconds * 1000:.0f} ms" for phase, seconds in import_seconds.items() if phase != "total"),
+)
 
 # Database functions (RPC calls)
 # These functions need to be created as SQL functions in Supabase
@@ -505,6 +142,195 @@ async def approve_dj_application(application_id: str, current_user: dict = Depen
 # END;
 # $$;
 
-from datetime import timedelta
-
+# Keyset pagination seeks on (created_at, id); back it with matching indexes:
+# CREATE INDEX IF NOT EXISTS tracks_created_at_id_idx ON tracks (created_at DESC, id DESC);
+# CREATE INDEX IF NOT EXISTS comments_track_created_at_id_idx ON comments (track_id, created_at DESC, id DESC);
+# CREATE INDEX IF NOT EXISTS wallet_transactions_user_created_at_id_idx ON wallet_transactions (user_id, created_at DESC, id DESC);
+# CREATE INDEX IF NOT EXISTS users_created_at_id_idx ON users (created_at DESC, id DESC);
+
+# Write-behind like/play counters flush through a single bulk update; the new
+# totals are returned so the search index can re-rank those tracks:
+# DROP FUNCTION IF EXISTS apply_track_counter_deltas(jsonb);
+# CREATE OR REPLACE FUNCTION apply_track_counter_deltas(deltas jsonb)
+# RETURNS TABLE(track_id uuid, likes_count int, plays_count int) LANGUAGE sql AS $$
+#   UPDATE tracks t
+#   SET likes_count = t.likes_count + d.likes, plays_count = t.plays_count + d.plays
+#   FROM jsonb_to_recordset(deltas) AS d(track_id uuid, likes int, plays int)
+#   WHERE t.id = d.track_id
+#   RETURNING t.id, t.likes_count, t.plays_count;
+# $$;
+# likes needs UNIQUE (track_id, user_id) so duplicate likes fail with 23505.
+
+# Play history is written in bulk batches by the ingestion pipeline:
+# CREATE TABLE IF NOT EXISTS play_history (
+#   id bigint GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+#   user_id uuid NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+#   track_id uuid NOT NULL REFERENCES tracks(id) ON DELETE CASCADE,
+#   played_at timestamptz NOT NULL DEFAULT now()
+# );
+# CREATE INDEX IF NOT EXISTS play_history_user_played_at_idx ON play_history (user_id, played_at DESC);
+
+# Live viewer counts are persisted as coalesced deltas; the new totals are
+# returned so the hub can broadcast them:
+# CREATE OR REPLACE FUNCTION apply_live_stream_viewer_deltas(deltas jsonb)
+# RETURNS TABLE(stream_id uuid, viewers_count int) LANGUAGE sql AS $$
+#   UPDATE live_streams s
+#   SET viewers_count = GREATEST(s.viewers_count + d.viewers, 0)
+#   FROM jsonb_to_recordset(deltas) AS d(stream_id uuid, viewers int)
+#   WHERE s.id = d.stream_id
+#   RETURNING s.id, s.viewers_count;
+# $$;
 
+# Wallet and VIP writes are single atomic RPCs keyed by an idempotency key
+# (see src/ledger.py). They run as the calling user via auth.uid(). Being
+# SECURITY DEFINER functions that any signed-in user can call directly through
+# PostgREST, they validate their own arguments: VIP prices and durations come
+# from vip_plans, never from the caller.
+# CREATE TABLE IF NOT EXISTS vip_plans (
+#   plan_type text PRIMARY KEY,
+#   price numeric NOT NULL CHECK (price > 0),
+#   days int CHECK (days > 0) -- NULL for lifetime
+# );
+# INSERT INTO vip_plans (plan_type, price, days) VALUES ('monthly', 99, 30), ('yearly', 999, 365), ('lifetime', 4999, NULL)
+# ON CONFLICT (plan_type) DO NOTHING;
+#
+# CREATE TABLE IF NOT EXISTS ledger_requests (
+#   user_id uuid NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+#   idempotency_key text NOT NULL,
+#   result jsonb NOT NULL,
+#   created_at timestamptz NOT NULL DEFAULT now(),
+#   PRIMARY KEY (user_id, idempotency_key)
+# );
+#
+# -- p_amount is the price the client showed; it must match the plan's.
+# CREATE OR REPLACE FUNCTION ledger_purchase_vip(p_plan_type text, p_amount numeric, p_idempotency_key text)
+# RETURNS jsonb LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+# DECLARE
+#   v_user uuid := auth.uid();
+#   v_plan vip_plans%ROWTYPE;
+#   v_expires_at timestamptz;
+#   v_balance numeric;
+#   v_result jsonb;
+# BEGIN
+#   IF v_user IS NULL THEN RAISE EXCEPTION 'not_authenticated'; END IF;
+#   SELECT * INTO v_plan FROM vip_plans WHERE plan_type = p_plan_type;
+#   IF NOT FOUND THEN RAISE EXCEPTION 'unknown_plan'; END IF;
+#   IF p_amount IS DISTINCT FROM v_plan.price THEN RAISE EXCEPTION 'price_mismatch'; END IF;
+#   -- Serializes concurrent retries of the same request
+#   PERFORM pg_advisory_xact_lock(hashtext(v_user::text || p_idempotency_key));
+#   SELECT result INTO v_result FROM ledger_requests WHERE user_id = v_user AND idempotency_key = p_idempotency_key;
+#   IF FOUND THEN RETURN v_result; END IF;
+#   -- Lifetime plans have no expiry
+#   v_expires_at := CASE WHEN v_plan.days IS NULL THEN NULL ELSE now() + make_interval(days => v_plan.days) END;
+#   UPDATE users SET wallet_balance = wallet_balance - v_plan.price, is_vip = true, vip_expires_at = v_expires_at, updated_at = now()
+#   WHERE id = v_user AND wallet_balance >= v_plan.price
+#   RETURNING wallet_balance INTO v_balance;
+#   IF NOT FOUND THEN RAISE EXCEPTION 'insufficient_balance'; END IF;
+#   INSERT INTO vip_purchases (user_id, plan_type, amount, expires_at, created_at)
+#   VALUES (v_user, p_plan_type, v_plan.price, v_expires_at, now());
+#   INSERT INTO wallet_transactions (user_id, type, amount, description, created_at)
+#   VALUES (v_user, 'payment', -v_plan.price, '购买VIP套餐: ' || p_plan_type, now());
+#   v_result := jsonb_build_object('wallet_balance', v_balance, 'is_vip', true, 'vip_expires_at', v_expires_at);
+#   INSERT INTO ledger_requests (user_id, idempotency_key, result) VALUES (v_user, p_idempotency_key, v_result);
+#   RETURN v_result;
+# END;
+# $$;
+#
+# CREATE OR REPLACE FUNCTION ledger_recharge_wallet(p_amount numeric, p_idempotency_key text)
+# RETURNS jsonb LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+# DECLARE
+#   v_user uuid := auth.uid();
+#   v_balance numeric;
+#   v_result jsonb;
+# BEGIN
+#   IF v_user IS NULL THEN RAISE EXCEPTION 'not_authenticated'; END IF;
+#   IF p_amount IS NULL OR p_amount <= 0 THEN RAISE EXCEPTION 'invalid_amount'; END IF;
+#   PERFORM pg_advisory_xact_lock(hashtext(v_user::text || p_idempotency_key));
+#   SELECT result INTO v_result FROM ledger_requests WHERE user_id = v_user AND idempotency_key = p_idempotency_key;
+#   IF FOUND THEN RETURN v_result; END IF;
+#   UPDATE users SET wallet_balance = wallet_balance + p_amount, updated_at = now()
+#   WHERE id = v_user
+#   RETURNING wallet_balance INTO v_balance;
+#   IF NOT FOUND THEN RAISE EXCEPTION 'user_not_found'; END IF;
+#   INSERT INTO wallet_transactions (user_id, type, amount, description, created_at)
+#   VALUES (v_user, 'recharge', p_amount, '钱包充值: ' || p_amount, now());
+#   v_result := jsonb_build_object('wallet_balance', v_balance);
+#   INSERT INTO ledger_requests (user_id, idempotency_key, result) VALUES (v_user, p_idempotency_key, v_result);
+#   RETURN v_result;
+# END;
+# $$;
+#
+# -- Functions are executable by PUBLIC by default; only signed-in users may
+# -- call these (auth.uid() identifies them).
+# DROP FUNCTION IF EXISTS ledger_purchase_vip(text, numeric, timestamptz, text);
+# REVOKE EXECUTE ON FUNCTION ledger_purchase_vip(text, numeric, text) FROM PUBLIC, anon;
+# REVOKE EXECUTE ON FUNCTION ledger_recharge_wallet(numeric, text) FROM PUBLIC, anon;
+# GRANT EXECUTE ON FUNCTION ledger_purchase_vip(text, numeric, text) TO authenticated;
+# GRANT EXECUTE ON FUNCTION ledger_recharge_wallet(numeric, text) TO authenticated;
+
+# The trending reload (src/trending.py) reads the last week of events newest
+# first:
+# CREATE INDEX IF NOT EXISTS play_history_played_at_id_idx ON play_history (played_at DESC, id DESC);
+# CREATE INDEX IF NOT EXISTS likes_created_at_id_idx ON likes (created_at DESC, id DESC);
+# CREATE INDEX IF NOT EXISTS comments_created_at_id_idx ON comments (created_at DESC, id DESC);
+
+# Upload analysis results (src/audio_pipeline.py); peaks are base64 int8:
+# CREATE TABLE IF NOT EXISTS track_audio_analysis (
+#   track_id uuid PRIMARY KEY REFERENCES tracks(id) ON DELETE CASCADE,
+#   duration double precision NOT NULL,
+#   loudness_lufs real,
+#   peaks text NOT NULL,
+#   points int NOT NULL,
+#   sample_rate int NOT NULL,
+#   analyzed_at timestamptz NOT NULL DEFAULT now()
+# );
+# ALTER TABLE tracks ADD COLUMN IF NOT EXISTS loudness_lufs real;
+
+# Admin dashboard totals and hourly/daily rollups (src/admin_stats.py),
+# recomputed periodically; only admins may call it:
+# CREATE OR REPLACE FUNCTION admin_stats_snapshot(p_hours int, p_days int)
+# RETURNS jsonb LANGUAGE plpgsql STABLE SECURITY DEFINER SET search_path = public AS $$
+# DECLARE
+#   v_since timestamptz := date_trunc('day', now()) - make_interval(days => p_days - 1);
+# BEGIN
+#   IF NOT EXISTS (SELECT 1 FROM users WHERE id = auth.uid() AND is_admin) THEN RAISE EXCEPTION 'not_admin'; END IF;
+#   RETURN (
+#     WITH events(at, metric, value) AS (
+#       SELECT created_at, 'registrations', 1::numeric FROM users WHERE created_at >= v_since
+#       UNION ALL SELECT created_at, 'uploads', 1 FROM tracks WHERE created_at >= v_since
+#       UNION ALL SELECT created_at, 'vip_purchases', 1 FROM vip_purchases WHERE created_at >= v_since
+#       UNION ALL SELECT created_at, 'vip_revenue', amount FROM vip_purchases WHERE created_at >= v_since
+#       UNION ALL SELECT created_at, 'recharges', 1 FROM wallet_transactions WHERE type = 'recharge' AND created_at >= v_since
+#       UNION ALL SELECT created_at, 'recharge_amount', amount FROM wallet_transactions WHERE type = 'recharge' AND created_at >= v_since
+#       UNION ALL SELECT created_at, 'dj_applications', 1 FROM dj_applications WHERE created_at >= v_since
+#     )
+#     SELECT jsonb_build_object(
+#       'totals', jsonb_build_object(
+#         'users', (SELECT count(*) FROM users),
+#         'vip_users', (SELECT count(*) FROM users WHERE is_vip AND (vip_expires_at IS NULL OR vip_expires_at > now())),
+#         'tracks', (SELECT count(*) FROM tracks),
+#         'vip_purchases', (SELECT count(*) FROM vip_purchases),
+#         'vip_revenue', (SELECT coalesce(sum(amount), 0) FROM vip_purchases),
+#         'recharges', (SELECT count(*) FROM wallet_transactions WHERE type = 'recharge'),
+#         'recharge_amount', (SELECT coalesce(sum(amount), 0) FROM wallet_transactions WHERE type = 'recharge'),
+#         'dj_applications', (SELECT count(*) FROM dj_applications),
+#         'dj_applications_pending', (SELECT count(*) FROM dj_applications WHERE status = 'pending')
+#       ),
+#       'hourly', (
+#         SELECT coalesce(jsonb_agg(jsonb_build_object('start', start, 'metric', metric, 'value', value)), '[]')
+#         FROM (SELECT date_trunc('hour', at) AS start, metric, sum(value) AS value FROM events
+#               WHERE at >= date_trunc('hour', now()) - make_interval(hours => p_hours - 1) GROUP BY 1, 2) h
+#       ),
+#       'daily', (
+#         SELECT coalesce(jsonb_agg(jsonb_build_object('start', start, 'metric', metric, 'value', value)), '[]')
+#         FROM (SELECT date_trunc('day', at) AS start, metric, sum(value) AS value FROM events GROUP BY 1, 2) d
+#       )
+#     )
+#   );
+# END;
+# $$;
+# CREATE INDEX IF NOT EXISTS vip_purchases_created_at_idx ON vip_purchases (created_at);
+# CREATE INDEX IF NOT EXISTS wallet_transactions_type_created_at_idx ON wallet_transactions (type, created_at);
+# CREATE INDEX IF NOT EXISTS dj_applications_created_at_idx ON dj_applications (created_at);
+# REVOKE EXECUTE ON FUNCTION admin_stats_snapshot(int, int) FROM PUBLIC, anon;
+# GRANT EXECUTE ON FUNCTION admin_stats_snapshot(int, int) TO authenticated;
@@ -0,0 +1,223 @@
+import contextvars
+import logging
+import os
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+# Request and upstream instrumentation, exposed in Prometheus text format at
+# GET /metrics. MetricsMiddleware times every HTTP request by route template;
+# InstrumentedTransport sits under the shared httpx client from db.py, so
+# every PostgREST, RPC and GoTrue round trip is timed per table/operation and
+# attributed to the request that made it. Slow requests are logged (sampled)
+# with their upstream breakdown.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CALL_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21)
+
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "1"))
+SLOW_REQUEST_SAMPLE_RATE = float(os.getenv("SLOW_REQUEST_SAMPLE_RATE", "1"))
+
+LabelValues = Tuple[str, ...]
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...]):
+        self.name, self.help, self.labels = name, help, labels
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self, kind: str = "counter") -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {kind}"]
+        for labels, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_labels(self.labels, labels)} {value:g}")
+        return lines
+
+
+class Gauge(Counter):
+    def dec(self, *labels: str) -> None:
+        self.inc(*labels, amount=-1)
+
+    def set(self, value: float, *labels: str) -> None:
+        self.values[labels] = value
+
+    def render(self, kind: str = "gauge") -> List[str]:
+        return super().render(kind)
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...], buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self.values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += 1
+        series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self.values.items()):
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), labels + (f'{bound:g}',))} {count:g}")
+            lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), labels + ('+Inf',))} {series[-2]:g}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, labels)} {series[-1]:g}")
+            lines.append(f"{self.name}_count{_labels(self.labels, labels)} {series[-2]:g}")
+        return lines
+
+
+def _labels(names: Tuple[str, ...], values: LabelValues) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+http_request_duration = Histogram("http_request_duration_seconds", "HTTP request latency by route.", ("method", "route"))
+http_requests_total = Counter("http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+# The route is only known once routing has run, so in-flight is per method.
+http_requests_in_flight = Gauge("http_requests_in_flight", "HTTP requests currently being served.", ("method",))
+http_request_upstream_calls = Histogram(
+    "http_request_upstream_calls", "Supabase round trips made per HTTP request.", ("method", "route"), CALL_COUNT_BUCKETS
+)
+upstream_request_duration = Histogram(
+    "upstream_request_duration_seconds", "Supabase round-trip latency by service, target and operation.", ("service", "target", "operation")
+)
+upstream_requests_total = Counter(
+    "upstream_requests_total", "Supabase round trips by service, target, operation and status.", ("service", "target", "operation", "status")
+)
+upstream_in_flight = Gauge("upstream_in_flight", "Supabase round trips currently running.", ())
+upstream_queue_wait = Histogram("upstream_queue_wait_seconds", "Time spent waiting for an upstream slot.", ())
+upstream_shed_total = Counter("upstream_shed_total", "Supabase calls refused because too many were running or waiting.", ())
+upstream_coalesced_total = Counter("upstream_coalesced_total", "Supabase GETs answered by an identical call already in flight.", ())
+admission_rejections_total = Counter(
+    "admission_rejections_total", "HTTP requests answered 429 (rate_limited) or 503 (upstream_overloaded).", ("group", "reason")
+)
+app_startup_seconds = Gauge("app_startup_seconds", "Wall time of each startup phase of this process.", ("phase",))
+
+_METRICS = (
+    http_request_duration, http_requests_total, http_requests_in_flight, http_request_upstream_calls,
+    upstream_request_duration, upstream_requests_total, upstream_in_flight, upstream_queue_wait, upstream_shed_total,
+    upstream_coalesced_total, admission_rejections_total, app_startup_seconds,
+)
+
+# Upstream calls made while handling the current request: (service, target, operation, seconds)
+_request_calls: contextvars.ContextVar[Optional[List[Tuple[str, str, str, float]]]] = contextvars.ContextVar(
+    "request_upstream_calls", default=None
+)
+
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for metric in _METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def classify_upstream(request: httpx.Request) -> Tuple[str, str, str]:
+    """Map a Supabase HTTP call to (service, target, operation)."""
+    parts = request.url.path.strip("/").split("/")
+    service = parts[0] if parts else ""
+    if service == "rest" and len(parts) >= 3:
+        if parts[2] == "rpc" and len(parts) >= 4:
+            return "rest", parts[3], "rpc"
+        operation = {
+            "GET": "select", "HEAD": "select", "POST": "insert", "PATCH": "update", "DELETE": "delete",
+        }.get(request.method, request.method.lower())
+        if operation == "insert" and "merge-duplicates" in request.headers.get("prefer", ""):
+            operation = "upsert"
+        return "rest", parts[2], operation
+    if service in ("auth", "storage", "functions") and len(parts) >= 3:
+        return service, parts[2], request.method.lower()
+    return service or "other", request.url.path, request.method.lower()
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        service, target, operation = classify_upstream(request)
+        start = time.perf_counter()
+        status = "error"
+        try:
+            response = await self._transport.handle_async_request(request)
+            status = str(response.status_code)
+            return response
+        finally:
+            elapsed = time.perf_counter() - start
+            upstream_request_duration.observe(elapsed, service, target, operation)
+            upstream_requests_total.inc(service, target, operation, status)
+            calls = _request_calls.get()
+            if calls is not None:
+                calls.append((service, target, operation, elapsed))
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware so streaming and WebSocket traffic pass untouched."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self._route_paths: Optional[Dict[object, str]] = None
+
+    def _route_for(self, scope: Scope) -> str:
+        if self._route_paths is None:
+            self._route_paths = {
+                getattr(route, "endpoint", None): route.path for route in scope["app"].routes if hasattr(route, "path")
+            }
+        # Unmatched paths share one label to keep cardinality bounded.
+        return self._route_paths.get(scope.get("endpoint"), "unmatched")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        calls: List[Tuple[str, str, str, float]] = []
+        token = _request_calls.set(calls)
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc(method)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_requests_in_flight.dec(method)
+            _request_calls.reset(token)
+            route = self._route_for(scope)
+            http_request_duration.observe(elapsed, method, route)
+            http_requests_total.inc(method, route, str(status_code))
+            http_request_upstream_calls.observe(len(calls), method, route)
+            if elapsed >= SLOW_REQUEST_SECONDS and random.random() < SLOW_REQUEST_SAMPLE_RATE:
+                breakdown = ", ".join(f"{service}:{target}:{operation}={seconds * 1000:.1f}ms" for service, target, operation, seconds in calls)
+                logger.warning(
+                    "Slow request %s %s -> %s in %.1fms with %d upstream calls [%s]",
+                    method, route, status_code, elapsed * 1000, len(calls), breakdown,
+                )
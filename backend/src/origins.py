@@ -0,0 +1,55 @@
+import os
+from typing import Optional, Set, Tuple
+from urllib.parse import unquote, urlsplit
+
+# Which URLs the server itself may fetch audio from. audio_url is supplied by
+# the uploader, and both the stream cache (audio_cache.py) and the analysis
+# workers (audio_analysis.py) download it, so anything else would let a user
+# make the server read internal hosts or cloud metadata endpoints back to
+# them. Allowed: Supabase Storage objects on SUPABASE_URL's origin, plus any
+# origins listed in AUDIO_ORIGINS (comma-separated, e.g. a storage CDN).
+
+STORAGE_PATH_PREFIX = "/storage/v1/object/"
+
+Origin = Tuple[str, str, int]
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def _origin(url: str) -> Optional[Origin]:
+    try:
+        parsed = urlsplit(url.strip())
+        port = parsed.port
+    except ValueError:
+        return None
+    if parsed.scheme not in _DEFAULT_PORTS or not parsed.hostname or parsed.username or parsed.password:
+        return None
+    return parsed.scheme, parsed.hostname.lower(), port or _DEFAULT_PORTS[parsed.scheme]
+
+
+def _extra_origins() -> Set[Origin]:
+    origins = (_origin(value) for value in os.getenv("AUDIO_ORIGINS", "").split(",") if value.strip())
+    return {origin for origin in origins if origin is not None}
+
+
+def is_allowed_audio_url(url: str) -> bool:
+    origin = _origin(url)
+    if origin is None:
+        return False
+    path = unquote(urlsplit(url).path)
+    if "\\" in path or ".." in path.split("/"):
+        return False
+    if origin in _extra_origins():
+        return True
+    supabase_url = os.getenv("SUPABASE_URL")
+    return bool(supabase_url) and origin == _origin(supabase_url) and path.startswith(STORAGE_PATH_PREFIX)
+
+
+class OriginNotAllowed(Exception):
+    pass
+
+
+def check_audio_url(url: str) -> str:
+    if not is_allowed_audio_url(url):
+        raise OriginNotAllowed("audio_url must point to Supabase Storage")
+    return url
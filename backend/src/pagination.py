@@ -0,0 +1,61 @@
+import base64
+import json
+import re
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+# Keyset ("cursor") pagination over (created_at, id), newest first. Unlike
+# .range(offset, ...) the database seeks straight to the cursor position, so
+# page N costs the same as page 1 and concurrent inserts don't shift rows
+# between pages. The cursor is an opaque url-safe token for clients.
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def clamp_limit(limit: Optional[int], default: int = DEFAULT_PAGE_SIZE) -> int:
+    if limit is None:
+        return default
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def encode_cursor(row: dict, column: str = "created_at") -> str:
+    raw = json.dumps([row[column], str(row["id"])], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        position, row_id = json.loads(raw)
+        # Both values end up inside a PostgREST filter, so only accept
+        # well-formed timestamps and ids.
+        datetime.fromisoformat(position)
+        if not _ID_PATTERN.match(row_id):
+            raise ValueError(row_id)
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return position, row_id
+
+
+def apply_keyset(query, after: Optional[Tuple[str, str]], limit: int, column: str = "created_at"):
+    """Order `query` newest first and restrict it to the rows after `after`.
+
+    `after` is a decoded cursor. One extra row is requested so the caller can
+    tell whether a next page exists; pass the result rows to page().
+    """
+    if after:
+        position, row_id = after
+        query = query.or_(f'{column}.lt."{position}",and({column}.eq."{position}",id.lt.{row_id})')
+    return query.order(column, desc=True).order("id", desc=True).limit(limit + 1)
+
+
+def page(rows: List[dict], limit: int, column: str = "created_at") -> Tuple[List[dict], Optional[str]]:
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1], column)
+    return rows, None
@@ -0,0 +1,294 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Deque, Dict, List, Optional, Tuple
+
+from postgrest.exceptions import APIError
+
+from .db import FOREIGN_KEY_VIOLATION, get_client
+
+logger = logging.getLogger(__name__)
+
+# Play history ingestion. record() is synchronous and never waits on the
+# database: the event goes into the user's ring buffer of recent plays (which
+# serves the first pages of /users/me/history) and onto a bounded queue. A
+# background worker drains the queue in micro-batches (by size or by time)
+# with one bulk INSERT into play_history per batch. When the queue is full or
+# an insert fails, events are appended to a local spill file instead and
+# replayed once the upstream recovers; without a spill path they are shed.
+# Plays of tracks (or by users) deleted in the meantime fail the foreign key;
+# those rows are dropped and the rest of the batch is inserted. With
+# write_through (serverless, no worker between requests) the recording route
+# calls persist() to insert its plays before responding.
+#
+# History pages collapse consecutive replays of a track into one entry with
+# `played_at` (newest play), `first_played_at` (oldest play) and `plays`.
+# Entries are only returned once the run is complete, and the next page
+# continues strictly before the last entry's first_played_at, so a run is
+# never split or counted twice across pages, the buffer and the table.
+
+TRACK_COLUMNS = "id, title, artist, cover_url, duration"
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def played_at_key(entry: dict) -> datetime:
+    # Postgres trims trailing zeros from fractional seconds, so compare parsed
+    # timestamps rather than strings.
+    return datetime.fromisoformat(entry["played_at"])
+
+
+def collapse(entries: List[dict]) -> List[dict]:
+    """Merge consecutive replays of the same track (newest-first input)."""
+    collapsed: List[dict] = []
+    for entry in entries:
+        first_played_at = entry.get("first_played_at", entry["played_at"])
+        if collapsed and collapsed[-1]["track_id"] == entry["track_id"]:
+            collapsed[-1]["plays"] += entry.get("plays", 1)
+            collapsed[-1]["first_played_at"] = first_played_at
+        else:
+            collapsed.append({
+                "track_id": entry["track_id"],
+                "played_at": entry["played_at"],
+                "first_played_at": first_played_at,
+                "plays": entry.get("plays", 1),
+            })
+    return collapsed
+
+
+class PlayHistoryPipeline:
+    def __init__(
+        self,
+        batch_size: int = 500,
+        batch_wait: float = 1.0,
+        queue_size: int = 10000,
+        spill_path: Optional[str] = None,
+        recent_size: int = 200,
+        max_users: int = 10000,
+        reseed_after: float = 60.0,
+        write_through: bool = False,
+    ):
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.spill_path = spill_path
+        self.recent_size = recent_size
+        self.max_users = max_users
+        self.reseed_after = reseed_after
+        self.write_through = write_through
+        self.shed_count = 0
+        self._queue: "asyncio.Queue[dict]" = asyncio.Queue(maxsize=queue_size)
+        # user_id -> (monotonic time the buffer was last seeded from the
+        # database or 0, newest-last deque of plays). Reseeding picks up
+        # plays recorded by other workers.
+        self._recent: "OrderedDict[str, Tuple[float, Deque[dict]]]" = OrderedDict()
+        self._batch: List[dict] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, user_id: str, track_id: str) -> None:
+        event = {"user_id": user_id, "track_id": track_id, "played_at": _now()}
+        self._remember(user_id, event)
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self._spill([event])
+
+    def _remember(self, user_id: str, event: dict) -> None:
+        seeded_at, items = self._recent.get(user_id, (0.0, None))
+        if items is None:
+            items = deque(maxlen=self.recent_size)
+            self._recent[user_id] = (seeded_at, items)
+        self._recent.move_to_end(user_id)
+        items.append({"track_id": event["track_id"], "played_at": event["played_at"]})
+        while len(self._recent) > self.max_users:
+            self._recent.popitem(last=False)
+
+    async def _fetch(self, user_id: str, before: Optional[str], limit: int) -> List[dict]:
+        # Newest-first plays from the table, strictly older than `before`.
+        query = get_client().table("play_history").select("track_id, played_at").eq("user_id", user_id)
+        if before is not None:
+            query = query.lt("played_at", before)
+        response = await query.order("played_at", desc=True).limit(limit).execute()
+        return response.data
+
+    async def recent(self, user_id: str) -> List[dict]:
+        """Newest-first plays held in the ring buffer."""
+        seeded_at, items = self._recent.get(user_id, (0.0, None))
+        if time.monotonic() - seeded_at > self.reseed_after:
+            stored = await self._fetch(user_id, None, self.recent_size)
+            # Events recorded here may still be queued, so merge them in.
+            local = list(items or [])
+            seen = {(entry["track_id"], played_at_key(entry)) for entry in local}
+            merged = local + [
+                {"track_id": entry["track_id"], "played_at": entry["played_at"]}
+                for entry in stored if (entry["track_id"], played_at_key(entry)) not in seen
+            ]
+            merged.sort(key=played_at_key)
+            items = deque(merged, maxlen=self.recent_size)
+            self._recent[user_id] = (time.monotonic(), items)
+            while len(self._recent) > self.max_users:
+                self._recent.popitem(last=False)
+        self._recent.move_to_end(user_id)
+        return [dict(entry) for entry in reversed(items)]
+
+    async def older(self, user_id: str, before: str, count: int) -> List[dict]:
+        """Up to `count` complete collapsed entries strictly older than `before`, read from the table."""
+        plays: List[dict] = []
+        while True:
+            page_size = max(count, 1) * 3
+            rows = await self._fetch(user_id, before, page_size)
+            plays += rows
+            entries = collapse(plays)
+            if len(rows) < page_size:
+                return entries
+            if len(entries) > count:
+                # The last run may continue in the next page of rows.
+                return entries[:count]
+            before = rows[-1]["played_at"]
+
+    async def history(self, user_id: str, limit: int, before: Optional[str] = None) -> Tuple[List[dict], bool]:
+        """One page of collapsed history older than `before`; returns (entries, has_more)."""
+        plays = await self.recent(user_id)
+        if before is not None:
+            plays = [play for play in plays if played_at_key(play) < played_at_key({"played_at": before})]
+        entries = collapse(plays)
+        # The buffer's oldest run may continue in the table, so unless there
+        # are more than `limit` entries, continue from the table.
+        if len(entries) <= limit:
+            oldest = plays[-1]["played_at"] if plays else before
+            if oldest is not None:
+                # One extra in case the first one continues the buffer's run.
+                older = await self.older(user_id, oldest, limit + 2 - len(entries))
+                if entries and older and older[0]["track_id"] == entries[-1]["track_id"]:
+                    run = older.pop(0)
+                    entries[-1]["plays"] += run["plays"]
+                    entries[-1]["first_played_at"] = run["first_played_at"]
+                entries += older
+        return entries[:limit], len(entries) > limit
+
+    def _spill(self, events: List[dict]) -> None:
+        if not self.spill_path:
+            self.shed_count += len(events)
+            return
+        with open(self.spill_path, "a", encoding="utf-8") as spill:
+            for event in events:
+                spill.write(json.dumps(event, separators=(",", ":")) + "\n")
+
+    async def _insert(self, events: List[dict]) -> None:
+        try:
+            await get_client().table("play_history").insert(events).execute()
+        except APIError as e:
+            if e.code != FOREIGN_KEY_VIOLATION:
+                raise
+            valid = await self._drop_orphans(events)
+            logger.warning("Dropped %d play events for deleted tracks or users", len(events) - len(valid))
+            if valid:
+                await get_client().table("play_history").insert(valid).execute()
+
+    async def _drop_orphans(self, events: List[dict]) -> List[dict]:
+        # Only the events whose track and user still exist.
+        existing = {}
+        for table, column in (("tracks", "track_id"), ("users", "user_id")):
+            ids = list({str(event[column]) for event in events})
+            response = await get_client().table(table).select("id").in_("id", ids).execute()
+            existing[column] = {str(row["id"]) for row in response.data}
+        return [event for event in events if str(event["track_id"]) in existing["track_id"] and str(event["user_id"]) in existing["user_id"]]
+
+    async def _replay_spill(self) -> None:
+        if not self.spill_path or not os.path.exists(self.spill_path):
+            return
+        replaying = self.spill_path + ".replaying"
+        if not os.path.exists(replaying):
+            os.replace(self.spill_path, replaying)
+        with open(replaying, encoding="utf-8") as spill:
+            events = [json.loads(line) for line in spill if line.strip()]
+        for start in range(0, len(events), self.batch_size):
+            try:
+                await self._insert(events[start:start + self.batch_size])
+            except BaseException:
+                # Keep only what is still unsent for the next attempt.
+                with open(replaying, "w", encoding="utf-8") as spill:
+                    for event in events[start:]:
+                        spill.write(json.dumps(event, separators=(",", ":")) + "\n")
+                raise
+        os.remove(replaying)
+
+    async def _collect_batch(self) -> None:
+        # Events are collected into self._batch so stop() can still write
+        # them out if the worker is cancelled mid-batch.
+        self._batch.append(await self._queue.get())
+        deadline = asyncio.get_running_loop().time() + self.batch_wait
+        while len(self._batch) < self.batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                self._batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+    async def _flush(self, batch: List[dict]) -> bool:
+        try:
+            await self._insert(batch)
+            return True
+        except asyncio.CancelledError:
+            self._batch = batch + self._batch
+            raise
+        except Exception:
+            logger.exception("Play history insert failed; spilling %d events", len(batch))
+            self._spill(batch)
+            return False
+
+    async def persist(self) -> None:
+        """With write_through, insert the queued plays now instead of in the worker."""
+        if not self.write_through:
+            return
+        batch = []
+        while not self._queue.empty() and len(batch) < self.batch_size:
+            batch.append(self._queue.get_nowait())
+        if batch:
+            await self._flush(batch)
+
+    async def _run(self) -> None:
+        while True:
+            await self._collect_batch()
+            batch, self._batch = self._batch, []
+            if await self._flush(batch) and self._queue.empty():
+                try:
+                    await self._replay_spill()
+                except Exception:
+                    logger.exception("Play history spill replay failed")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the worker and write out everything still queued."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        pending, self._batch = self._batch, []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for start in range(0, len(pending), self.batch_size):
+            await self._flush(pending[start:start + self.batch_size])
+
+
+async def attach_tracks(entries: List[dict]) -> List[dict]:
+    """Add a lean `track` object to each history entry with one lookup."""
+    track_ids = list({entry["track_id"] for entry in entries})
+    if not track_ids:
+        return entries
+    response = await get_client().table("tracks").select(TRACK_COLUMNS).in_("id", track_ids).execute()
+    tracks: Dict[str, dict] = {str(track["id"]): track for track in response.data}
+    return [{**entry, "track": tracks.get(str(entry["track_id"]))} for entry in entries]
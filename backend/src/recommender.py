@@ -0,0 +1,298 @@
+import asyncio
+import importlib.util
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .db import get_client
+from .pagination import apply_keyset, page
+
+logger = logging.getLogger(__name__)
+
+# Item-to-item recommendations ("推荐"). A background job builds a sparse
+# user x track matrix from likes and recent play history, normalizes the
+# track columns and computes cosine similarity with sparse matrix products,
+# a block of tracks at a time, keeping the top-N neighbours of each track in
+# two dense (tracks x N) arrays. GET /tracks/{id}/similar is a row lookup;
+# GET /users/me/recommendations merges the neighbour rows of the user's
+# strongest interactions, so neither depends on catalogue size.
+#
+# Likes, unlikes and plays are recorded as deltas. Every update interval the
+# rows of the tracks they touched are recomputed against the current matrix
+# and merged into their neighbours' rows; the full recompute (weekly by
+# default) reloads everything from the database. Both run in a worker thread
+# and swap their results in when done, so requests keep being served from
+# the previous index. Nothing is recorded until start() has launched the
+# job, and at most max_deltas are kept between updates; anything dropped is
+# in the database and comes back with the next rebuild.
+#
+# NumPy and SciPy are imported lazily; without them the recommender stays
+# empty and the routes fall back to the trending list.
+
+LIKE_WEIGHT = 1.0
+PLAY_WEIGHT = 0.1
+MAX_PLAY_WEIGHT = 0.5
+MAX_CELL_WEIGHT = LIKE_WEIGHT + MAX_PLAY_WEIGHT
+
+# Tracks per sparse product in a rebuild; bounds the similarity block size.
+BLOCK_SIZE = 1024
+# Interactions of a user considered when merging neighbour rows.
+MAX_SEED_TRACKS = 50
+
+
+def numeric_available() -> bool:
+    return importlib.util.find_spec("numpy") is not None and importlib.util.find_spec("scipy") is not None
+
+
+def _top_neighbours(normalized, columns, top_n: int):
+    """Return (neighbours, scores) arrays of shape (len(columns), top_n)."""
+    import numpy as np
+
+    normalized_csc = normalized.tocsc()
+    neighbours = np.full((len(columns), top_n), -1, dtype=np.int32)
+    scores = np.zeros((len(columns), top_n), dtype=np.float32)
+    for start in range(0, len(columns), BLOCK_SIZE):
+        block = columns[start:start + BLOCK_SIZE]
+        similarities = (normalized_csc[:, block].T @ normalized).tocsr()
+        for row, column in enumerate(block):
+            lo, hi = similarities.indptr[row], similarities.indptr[row + 1]
+            indices, values = similarities.indices[lo:hi], similarities.data[lo:hi]
+            keep = indices != column
+            indices, values = indices[keep], values[keep]
+            if len(values) > top_n:
+                best = np.argpartition(-values, top_n)[:top_n]
+                indices, values = indices[best], values[best]
+            order = np.argsort(-values, kind="stable")
+            neighbours[start + row, :len(order)] = indices[order]
+            scores[start + row, :len(order)] = values[order]
+    return neighbours, scores
+
+
+def _normalize(matrix):
+    import numpy as np
+    from scipy import sparse
+
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    inverse = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    return (matrix @ sparse.diags(inverse.astype(np.float32))).tocsr()
+
+
+def _matrix(cells: List[Tuple[int, int, float]], shape: Tuple[int, int], base=None):
+    import numpy as np
+    from scipy import sparse
+
+    users, tracks, weights = zip(*cells) if cells else ((), (), ())
+    matrix = sparse.csr_matrix(
+        (np.asarray(weights, dtype=np.float32), (np.asarray(users, dtype=np.int32), np.asarray(tracks, dtype=np.int32))),
+        shape=shape,
+    )
+    if base is not None:
+        base = base.copy()
+        base.resize(shape)
+        matrix = matrix + base
+    matrix.data = np.clip(matrix.data, 0.0, MAX_CELL_WEIGHT)
+    matrix.eliminate_zeros()
+    return matrix
+
+
+class Recommender:
+    def __init__(
+        self,
+        top_n: int = 50,
+        update_interval: float = 60.0,
+        rebuild_interval: float = 7 * 24 * 3600,
+        play_window: float = 90 * 24 * 3600,
+        on_update: Optional[Callable[[], None]] = None,
+        max_deltas: int = 100_000,
+    ):
+        self.top_n = top_n
+        self.update_interval = update_interval
+        self.rebuild_interval = rebuild_interval
+        self.play_window = play_window
+        self.max_deltas = max_deltas
+        self.ready = False
+        self._user_index: Dict[str, int] = {}
+        self._track_index: Dict[str, int] = {}
+        self._track_ids: List[str] = []
+        self._matrix = None
+        self._neighbours = None
+        self._scores = None
+        # (user, track, weight) recorded since the last update
+        self._deltas: List[Tuple[int, int, float]] = []
+        self._task: Optional[asyncio.Task] = None
+        self.on_update = on_update
+
+    def _user(self, user_id: str) -> int:
+        return self._user_index.setdefault(str(user_id), len(self._user_index))
+
+    def _track(self, track_id: str) -> int:
+        track_id = str(track_id)
+        index = self._track_index.get(track_id)
+        if index is None:
+            index = self._track_index[track_id] = len(self._track_ids)
+            self._track_ids.append(track_id)
+        return index
+
+    def record(self, user_id: str, track_id: str, kind: str, count: int = 1) -> None:
+        """Record a like (count -1 for an unlike) or play for the next update."""
+        if self._task is None or len(self._deltas) >= self.max_deltas:
+            return
+        weight = LIKE_WEIGHT if kind == "like" else PLAY_WEIGHT
+        self._deltas.append((self._user(user_id), self._track(track_id), weight * count))
+
+    def similar(self, track_id: str, limit: int) -> List[str]:
+        index = self._track_index.get(str(track_id))
+        if self._neighbours is None or index is None or index >= len(self._neighbours):
+            return []
+        return [self._track_ids[n] for n in self._neighbours[index, :limit] if n >= 0]
+
+    def recommend(self, user_id: str, limit: int) -> List[str]:
+        """Tracks similar to the user's strongest interactions that they haven't liked or played."""
+        user = self._user_index.get(str(user_id))
+        if self._neighbours is None or user is None or user >= self._matrix.shape[0]:
+            return []
+        import numpy as np
+
+        lo, hi = self._matrix.indptr[user], self._matrix.indptr[user + 1]
+        seen, weights = self._matrix.indices[lo:hi], self._matrix.data[lo:hi]
+        if len(seen) > MAX_SEED_TRACKS:
+            strongest = np.argpartition(-weights, MAX_SEED_TRACKS)[:MAX_SEED_TRACKS]
+            seeds, seed_weights = seen[strongest], weights[strongest]
+        else:
+            seeds, seed_weights = seen, weights
+        seeds_in_index = seeds < len(self._neighbours)
+        seeds, seed_weights = seeds[seeds_in_index], seed_weights[seeds_in_index]
+        candidates = self._neighbours[seeds].ravel()
+        candidate_scores = (self._scores[seeds] * seed_weights[:, None]).ravel()
+        valid = (candidates >= 0) & ~np.isin(candidates, seen)
+        candidates, candidate_scores = candidates[valid], candidate_scores[valid]
+        if not len(candidates):
+            return []
+        totals = np.bincount(candidates, weights=candidate_scores)
+        ranked = np.nonzero(totals)[0]
+        ranked = ranked[np.argsort(-totals[ranked], kind="stable")][:limit]
+        return [self._track_ids[index] for index in ranked]
+
+    def _shape(self) -> Tuple[int, int]:
+        return len(self._user_index), len(self._track_ids)
+
+    def _update(self, deltas: List[Tuple[int, int, float]], shape: Tuple[int, int], matrix, neighbours, scores):
+        # Runs in a worker thread on the arrays it is given.
+        import numpy as np
+
+        matrix = _matrix(deltas, shape, matrix)
+        touched = np.unique(np.asarray([track for _, track, _ in deltas], dtype=np.int32))
+        rows, row_scores = _top_neighbours(_normalize(matrix), touched, self.top_n)
+        grown = np.full((shape[1], self.top_n), -1, dtype=np.int32)
+        grown_scores = np.zeros((shape[1], self.top_n), dtype=np.float32)
+        if neighbours is not None:
+            grown[:len(neighbours)], grown_scores[:len(scores)] = neighbours, scores
+        grown[touched], grown_scores[touched] = rows, row_scores
+        # Similarity is symmetric: refresh each touched track's entry in its
+        # neighbours' rows. Tracks that fell out of a touched track's top-N
+        # keep their old entry until the next full rebuild.
+        for track, track_neighbours, track_scores in zip(touched, rows, row_scores):
+            for neighbour, score in zip(track_neighbours, track_scores):
+                if neighbour < 0 or neighbour in touched:
+                    continue
+                row, neighbour_scores = grown[neighbour], grown_scores[neighbour]
+                position = np.nonzero(row == track)[0]
+                # Reuse the track's slot, else the lowest-scored (empty slots first).
+                slot = position[0] if len(position) else int(np.argmin(np.where(row < 0, -1.0, neighbour_scores)))
+                if len(position) or row[slot] < 0 or neighbour_scores[slot] < score:
+                    row[slot], neighbour_scores[slot] = track, score
+                    order = np.argsort(-np.where(row < 0, -1.0, neighbour_scores), kind="stable")
+                    grown[neighbour], grown_scores[neighbour] = row[order], neighbour_scores[order]
+        return matrix, grown, grown_scores
+
+    def _rebuild(self, cells: List[Tuple[int, int, float]], shape: Tuple[int, int]):
+        import numpy as np
+
+        matrix = _matrix(cells, shape)
+        neighbours, scores = _top_neighbours(_normalize(matrix), np.arange(shape[1], dtype=np.int32), self.top_n)
+        return matrix, neighbours, scores
+
+    async def update(self) -> None:
+        """Fold recorded deltas into the matrix and recompute the touched rows."""
+        if not self._deltas or self._matrix is None:
+            return
+        deltas, self._deltas = self._deltas, []
+        try:
+            self._matrix, self._neighbours, self._scores = await asyncio.to_thread(
+                self._update, deltas, self._shape(), self._matrix, self._neighbours, self._scores
+            )
+        except BaseException:
+            self._deltas = (deltas + self._deltas)[:self.max_deltas]
+            raise
+        if self.on_update:
+            self.on_update()
+
+    async def _load_cells(self, batch_size: int = 1000) -> List[Tuple[int, int, float]]:
+        cells: Dict[Tuple[int, int], float] = {}
+        sources = (
+            ("likes", "created_at", LIKE_WEIGHT, LIKE_WEIGHT, None),
+            ("play_history", "played_at", PLAY_WEIGHT, MAX_PLAY_WEIGHT, self.play_window),
+        )
+        for table, column, weight, cap, window in sources:
+            totals: Dict[Tuple[int, int], float] = {}
+            after = None
+            while True:
+                query = get_client().table(table).select(f"id, user_id, track_id, {column}")
+                if window:
+                    query = query.gte(column, (datetime.now(timezone.utc) - timedelta(seconds=window)).isoformat())
+                response = await apply_keyset(query, after, batch_size, column).execute()
+                rows, cursor = page(response.data, batch_size, column)
+                for row in rows:
+                    key = (self._user(row["user_id"]), self._track(row["track_id"]))
+                    totals[key] = totals.get(key, 0.0) + weight
+                if cursor is None:
+                    break
+                after = (rows[-1][column], str(rows[-1]["id"]))
+            for key, total in totals.items():
+                cells[key] = cells.get(key, 0.0) + min(total, cap)
+        return [(user, track, weight) for (user, track), weight in cells.items()]
+
+    async def rebuild(self) -> None:
+        """Reload interactions from the database and recompute every row."""
+        # Deltas recorded before the load are already in the tables; later ones
+        # are applied by the next update (cells are clipped, so one counted
+        # twice can't run away).
+        persisted = len(self._deltas)
+        cells = await self._load_cells()
+        del self._deltas[:persisted]
+        self._matrix, self._neighbours, self._scores = await asyncio.to_thread(self._rebuild, cells, self._shape())
+        self.ready = True
+        if self.on_update:
+            self.on_update()
+
+    async def _run(self) -> None:
+        next_rebuild = 0.0
+        while True:
+            try:
+                if time.monotonic() >= next_rebuild:
+                    started = time.monotonic()
+                    await self.rebuild()
+                    next_rebuild = time.monotonic() + self.rebuild_interval
+                    logger.info("Recommender rebuilt %d tracks in %.1fs", len(self._track_ids), time.monotonic() - started)
+                else:
+                    await self.update()
+            except Exception:
+                logger.exception("Recommender update failed")
+            await asyncio.sleep(self.update_interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            if not numeric_available():
+                logger.warning("numpy/scipy not installed (requirements-analysis.txt); recommendations are disabled")
+                return
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,129 @@
+import gzip
+import json
+from typing import Any, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse as _JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the stdlib encoder
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+# Response encoding for the JSON API. Bodies are serialized with orjson when
+# it is installed (several times faster than json.dumps on large row lists),
+# and JSON/text bodies above a size threshold are compressed with brotli or
+# gzip, whichever the client prefers and the server has. Audio responses
+# (ranges, zero-copy sends) and anything already encoded pass through
+# untouched.
+
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+NOT_COMPRESSIBLE_TYPES = ("text/event-stream",)
+
+
+def dumps(value: Any, sort_keys: bool = False) -> bytes:
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        try:
+            return orjson.dumps(value, default=str, option=option)
+        except TypeError:
+            # Integers beyond 64 bits and the like.
+            pass
+    return json.dumps(value, ensure_ascii=False, sort_keys=sort_keys, separators=(",", ":"), default=str).encode()
+
+
+class JSONResponse(_JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def _accepted(accept_encoding: str, coding: str) -> bool:
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip().lower() != coding:
+            continue
+        params = params.replace(" ", "")
+        if not params.startswith("q="):
+            return True
+        try:
+            return float(params[2:]) > 0
+        except ValueError:
+            return False
+    return False
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    if not accept_encoding:
+        return None
+    if brotli is not None and _accepted(accept_encoding, "br"):
+        return "br"
+    if _accepted(accept_encoding, "gzip"):
+        return "gzip"
+    return None
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def _compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding"))
+        held: Optional[Message] = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal held
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                if (
+                    content_type.startswith(COMPRESSIBLE_TYPES)
+                    and not content_type.startswith(NOT_COMPRESSIBLE_TYPES)
+                    and "content-encoding" not in headers
+                    and "content-range" not in headers
+                ):
+                    MutableHeaders(raw=message["headers"]).add_vary_header("Accept-Encoding")
+                    if encoding is not None:
+                        # Wait for the body to decide whether it's worth it.
+                        held = message
+                        return
+                await send(message)
+                return
+            if held is None:
+                await send(message)
+                return
+            start, held = held, None
+            body = message.get("body", b"")
+            if message.get("more_body") or len(body) < self.minimum_size:
+                # Streaming or small: send as is.
+                await send(start)
+                await send(message)
+                return
+            body = self._compress(body, encoding)
+            headers = MutableHeaders(raw=start["headers"])
+            headers["Content-Encoding"] = encoding
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                # Byte-for-byte different from the identity body.
+                headers["ETag"] = f"W/{etag}"
+            headers["Content-Length"] = str(len(body))
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,36 @@
+import importlib
+import time
+from typing import Dict, Iterable
+
+from fastapi import FastAPI
+
+# Route groups, one module each. Only the groups named in API_ROUTERS are
+# imported and mounted (default: all), so a deployment that serves part of
+# the API, e.g. a serverless function without the live WebSocket, doesn't
+# pay for importing the rest. Import times feed the startup report.
+
+ROUTERS = ("auth", "users", "tracks", "vip", "wallet", "live", "dj", "admin")
+
+# phase -> seconds
+import_seconds: Dict[str, float] = {}
+
+
+def enabled_routers(value: str) -> Iterable[str]:
+    names = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = [name for name in names if name not in ROUTERS]
+    if unknown:
+        raise ValueError(f"Unknown API_ROUTERS entries: {', '.join(unknown)} (available: {', '.join(ROUTERS)})")
+    return names or ROUTERS
+
+
+def include_routers(app: FastAPI, names: Iterable[str] = ROUTERS) -> None:
+    # The shared services are timed on their own rather than in whichever
+    # router happens to import them first.
+    started = time.perf_counter()
+    importlib.import_module("..services", __name__)
+    import_seconds["services"] = time.perf_counter() - started
+    for name in names:
+        started = time.perf_counter()
+        module = importlib.import_module(f".{name}", __name__)
+        app.include_router(module.router)
+        import_seconds[f"routers.{name}"] = time.perf_counter() - started
@@ -0,0 +1,101 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from pydantic import BaseModel
+
+from ..auth import get_access_token, get_current_user, invalidate_user
+from ..db import get_client
+from ..fields import USER_FIELDS, USER_LIST_FIELDS, select_fields
+from ..pagination import DEFAULT_PAGE_SIZE, apply_keyset, clamp_limit, decode_cursor, page
+from ..responses import JSONResponse
+from ..search import search_index
+from ..services import admin_stats, response_cache, trending
+
+# Admin views and moderation (requires is_admin on the profile).
+
+router = APIRouter()
+
+class AdminTrackUpdate(BaseModel):
+    is_approved: Optional[bool] = None
+    is_vip_only: Optional[bool] = None
+
+@router.get("/admin/users", tags=["Admin"])
+async def get_all_users(limit: int = DEFAULT_PAGE_SIZE, offset: int = 0, cursor: Optional[str] = None, fields: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    # Placeholder for admin check
+    if not current_user.get("is_admin"): # Assume an 'is_admin' field in user profile
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    limit = clamp_limit(limit)
+    after = decode_cursor(cursor) if cursor else None
+    columns = select_fields(fields, USER_FIELDS, USER_LIST_FIELDS)
+    try:
+        users_query = get_client().table("users").select(columns)
+        if cursor is None:
+            response = await users_query.order("created_at", desc=True).range(offset, offset + limit - 1).execute()
+            return JSONResponse(response.data)
+        response = await apply_keyset(users_query, after, limit).execute()
+        rows, next_cursor = page(response.data, limit)
+        return JSONResponse({"data": rows, "next_cursor": next_cursor})
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.put("/admin/tracks/{track_id}", tags=["Admin"])
+async def update_track_by_admin(track_id: str, update_data: AdminTrackUpdate, current_user: dict = Depends(get_current_user)):
+    # Placeholder for admin check
+    if not current_user.get("is_admin"): 
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    try:
+        response = await get_client().table("tracks").update(update_data.dict(exclude_unset=True)).eq("id", track_id).execute()
+        for row in response.data:
+            search_index.upsert(row)
+            trending.upsert(row)
+        response_cache.invalidate(f"track:{track_id}", "trending")
+        return {"message": "Track updated by admin", "data": response.data}
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.get("/admin/dj_applications", tags=["Admin"])
+async def get_dj_applications(status: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    # Placeholder for admin check
+    if not current_user.get("is_admin"): 
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    try:
+        query = get_client().table("dj_applications").select("*, users(username, email)")
+        if status:
+            query = query.eq("status", status)
+        response = await query.order("created_at", desc=True).execute()
+        return response.data
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.post("/admin/dj_applications/{application_id}/approve", tags=["Admin"])
+async def approve_dj_application(application_id: str, current_user: dict = Depends(get_current_user)):
+    # Placeholder for admin check
+    if not current_user.get("is_admin"): 
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    try:
+        # Update application status
+        updated = await get_client().table("dj_applications").update({"status": "approved"}).eq("id", application_id).execute()
+        if updated.data:
+            admin_stats.dj_application_reviewed()
+        
+        # Get user_id from application and update user role/status
+        application_data = (await get_client().table("dj_applications").select("user_id").eq("id", application_id).single().execute()).data
+        if application_data and application_data["user_id"]:
+            await get_client().table("users").update({"is_dj": True}).eq("id", application_data["user_id"]).execute() # Assume 'is_dj' field
+            invalidate_user(application_data["user_id"])
+
+        return {"message": "DJ application approved"}
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.get("/admin/stats", tags=["Admin"])
+async def get_admin_stats(access_token: str = Depends(get_access_token), current_user: dict = Depends(get_current_user)):
+    if not current_user.get("is_admin"):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    try:
+        # In-memory totals and rollups; see src/admin_stats.py
+        return JSONResponse(await admin_stats.snapshot(access_token))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
@@ -0,0 +1,66 @@
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from pydantic import BaseModel, EmailStr
+
+from ..auth import get_access_token, get_current_user
+from ..db import get_client, new_auth_client
+from ..services import admin_stats
+
+# Sign-up, sign-in and sign-out through Supabase Auth, each on its own GoTrue
+# client so no user session ever lands on the shared client (see db.py).
+
+router = APIRouter()
+
+class UserCreate(BaseModel):
+    email: EmailStr
+    password: str
+    username: str
+
+class UserLogin(BaseModel):
+    email: EmailStr
+    password: str
+
+@router.post("/auth/register", tags=["Auth"])
+async def register_user(user: UserCreate):
+    try:
+        # Sign up user with Supabase Auth
+        auth_response = await new_auth_client().sign_up({"email": user.email, "password": user.password})
+        if auth_response.user:
+            # Create user profile in 'users' table
+            user_profile_data = {
+                "id": auth_response.user.id,
+                "email": user.email,
+                "username": user.username,
+                "is_vip": False,
+                "wallet_balance": 100, # New user bonus
+                "created_at": datetime.now().isoformat(),
+                "updated_at": datetime.now().isoformat(),
+            }
+            await get_client().table("users").insert(user_profile_data).execute()
+            admin_stats.user_registered()
+            return {"message": "User registered successfully. Please check your email for verification.", "user_id": auth_response.user.id}
+        else:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=auth_response.session.user.identities[0].identity_data)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@router.post("/auth/login", tags=["Auth"])
+async def login_user(user: UserLogin):
+    try:
+        auth_response = await new_auth_client().sign_in_with_password({"email": user.email, "password": user.password})
+        if auth_response.user:
+            return {"message": "Login successful", "access_token": auth_response.session.access_token, "token_type": "bearer"}
+        else:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid credentials")
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@router.post("/auth/logout", tags=["Auth"])
+async def logout_user(current_user: dict = Depends(get_current_user), access_token: str = Depends(get_access_token)):
+    try:
+        # Revokes the caller's own session (all of their refresh tokens).
+        await new_auth_client().admin.sign_out(access_token)
+        return {"message": "Logout successful"}
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
@@ -0,0 +1,41 @@
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from pydantic import BaseModel
+
+from ..auth import get_current_user
+from ..db import get_client
+from ..services import admin_stats
+
+# DJ applications.
+
+router = APIRouter()
+
+class DjApplicationCreate(BaseModel):
+    real_name: str
+    experience: str
+    portfolio_url: Optional[str] = None
+
+@router.post("/dj/apply", tags=["DJ"])
+async def apply_for_dj(application: DjApplicationCreate, current_user: dict = Depends(get_current_user)):
+    try:
+        application_data = application.dict()
+        application_data["user_id"] = current_user["id"]
+        application_data["status"] = "pending"
+        application_data["created_at"] = datetime.now().isoformat()
+        response = await get_client().table("dj_applications").insert(application_data).execute()
+        admin_stats.dj_applied()
+        return {"message": "DJ application submitted successfully", "data": response.data}
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.get("/dj/status", tags=["DJ"])
+async def get_dj_status(current_user: dict = Depends(get_current_user)):
+    try:
+        response = await get_client().table("dj_applications").select("*").eq("user_id", current_user["id"]).order("created_at", desc=True).limit(1).single().execute()
+        if response.data:
+            return response.data
+        return {"status": "not_applied"}
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
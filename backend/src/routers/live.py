@@ -0,0 +1,89 @@
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request, WebSocket, status
+from pydantic import BaseModel
+
+from ..admission import trusted_proxies
+from ..auth import get_current_user
+from ..cache import cached_json_response
+from ..db import get_client
+from ..pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, clamp_limit
+from ..services import live_hub, response_cache
+
+# Live streams: REST listing plus the /live/ws push channel.
+
+router = APIRouter()
+
+class LiveStreamCreate(BaseModel):
+    title: str
+    description: Optional[str] = None
+    category: str
+
+@router.post("/live/streams", tags=["Live Streams"])
+async def create_live_stream(stream: LiveStreamCreate, current_user: dict = Depends(get_current_user)):
+    try:
+        stream_data = stream.dict()
+        stream_data["dj_id"] = current_user["id"]
+        stream_data["is_live"] = True
+        stream_data["viewers_count"] = 0
+        stream_data["started_at"] = datetime.now().isoformat()
+        stream_data["created_at"] = datetime.now().isoformat()
+        response = await get_client().table("live_streams").insert(stream_data).execute()
+        response_cache.invalidate("live_streams")
+        for row in response.data:
+            live_hub.stream_started(row)
+        return {"message": "Live stream created successfully", "data": response.data}
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+async def load_live_streams(is_live: Optional[bool], category: Optional[str], limit: int = DEFAULT_PAGE_SIZE):
+    async def load():
+        streams_query = get_client().table("live_streams").select("*, users(username, avatar_url)")
+        if is_live is not None:
+            streams_query = streams_query.eq("is_live", is_live)
+        if category:
+            streams_query = streams_query.eq("category", category)
+        response = await streams_query.order("started_at", desc=True).limit(limit).execute()
+        return response.data
+    return await response_cache.get_or_load(("live_streams", is_live, category, limit), load, lambda data: ["live_streams"])
+
+@router.get("/live/streams", tags=["Live Streams"])
+async def get_live_streams(request: Request, is_live: Optional[bool] = None, category: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE):
+    try:
+        data, etag = await load_live_streams(is_live, category, clamp_limit(limit))
+        return cached_json_response(request, data, etag)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.websocket("/live/ws")
+async def live_streams_socket(websocket: WebSocket, category: Optional[str] = None, token: Optional[str] = None):
+    # Push alternative to polling GET /live/streams; see src/live_hub.py for the protocol.
+    # Browsers can't set headers on a WebSocket, so the access token comes as ?token=.
+    if token:
+        try:
+            user = await get_current_user(f"Bearer {token}")
+        except HTTPException:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+        viewer = f"user:{user['id']}"
+    else:
+        viewer = f"ip:{trusted_proxies.client_ip(websocket.scope)}"
+    async def snapshot(category: Optional[str]):
+        data, _ = await load_live_streams(True, category, MAX_PAGE_SIZE)
+        return data
+    await live_hub.serve(websocket, viewer, category, snapshot)
+
+@router.post("/live/streams/{stream_id}/end", tags=["Live Streams"])
+async def end_live_stream(stream_id: str, current_user: dict = Depends(get_current_user)):
+    try:
+        # Only the DJ who started the stream can end it; the dj_id filter
+        # makes the update match nothing for anyone else.
+        response = await get_client().table("live_streams").update({"is_live": False, "ended_at": datetime.now().isoformat()}).eq("id", stream_id).eq("dj_id", current_user["id"]).execute()
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+    if not response.data:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to end this stream")
+    response_cache.invalidate("live_streams")
+    await live_hub.stream_ended(stream_id, response.data[0].get("category"))
+    return {"message": "Live stream ended"}
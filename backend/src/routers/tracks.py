@@ -0,0 +1,360 @@
+import base64
+import hashlib
+import logging
+import uuid
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, status
+from postgrest.exceptions import APIError
+from pydantic import BaseModel
+
+from .. import ledger
+from ..auth import get_current_user, get_optional_user
+from ..audio_cache import RangeNotSatisfiable, RangeResponse, parse_range
+from ..cache import cached_json_response, etag_matches
+from ..db import UNIQUE_VIOLATION, get_client
+from ..fields import TRACK_FIELDS, TRACK_LIST_FIELDS, select_fields
+from ..likes import annotate_liked, liked_track_ids
+from ..origins import is_allowed_audio_url
+from ..pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, apply_keyset, clamp_limit, decode_cursor, encode_cursor, page
+from ..responses import JSONResponse
+from ..search import search_index
+from ..services import admin_stats, audio_cache, audio_pipeline, fetch_tracks, load_track, play_history, recommender, response_cache, track_counters, track_exists, track_response, track_tags, trending
+
+# Catalogue reads, uploads, streaming and per-track interactions. Hot reads
+# go through the response cache; likes, plays and comments also feed the
+# counters, trending and recommender in services.py.
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+class TrackCreate(BaseModel):
+    title: str
+    artist: str
+    description: Optional[str] = None
+    audio_url: str
+    cover_url: Optional[str] = None
+    duration: int
+    genre: str
+    tags: List[str] = []
+    is_vip_only: bool = False
+
+class TrackBatchRequest(BaseModel):
+    ids: List[str]
+
+class CommentCreate(BaseModel):
+    content: str
+    track_id: str
+
+@router.post("/tracks", tags=["Tracks"])
+async def upload_track(track: TrackCreate, current_user: dict = Depends(get_current_user)):
+    # The server fetches audio_url itself (streaming, analysis), so only
+    # storage URLs are accepted.
+    if not is_allowed_audio_url(track.audio_url):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="audio_url must point to Supabase Storage")
+    try:
+        track_data = track.dict()
+        track_data["user_id"] = current_user["id"]
+        track_data["plays_count"] = 0
+        track_data["likes_count"] = 0
+        track_data["created_at"] = datetime.now().isoformat()
+        track_data["updated_at"] = datetime.now().isoformat()
+        response = await get_client().table("tracks").insert(track_data).execute()
+        for row in response.data:
+            search_index.upsert(row)
+            trending.upsert(row)
+            audio_pipeline.submit(row["id"], row.get("audio_url"))
+        admin_stats.track_uploaded(len(response.data))
+        response_cache.invalidate("tracks:list", f"user_tracks:{current_user['id']}", *track_tags(response.data))
+        return {"message": "Track uploaded successfully", "data": response.data}
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.get("/tracks", tags=["Tracks"])
+async def get_tracks(request: Request, query: Optional[str] = None, genre: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE, offset: int = 0, cursor: Optional[str] = None, fields: Optional[str] = None, current_user: Optional[dict] = Depends(get_optional_user)):
+    # Passing `cursor` (empty for the first page) switches to keyset paging and
+    # returns {"data": [...], "next_cursor": ...}; offset paging is kept as is.
+    limit = clamp_limit(limit)
+    after = decode_cursor(cursor) if cursor else None
+    columns = select_fields(fields, TRACK_FIELDS, TRACK_LIST_FIELDS)
+    try:
+        query = query.strip() if query else None
+        genre = genre.strip() if genre else None
+
+        async def load():
+            if query and search_index.ready:
+                return await search_tracks(query, genre, limit, offset, cursor, after, columns)
+            tracks_query = get_client().table("tracks").select(columns)
+            if query:
+                # Fallback until the search index has finished its first build.
+                tracks_query = tracks_query.or_(f"title.ilike.%{query}%,artist.ilike.%{query}%,tags.cs.{{\"{query}\"}}")
+            if genre:
+                tracks_query = tracks_query.eq("genre", genre)
+            if cursor is None:
+                response = await tracks_query.order("created_at", desc=True).range(offset, offset + limit - 1).execute()
+                return response.data
+            response = await apply_keyset(tracks_query, after, limit).execute()
+            rows, next_cursor = page(response.data, limit)
+            return {"data": rows, "next_cursor": next_cursor}
+        data, etag = await response_cache.get_or_load(
+            ("tracks", query, genre, limit, offset, cursor, columns),
+            load,
+            lambda data: ["tracks:list", *track_tags(data if cursor is None else data["data"])],
+        )
+        return await track_response(request, data, etag, current_user)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+async def search_tracks(query: str, genre: Optional[str], limit: int, offset: int, cursor: Optional[str], after: Optional[tuple], columns: str):
+    # Rank in memory, then fetch just the page's rows by primary key.
+    ranked_ids = search_index.search(query, genre, top=offset + limit if cursor is None else None)
+    if cursor is not None:
+        offset = 0
+        if after:
+            try:
+                offset = ranked_ids.index(after[1]) + 1
+            except ValueError:
+                offset = len(ranked_ids)
+    rows = await fetch_tracks(ranked_ids[offset:offset + limit], columns)
+    if cursor is None:
+        return rows
+    has_more = offset + limit < len(ranked_ids)
+    return {"data": rows, "next_cursor": encode_cursor(rows[-1]) if rows and has_more else None}
+@router.get("/tracks/trending", tags=["Tracks"])
+async def get_trending_tracks(request: Request, genre: Optional[str] = None, vip: Optional[bool] = None, limit: int = DEFAULT_PAGE_SIZE, fields: Optional[str] = None, current_user: Optional[dict] = Depends(get_optional_user)):
+    # Ranked from memory; only the page's rows are read from the database.
+    limit = clamp_limit(limit)
+    genre = genre.strip() if genre else None
+    columns = select_fields(fields, TRACK_FIELDS, TRACK_LIST_FIELDS)
+    try:
+        async def load():
+            if trending.ready:
+                return await fetch_tracks(trending.top(genre, vip, limit), columns)
+            # Until the first load finishes, fall back to all-time plays.
+            tracks_query = get_client().table("tracks").select(columns)
+            if genre:
+                tracks_query = tracks_query.eq("genre", genre)
+            if vip is not None:
+                tracks_query = tracks_query.eq("is_vip_only", vip)
+            response = await tracks_query.order("plays_count", desc=True).limit(limit).execute()
+            return response.data
+        data, etag = await response_cache.get_or_load(
+            ("trending", genre, vip, limit, columns), load, lambda data: ["trending", *track_tags(data)]
+        )
+        return await track_response(request, data, etag, current_user)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.post("/tracks/batch", tags=["Tracks"])
+async def get_tracks_batch(batch: TrackBatchRequest, fields: Optional[str] = None, current_user: Optional[dict] = Depends(get_optional_user)):
+    # Fetch up to MAX_PAGE_SIZE tracks by id in one call, in the requested order.
+    track_ids = list(dict.fromkeys(batch.ids))
+    if len(track_ids) > MAX_PAGE_SIZE:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"At most {MAX_PAGE_SIZE} ids per batch")
+    columns = select_fields(fields, TRACK_FIELDS, TRACK_LIST_FIELDS)
+    try:
+        rows = track_counters.overlay(await fetch_tracks(track_ids, columns))
+        if current_user:
+            rows = annotate_liked(rows, await liked_track_ids(current_user["id"], track_ids))
+        return JSONResponse(rows)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.get("/tracks/{track_id}", tags=["Tracks"])
+async def get_track_details(track_id: str, request: Request, fields: Optional[str] = None, current_user: Optional[dict] = Depends(get_optional_user)):
+    # Whole row by default; `fields` narrows it like on the list routes.
+    columns = select_fields(fields, TRACK_FIELDS, TRACK_FIELDS) if fields else "*"
+    try:
+        data, etag = await load_track(track_id, columns)
+        if data:
+            return await track_response(request, data, etag, current_user)
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Track not found")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.get("/tracks/{track_id}/stream", tags=["Tracks"])
+async def stream_track(
+    track_id: str,
+    request: Request,
+    token: Optional[str] = None,
+    authorization: Optional[str] = Header(None, alias="Authorization"),
+):
+    # Audio bytes with Range/206 support, served through the local chunk cache.
+    # <audio> elements can't send headers, so VIP tracks also accept ?token=.
+    try:
+        track, _ = await load_track(track_id)
+    except Exception:
+        logger.exception("Loading track %s for streaming failed", track_id)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to load track")
+    if not track:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Track not found")
+    if track.get("is_vip_only"):
+        current_user = await get_current_user(authorization or (f"Bearer {token}" if token else None))
+        if not (ledger.vip_active(current_user) or current_user["id"] == track.get("user_id") or current_user.get("is_admin")):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="VIP membership required")
+    if not is_allowed_audio_url(track.get("audio_url") or ""):
+        # Uploaded before audio URLs were restricted to storage.
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Audio not available")
+    try:
+        size, content_type = await audio_cache.describe(track["audio_url"])
+    except Exception:
+        logger.exception("Fetching audio of track %s failed", track_id)
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Audio storage unavailable")
+    etag = '"' + hashlib.sha1(f"{track['audio_url']}:{size}".encode()).hexdigest() + '"'
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Cache-Control": "private, max-age=3600" if track.get("is_vip_only") else "public, max-age=86400",
+    }
+    try:
+        byte_range = parse_range(request.headers.get("range"), size)
+    except RangeNotSatisfiable:
+        return Response(status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE, headers={**headers, "Content-Range": f"bytes */{size}"})
+    if request.headers.get("if-range") not in (None, etag):
+        # The client's partial copy is of a different file: send it whole.
+        byte_range = None
+    if byte_range is None:
+        return RangeResponse(audio_cache, track["audio_url"], size, 0, size - 1, status.HTTP_200_OK, headers, content_type)
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return RangeResponse(audio_cache, track["audio_url"], size, start, end, status.HTTP_206_PARTIAL_CONTENT, headers, content_type)
+
+@router.get("/tracks/{track_id}/peaks", tags=["Tracks"])
+async def get_track_peaks(track_id: str, request: Request, format: str = "binary"):
+    # Waveform for the player: `points` int8 amplitudes (0..127). A track's
+    # audio never changes after upload, so clients may keep it indefinitely.
+    if format not in ("binary", "json"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="format must be binary or json")
+    try:
+        async def load():
+            response = await get_client().table("track_audio_analysis").select("*").eq("track_id", track_id).limit(1).execute()
+            return response.data[0] if response.data else None
+        analysis, etag = await response_cache.get_or_load(("peaks", track_id), load, lambda data: [f"peaks:{track_id}"])
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+    if not analysis:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Waveform not ready")
+    etag = etag[:-1] + f'-{format}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    values = base64.b64decode(analysis["peaks"])
+    if format == "binary":
+        return Response(values, media_type="application/octet-stream", headers=headers)
+    return JSONResponse({
+        "points": len(values),
+        "peaks": list(values),
+        "duration": analysis["duration"],
+        "loudness_lufs": analysis["loudness_lufs"],
+    }, headers=headers)
+
+@router.post("/tracks/{track_id}/comments", tags=["Tracks"])
+async def add_comment_to_track(track_id: str, comment: CommentCreate, current_user: dict = Depends(get_current_user)):
+    try:
+        comment_data = {
+            "track_id": track_id,
+            "user_id": current_user["id"],
+            "content": comment.content,
+            "created_at": datetime.now().isoformat()
+        }
+        response = await get_client().table("comments").insert(comment_data).execute()
+        response_cache.invalidate(f"comments:{track_id}")
+        trending.record(track_id, "comment")
+        return {"message": "Comment added successfully", "data": response.data}
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.get("/tracks/{track_id}/comments", tags=["Tracks"])
+async def get_track_comments(track_id: str, request: Request, limit: int = DEFAULT_PAGE_SIZE, offset: int = 0, cursor: Optional[str] = None):
+    limit = clamp_limit(limit)
+    after = decode_cursor(cursor) if cursor else None
+    try:
+        async def load():
+            comments_query = get_client().table("comments").select("*, users(username, avatar_url)").eq("track_id", track_id)
+            if cursor is None:
+                response = await comments_query.order("created_at", desc=True).range(offset, offset + limit - 1).execute()
+                return response.data
+            response = await apply_keyset(comments_query, after, limit).execute()
+            rows, next_cursor = page(response.data, limit)
+            return {"data": rows, "next_cursor": next_cursor}
+        data, etag = await response_cache.get_or_load(
+            ("comments", track_id, limit, offset, cursor), load, lambda data: [f"comments:{track_id}"]
+        )
+        return cached_json_response(request, data, etag)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.get("/tracks/{track_id}/similar", tags=["Tracks"])
+async def get_similar_tracks(track_id: str, request: Request, limit: int = DEFAULT_PAGE_SIZE, fields: Optional[str] = None, current_user: Optional[dict] = Depends(get_optional_user)):
+    # Precomputed neighbours; only the page's rows are read from the database.
+    limit = clamp_limit(limit)
+    columns = select_fields(fields, TRACK_FIELDS, TRACK_LIST_FIELDS)
+    try:
+        async def load():
+            return await fetch_tracks(recommender.similar(track_id, limit), columns)
+        data, etag = await response_cache.get_or_load(
+            ("similar", track_id, limit, columns), load, lambda data: ["recommendations", *track_tags(data)]
+        )
+        return await track_response(request, data, etag, current_user)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.post("/tracks/{track_id}/like", tags=["Tracks"])
+async def like_track(track_id: str, current_user: dict = Depends(get_current_user)):
+    try:
+        # Add like; the unique (track_id, user_id) constraint rejects duplicates
+        await get_client().table("likes").insert({"track_id": track_id, "user_id": current_user["id"], "created_at": datetime.now().isoformat()}).execute()
+    except APIError as e:
+        if e.code == UNIQUE_VIOLATION:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Track already liked by this user")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+    # likes_count is updated by the next counter flush
+    track_counters.add_like(track_id)
+    trending.record(track_id, "like")
+    recommender.record(current_user["id"], track_id, "like")
+    await track_counters.persist()
+    return {"message": "Track liked successfully"}
+
+@router.post("/tracks/{track_id}/unlike", tags=["Tracks"])
+async def unlike_track(track_id: str, current_user: dict = Depends(get_current_user)):
+    try:
+        # Remove like; the deleted rows come back, so an empty result means it wasn't liked
+        response = await get_client().table("likes").delete().eq("track_id", track_id).eq("user_id", current_user["id"]).execute()
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+    if not response.data:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Track not liked by this user")
+    track_counters.add_like(track_id, -1)
+    trending.record(track_id, "like", -1)
+    recommender.record(current_user["id"], track_id, "like", -1)
+    await track_counters.persist()
+    return {"message": "Track unliked successfully"}
+
+@router.post("/tracks/{track_id}/play", tags=["Tracks"])
+async def record_play(track_id: str, current_user: Optional[dict] = Depends(get_optional_user)):
+    try:
+        uuid.UUID(track_id)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid track id")
+    try:
+        exists = await track_exists(track_id)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+    if not exists:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Track not found")
+    # Replaces per-play increment_play_count RPCs; plays_count is updated by the next counter flush
+    track_counters.add_play(track_id)
+    trending.record(track_id, "play")
+    if current_user:
+        play_history.record(current_user["id"], track_id)
+        recommender.record(current_user["id"], track_id, "play")
+    # No-ops unless LAZY_INIT, where nothing flushes between requests.
+    await track_counters.persist()
+    await play_history.persist()
+    return {"message": "Play recorded"}
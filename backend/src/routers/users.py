@@ -0,0 +1,103 @@
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from pydantic import BaseModel
+
+from ..auth import get_current_user, get_optional_user, invalidate_user
+from ..db import get_client
+from ..fields import TRACK_FIELDS, TRACK_LIST_FIELDS, select_fields
+from ..likes import annotate_liked, liked_track_ids
+from ..pagination import DEFAULT_PAGE_SIZE, apply_keyset, clamp_limit, decode_cursor, encode_cursor, page
+from ..play_history import attach_tracks
+from ..responses import JSONResponse
+from ..services import fetch_tracks, play_history, recommender, response_cache, track_counters, track_response, track_tags, trending
+
+# Profiles and per-user lists: own tracks, play history, favorites and
+# recommendations.
+
+router = APIRouter()
+
+class UserProfileUpdate(BaseModel):
+    username: Optional[str] = None
+    avatar_url: Optional[str] = None
+
+@router.get("/users/me", tags=["Users"])
+async def get_my_profile(current_user: dict = Depends(get_current_user)):
+    return current_user
+
+@router.put("/users/me", tags=["Users"])
+async def update_my_profile(profile_update: UserProfileUpdate, current_user: dict = Depends(get_current_user)):
+    try:
+        update_data = profile_update.dict(exclude_unset=True)
+        update_data["updated_at"] = datetime.now().isoformat()
+        response = await get_client().table("users").update(update_data).eq("id", current_user["id"]).execute()
+        invalidate_user(current_user["id"])
+        return {"message": "Profile updated successfully", "data": response.data}
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.get("/users/{user_id}/tracks", tags=["Users"])
+async def get_user_tracks(user_id: str, request: Request, fields: Optional[str] = None, current_user: Optional[dict] = Depends(get_optional_user)):
+    columns = select_fields(fields, TRACK_FIELDS, TRACK_LIST_FIELDS)
+    try:
+        async def load():
+            response = await get_client().table("tracks").select(columns).eq("user_id", user_id).order("created_at", desc=True).execute()
+            return response.data
+        data, etag = await response_cache.get_or_load(
+            ("user_tracks", user_id, columns), load, lambda data: [f"user_tracks:{user_id}", *track_tags(data)]
+        )
+        return await track_response(request, data, etag, current_user)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.get("/users/me/history", tags=["Users"])
+async def get_my_play_history(limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    # Consecutive replays of a track are collapsed into one entry with a
+    # `plays` count. Recent pages come from the in-memory ring buffer; the
+    # cursor continues before the oldest play of the page's last entry.
+    limit = clamp_limit(limit)
+    after = decode_cursor(cursor) if cursor else None
+    try:
+        rows, more = await play_history.history(current_user["id"], limit, after[0] if after else None)
+        next_cursor = None
+        if more:
+            next_cursor = encode_cursor({"played_at": rows[-1]["first_played_at"], "id": rows[-1]["track_id"]}, "played_at")
+        return {"data": await attach_tracks(rows), "next_cursor": next_cursor}
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.get("/users/me/favorites", tags=["Users"])
+async def get_my_favorites(limit: int = DEFAULT_PAGE_SIZE, offset: int = 0, cursor: Optional[str] = None, fields: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    # One likes -> tracks embedded query, newest like first.
+    limit = clamp_limit(limit)
+    after = decode_cursor(cursor) if cursor else None
+    columns = select_fields(fields, TRACK_FIELDS, TRACK_LIST_FIELDS)
+    try:
+        likes_query = get_client().table("likes").select(f"id, created_at, tracks({columns})").eq("user_id", current_user["id"])
+        if cursor is None:
+            response = await likes_query.order("created_at", desc=True).range(offset, offset + limit - 1).execute()
+            rows, next_cursor = response.data, None
+        else:
+            response = await apply_keyset(likes_query, after, limit).execute()
+            rows, next_cursor = page(response.data, limit)
+        tracks = track_counters.overlay([
+            {**row["tracks"], "liked_at": row["created_at"], "liked_by_me": True} for row in rows if row.get("tracks")
+        ])
+        if cursor is None:
+            return JSONResponse(tracks)
+        return JSONResponse({"data": tracks, "next_cursor": next_cursor})
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.get("/users/me/recommendations", tags=["Users"])
+async def get_my_recommendations(limit: int = DEFAULT_PAGE_SIZE, fields: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    # Neighbours of the user's likes and plays; users without history get trending tracks.
+    limit = clamp_limit(limit)
+    columns = select_fields(fields, TRACK_FIELDS, TRACK_LIST_FIELDS)
+    try:
+        track_ids = recommender.recommend(current_user["id"], limit) or trending.top(limit=limit)
+        rows = track_counters.overlay(await fetch_tracks(track_ids, columns))
+        return JSONResponse(annotate_liked(rows, await liked_track_ids(current_user["id"], track_ids)))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
@@ -0,0 +1,34 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from pydantic import BaseModel
+
+from .. import ledger
+from ..auth import get_access_token, get_current_user, update_cached_user
+from ..services import admin_stats
+
+# VIP purchases, charged from the wallet through the ledger RPC.
+
+router = APIRouter()
+
+class VipPurchaseCreate(BaseModel):
+    plan_type: str  # e.g., monthly, yearly, lifetime
+    amount: float
+
+@router.post("/vip/purchase", tags=["VIP"])
+async def purchase_vip(
+    vip_purchase: VipPurchaseCreate,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    access_token: str = Depends(get_access_token),
+    current_user: dict = Depends(get_current_user),
+):
+    # One atomic RPC; retries with the same Idempotency-Key are not charged again
+    try:
+        result = await ledger.purchase_vip(access_token, vip_purchase.plan_type, vip_purchase.amount, idempotency_key)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+    admin_stats.vip_purchased(current_user["id"], vip_purchase.amount, not ledger.vip_active(current_user), idempotency_key)
+    update_cached_user(current_user["id"], {key: result[key] for key in ("wallet_balance", "is_vip", "vip_expires_at")})
+    return {"message": "VIP purchased successfully", "new_balance": result["wallet_balance"], "vip_expires_at": result["vip_expires_at"]}
@@ -0,0 +1,52 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from pydantic import BaseModel
+
+from .. import ledger
+from ..auth import get_access_token, get_current_user, update_cached_user
+from ..db import get_client
+from ..fields import WALLET_TRANSACTION_FIELDS, WALLET_TRANSACTION_LIST_FIELDS, select_fields
+from ..pagination import DEFAULT_PAGE_SIZE, apply_keyset, clamp_limit, decode_cursor, page
+from ..responses import JSONResponse
+from ..services import admin_stats
+
+# Wallet top-ups and transaction history.
+
+router = APIRouter()
+
+class WalletRecharge(BaseModel):
+    amount: float
+
+@router.post("/wallet/recharge", tags=["Wallet"])
+async def recharge_wallet(
+    recharge: WalletRecharge,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    access_token: str = Depends(get_access_token),
+    current_user: dict = Depends(get_current_user),
+):
+    try:
+        result = await ledger.recharge_wallet(access_token, recharge.amount, idempotency_key)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+    admin_stats.wallet_recharged(current_user["id"], recharge.amount, idempotency_key)
+    update_cached_user(current_user["id"], {"wallet_balance": result["wallet_balance"]})
+    return {"message": "Wallet recharged successfully", "new_balance": result["wallet_balance"]}
+
+@router.get("/wallet/transactions", tags=["Wallet"])
+async def get_wallet_transactions(limit: int = DEFAULT_PAGE_SIZE, offset: int = 0, cursor: Optional[str] = None, fields: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    limit = clamp_limit(limit)
+    after = decode_cursor(cursor) if cursor else None
+    columns = select_fields(fields, WALLET_TRANSACTION_FIELDS, WALLET_TRANSACTION_LIST_FIELDS)
+    try:
+        transactions_query = get_client().table("wallet_transactions").select(columns).eq("user_id", current_user["id"])
+        if cursor is None:
+            response = await transactions_query.order("created_at", desc=True).range(offset, offset + limit - 1).execute()
+            return JSONResponse(response.data)
+        response = await apply_keyset(transactions_query, after, limit).execute()
+        rows, next_cursor = page(response.data, limit)
+        return JSONResponse({"data": rows, "next_cursor": next_cursor})
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
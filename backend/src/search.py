@@ -0,0 +1,193 @@
+import asyncio
+import heapq
+import logging
+import math
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Set
+
+from .db import get_client
+
+logger = logging.getLogger(__name__)
+
+# In-process n-gram index over the track catalogue, used by GET /tracks?query=
+# instead of leading-wildcard ILIKE scans. Text is indexed as character
+# bigrams and trigrams rather than whitespace tokens, so substring search
+# works the same for Latin, Myanmar and CJK titles. Candidates from the
+# posting lists are confirmed against the normalized field text, then ranked
+# by where they matched (exact > prefix > word prefix > substring) with
+# plays/likes as the tie-break.
+
+INDEXED_COLUMNS = "id, title, artist, tags, genre, plays_count, likes_count, created_at"
+
+FIELD_WEIGHTS = {"title": 3.0, "artist": 2.0, "tags": 1.5, "genre": 1.0}
+
+_WORD_SPLIT = re.compile(r"[\s\-_/.,;:!?()\[\]{}\"'|]+")
+
+
+def normalize(text: str) -> str:
+    return unicodedata.normalize("NFKC", text).casefold().strip()
+
+
+def ngrams(text: str, n: int) -> Set[str]:
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class _Doc:
+    __slots__ = ("id", "fields", "words", "genre", "popularity", "created_at", "grams")
+
+    def __init__(self, row: dict):
+        self.id = str(row["id"])
+        tags = row.get("tags") or []
+        self.fields = {
+            "title": normalize(row.get("title") or ""),
+            "artist": normalize(row.get("artist") or ""),
+            "tags": normalize(" ".join(tags)),
+            "genre": normalize(row.get("genre") or ""),
+        }
+        self.words = {field: [w for w in _WORD_SPLIT.split(text) if w] for field, text in self.fields.items()}
+        self.genre = self.fields["genre"]
+        self.popularity = math.log1p(row.get("plays_count") or 0) + 2 * math.log1p(row.get("likes_count") or 0)
+        self.created_at = row.get("created_at") or ""
+        self.grams: Set[str] = set()
+        for text in self.fields.values():
+            self.grams |= ngrams(text, 2) | ngrams(text, 3)
+
+
+class SearchIndex:
+    def __init__(self):
+        self.ready = False
+        self._docs: Dict[str, _Doc] = {}
+        self._postings: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def upsert(self, row: dict) -> None:
+        self.remove(str(row["id"]))
+        doc = _Doc(row)
+        self._docs[doc.id] = doc
+        for gram in doc.grams:
+            self._postings.setdefault(gram, set()).add(doc.id)
+
+    def remove(self, track_id: str) -> None:
+        doc = self._docs.pop(track_id, None)
+        if doc is None:
+            return
+        for gram in doc.grams:
+            postings = self._postings.get(gram)
+            if postings is not None:
+                postings.discard(track_id)
+                if not postings:
+                    del self._postings[gram]
+
+    def update_counts(self, track_id: str, plays_count: int, likes_count: int) -> None:
+        doc = self._docs.get(track_id)
+        if doc is not None:
+            doc.popularity = math.log1p(plays_count) + 2 * math.log1p(likes_count)
+
+    def replace_all(self, rows: Iterable[dict]) -> None:
+        fresh = SearchIndex()
+        for row in rows:
+            fresh.upsert(row)
+        self._docs, self._postings = fresh._docs, fresh._postings
+        self.ready = True
+
+    def search(self, query: str, genre: Optional[str] = None, top: Optional[int] = None) -> List[str]:
+        """Return ids of tracks matching every term of `query`, best first.
+
+        With `top`, only the best `top` ids are ranked and returned.
+        """
+        terms = [t for t in _WORD_SPLIT.split(normalize(query)) if t]
+        if not terms:
+            return []
+        genre = normalize(genre) if genre else None
+
+        candidates: Optional[Set[str]] = None
+        for term in terms:
+            matches = self._candidates(term)
+            candidates = matches if candidates is None else candidates & matches
+            if not candidates:
+                return []
+
+        scored = []
+        for track_id in candidates:
+            doc = self._docs[track_id]
+            if genre and doc.genre != genre:
+                continue
+            score = 0.0
+            for term in terms:
+                term_score = self._score(doc, term)
+                if term_score == 0:
+                    break
+                score += term_score
+            else:
+                scored.append((score, doc.popularity, doc.created_at, track_id))
+        if top is not None:
+            scored = heapq.nlargest(top, scored)
+        else:
+            scored.sort(reverse=True)
+        return [item[3] for item in scored]
+
+    def _candidates(self, term: str) -> Set[str]:
+        if len(term) == 1:
+            # Too short for the n-gram postings; a linear pass is fine here.
+            return {doc.id for doc in self._docs.values() if any(term in text for text in doc.fields.values())}
+        size = 3 if len(term) >= 3 else 2
+        grams = sorted(ngrams(term, size), key=lambda g: len(self._postings.get(g, ())))
+        result: Optional[Set[str]] = None
+        for gram in grams:
+            postings = self._postings.get(gram)
+            if not postings:
+                return set()
+            result = set(postings) if result is None else result & postings
+            if not result:
+                break
+        return result or set()
+
+    @staticmethod
+    def _score(doc: _Doc, term: str) -> float:
+        score = 0.0
+        for field, weight in FIELD_WEIGHTS.items():
+            text = doc.fields[field]
+            if term not in text:
+                continue
+            if text == term:
+                score += 4 * weight
+            elif text.startswith(term):
+                score += 3 * weight
+            elif any(word.startswith(term) for word in doc.words[field]):
+                score += 2 * weight
+            else:
+                score += weight
+        return score
+
+
+search_index = SearchIndex()
+
+
+async def build_search_index(batch_size: int = 1000) -> None:
+    """Load the whole catalogue into search_index, paging by id."""
+    rows: List[dict] = []
+    last_id = None
+    while True:
+        query = get_client().table("tracks").select(INDEXED_COLUMNS).order("id").limit(batch_size)
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        response = await query.execute()
+        rows.extend(response.data)
+        if len(response.data) < batch_size:
+            break
+        last_id = response.data[-1]["id"]
+    search_index.replace_all(rows)
+
+
+async def refresh_search_index_forever(interval: float) -> None:
+    # Periodic full rebuild picks up writes made by other workers; this
+    # worker's own writes are applied incrementally as they happen.
+    while True:
+        try:
+            await build_search_index()
+        except Exception:
+            logger.exception("Search index rebuild failed")
+        await asyncio.sleep(interval)
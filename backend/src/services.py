@@ -0,0 +1,146 @@
+import os
+import tempfile
+from typing import List, Optional
+
+from fastapi import Request
+
+from .admin_stats import AdminStats
+from .audio_cache import ChunkCache
+from .audio_pipeline import AudioPipeline
+from .cache import ResponseCache, cached_json_response, make_etag
+from .counters import TrackCounterAggregator, with_totals
+from .db import get_client
+from .likes import annotate_liked, liked_track_ids, track_ids_in
+from .live_hub import LiveHub
+from .pagination import MAX_PAGE_SIZE
+from .play_history import PlayHistoryPipeline
+from .recommender import Recommender
+from .search import search_index
+from .trending import TrendingIndex
+
+# Process-wide services shared by the routers, configured from the
+# environment. Constructing them is cheap: nothing connects or loads data
+# until the lifespan hook in main.py starts them (or a route first uses them).
+
+# Serverless mode (see main.py): no background loops, so the write-behind
+# buffers below write through on the request that recorded them.
+LAZY_INIT = os.getenv("LAZY_INIT", "").lower() in ("1", "true", "yes")
+
+# Read-through cache for the catalogue hot reads. Entries are tagged with the
+# tracks they contain so writes only drop the pages they actually change.
+response_cache = ResponseCache(
+    maxsize=int(os.getenv("RESPONSE_CACHE_SIZE", "2048")),
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", "30")),
+    stale_ttl=float(os.getenv("RESPONSE_CACHE_STALE_TTL", "300")),
+)
+
+def track_tags(tracks: list) -> list:
+    return [f"track:{track['id']}" for track in tracks]
+
+# Likes and plays are aggregated in memory and flushed as one bulk RPC. The
+# new totals it returns are written into the cached pages showing those
+# tracks (nearly every flush has plays, so dropping the pages instead would
+# defeat the cache) and re-rank the tracks in the search index.
+def _counters_flushed(totals: List[dict]) -> None:
+    by_id = {str(row["track_id"]): row for row in totals}
+    response_cache.update((f"track:{track_id}" for track_id in by_id), lambda value: with_totals(value, by_id))
+    for track_id, row in by_id.items():
+        search_index.update_counts(track_id, row["plays_count"] or 0, row["likes_count"] or 0)
+
+track_counters = TrackCounterAggregator(
+    flush_interval=float(os.getenv("TRACK_COUNTER_FLUSH_INTERVAL", "2")),
+    on_flush=_counters_flushed,
+    write_through=LAZY_INIT,
+)
+
+play_history = PlayHistoryPipeline(
+    batch_size=int(os.getenv("PLAY_HISTORY_BATCH_SIZE", "500")),
+    batch_wait=float(os.getenv("PLAY_HISTORY_BATCH_WAIT", "1")),
+    queue_size=int(os.getenv("PLAY_HISTORY_QUEUE_SIZE", "10000")),
+    spill_path=os.getenv("PLAY_HISTORY_SPILL_PATH"),
+    write_through=LAZY_INIT,
+)
+
+live_hub = LiveHub(
+    send_queue_size=int(os.getenv("LIVE_SEND_QUEUE_SIZE", "64")),
+    flush_interval=float(os.getenv("LIVE_VIEWER_FLUSH_INTERVAL", "5")),
+)
+
+# Time-decayed play/like/comment scores for GET /tracks/trending, updated
+# from the write routes in routers/tracks.py.
+trending = TrendingIndex(
+    half_life=float(os.getenv("TRENDING_HALF_LIFE_HOURS", "24")) * 3600,
+    capacity=MAX_PAGE_SIZE,
+    reload_interval=float(os.getenv("TRENDING_RELOAD_INTERVAL", "3600")),
+)
+
+# Item-to-item neighbours from likes and plays for /tracks/{id}/similar and
+# /users/me/recommendations; cached similar lists are dropped on each update.
+recommender = Recommender(
+    top_n=int(os.getenv("RECOMMENDER_NEIGHBOURS", "50")),
+    update_interval=float(os.getenv("RECOMMENDER_UPDATE_INTERVAL", "60")),
+    rebuild_interval=float(os.getenv("RECOMMENDER_REBUILD_INTERVAL", str(7 * 24 * 3600))),
+    max_deltas=int(os.getenv("RECOMMENDER_MAX_DELTAS", "100000")),
+    on_update=lambda: response_cache.invalidate("recommendations"),
+)
+
+# On-disk LRU of audio chunks fetched from storage for /tracks/{id}/stream.
+audio_cache = ChunkCache(
+    directory=os.getenv("AUDIO_CACHE_DIR", os.path.join(tempfile.gettempdir(), "beatmm-audio")),
+    max_bytes=int(os.getenv("AUDIO_CACHE_MAX_BYTES", str(1024 ** 3))),
+    chunk_size=int(os.getenv("AUDIO_CHUNK_SIZE", str(256 * 1024))),
+    max_file_bytes=int(os.getenv("AUDIO_MAX_FILE_BYTES", str(200 * 1024 ** 2))),
+)
+
+# Uploads are decoded in a process pool for their real duration, waveform
+# peaks and loudness; the track and its peaks are re-read once stored.
+audio_pipeline = AudioPipeline(
+    workers=int(os.getenv("AUDIO_ANALYSIS_WORKERS", "2")),
+    queue_size=int(os.getenv("AUDIO_ANALYSIS_QUEUE_SIZE", "1000")),
+    max_attempts=int(os.getenv("AUDIO_ANALYSIS_MAX_ATTEMPTS", "3")),
+    retry_delay=float(os.getenv("AUDIO_ANALYSIS_RETRY_DELAY", "30")),
+    on_result=lambda track_id: response_cache.invalidate(f"track:{track_id}", f"peaks:{track_id}"),
+)
+
+# Totals and hourly/daily rollups for GET /admin/stats, bumped by the write
+# routes and reconciled against the database from admin reads.
+admin_stats = AdminStats(
+    hours=int(os.getenv("ADMIN_STATS_HOURS", "48")),
+    days=int(os.getenv("ADMIN_STATS_DAYS", "30")),
+    reconcile_interval=float(os.getenv("ADMIN_STATS_RECONCILE_INTERVAL", "300")),
+)
+
+async def track_response(request: Request, data, etag: str, current_user: Optional[dict] = None):
+    # Overlay this worker's unflushed like/play deltas on cached track data,
+    # and for signed-in users add `liked_by_me` with one bulk likes lookup.
+    overlaid = track_counters.overlay(data)
+    if current_user:
+        liked = await liked_track_ids(current_user["id"], track_ids_in(overlaid))
+        overlaid = annotate_liked(overlaid, liked)
+    if overlaid is not data:
+        etag = make_etag(overlaid)
+    return cached_json_response(request, overlaid, etag)
+
+async def fetch_tracks(track_ids: List[str], columns: str = "*") -> list:
+    # One query by primary key, returned in the order of `track_ids`.
+    if not track_ids:
+        return []
+    response = await get_client().table("tracks").select(columns).in_("id", track_ids).execute()
+    by_id = {str(row["id"]): row for row in response.data}
+    return [by_id[track_id] for track_id in track_ids if track_id in by_id]
+
+async def load_track(track_id: str, columns: str = "*"):
+    # (row or None, etag); unknown ids are not an error. Misses aren't
+    # cached: only the worker that handled an upload drops its entries, so a
+    # cached miss would hide a new track from the other workers.
+    async def load():
+        response = await get_client().table("tracks").select(columns).eq("id", track_id).limit(1).execute()
+        return response.data[0] if response.data else None
+    return await response_cache.get_or_load(
+        ("track", track_id, columns), load, lambda data: [f"track:{track_id}"], keep=lambda data: data is not None
+    )
+
+async def track_exists(track_id: str) -> bool:
+    # Plays of unknown ids never reach the write-behind buffers.
+    track, _ = await load_track(track_id, "id")
+    return track is not None
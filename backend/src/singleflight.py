@@ -0,0 +1,40 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+# Coalescing of concurrent identical work: the first caller for a key (the
+# leader) runs it and later callers wait for its result. Followers wait on a
+# shielded future, so cancelling one of them leaves the others alone. If the
+# leader is cancelled (its client disconnected, say), followers get
+# FlightCancelled, an ordinary error their handlers already deal with,
+# rather than a CancelledError for a cancellation that wasn't theirs. Used
+# by the response cache, the audio chunk cache and the upstream transport.
+
+
+class FlightCancelled(RuntimeError):
+    pass
+
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    async def run(self, key: Hashable, work: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._inflight.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+        future = self._inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await work()
+        except BaseException as e:
+            future.set_exception(e if isinstance(e, Exception) else FlightCancelled("shared call was cancelled"))
+            # Mark retrieved so a failure nobody else waited for isn't logged.
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._inflight[key]
@@ -0,0 +1,253 @@
+import asyncio
+import heapq
+import logging
+import time
+from array import array
+from bisect import insort
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set, Tuple
+
+from .db import get_client
+from .pagination import apply_keyset, page
+
+logger = logging.getLogger(__name__)
+
+# Trending ("热门") ranking kept in memory. Every play, like and comment adds
+# weight * 2^(age / half_life) to the track's score ("forward decay"): scores
+# are stored relative to a fixed epoch, so decay never has to be applied to
+# the whole catalogue and tracks without new events keep their relative
+# order. That makes each event an O(K) update of the few top-K lists the
+# track belongs to (all, per VIP flag, per genre, per genre and VIP flag),
+# and GET /tracks/trending a slice of a precomputed list regardless of
+# catalogue size. Scores, genres and VIP flags live in flat arrays indexed
+# by slot.
+#
+# Unlikes lower a score, which can let a track outside a top-K list overtake
+# one in it; those lists are recomputed by the background task. A periodic
+# reload from likes/comments/play_history picks up other workers' events.
+
+EVENT_WEIGHTS = {"play": 1.0, "like": 3.0, "comment": 4.0}
+# New uploads start with a small score so fresh tracks fill the list when
+# there is little engagement.
+UPLOAD_WEIGHT = 0.5
+
+# Rescale once stored weights reach 2^64 times the epoch's.
+_REBASE_AFTER = 64
+
+_ALL = None
+BucketKey = Tuple[Optional[int], Optional[bool]]
+
+
+def _timestamp(value) -> float:
+    if not value:
+        return time.time()
+    if isinstance(value, (int, float)):
+        return float(value)
+    return datetime.fromisoformat(value).timestamp()
+
+
+class TrendingIndex:
+    def __init__(
+        self,
+        half_life: float = 24 * 3600,
+        capacity: int = 100,
+        refresh_interval: float = 10.0,
+        reload_interval: float = 3600.0,
+        window: float = 7 * 24 * 3600,
+    ):
+        self.half_life = half_life
+        self.capacity = capacity
+        self.refresh_interval = refresh_interval
+        self.reload_interval = reload_interval
+        self.window = window
+        self.ready = False
+        self._reset()
+        self._task: Optional[asyncio.Task] = None
+
+    def _reset(self) -> None:
+        self._epoch = time.time()
+        self._slots: Dict[str, int] = {}
+        self._ids: List[str] = []
+        self._scores = array("d")
+        self._genres = array("i")
+        self._vip = array("b")
+        self._genre_codes: Dict[str, int] = {}
+        self._top: Dict[BucketKey, List[int]] = {}
+        # Lists that may be missing a track after a score went down.
+        self._stale: Set[BucketKey] = set()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _weight(self, at: float) -> float:
+        exponent = (at - self._epoch) / self.half_life
+        if exponent > _REBASE_AFTER:
+            self._rebase(at)
+            exponent = 0.0
+        return 2.0 ** exponent
+
+    def _rebase(self, at: float) -> None:
+        # A uniform rescale keeps every list in order.
+        factor = 2.0 ** (-(at - self._epoch) / self.half_life)
+        for slot in range(len(self._scores)):
+            self._scores[slot] *= factor
+        self._epoch = at
+
+    def _genre_code(self, genre: Optional[str]) -> int:
+        genre = (genre or "").strip().casefold()
+        if genre not in self._genre_codes:
+            self._genre_codes[genre] = len(self._genre_codes)
+        return self._genre_codes[genre]
+
+    def _buckets(self, slot: int) -> Tuple[BucketKey, ...]:
+        genre, vip = self._genres[slot], bool(self._vip[slot])
+        return ((_ALL, _ALL), (_ALL, vip), (genre, _ALL), (genre, vip))
+
+    def _score_key(self, slot: int) -> float:
+        return -self._scores[slot]
+
+    def _place(self, slot: int) -> None:
+        score = self._scores[slot]
+        for key in self._buckets(slot):
+            top = self._top.setdefault(key, [])
+            if slot in top:
+                top.remove(slot)
+            elif len(top) >= self.capacity and score <= self._scores[top[-1]]:
+                continue
+            insort(top, slot, key=self._score_key)
+            del top[self.capacity:]
+
+    def _discard(self, slot: int) -> None:
+        for key in self._buckets(slot):
+            top = self._top.get(key)
+            if top and slot in top:
+                top.remove(slot)
+                self._stale.add(key)
+
+    def upsert(self, row: dict) -> None:
+        """Add a track or update its genre / VIP flag."""
+        track_id = str(row["id"])
+        slot = self._slots.get(track_id)
+        if slot is None:
+            slot = self._slots[track_id] = len(self._ids)
+            self._ids.append(track_id)
+            self._scores.append(UPLOAD_WEIGHT * self._weight(_timestamp(row.get("created_at"))))
+            self._genres.append(self._genre_code(row.get("genre")))
+            self._vip.append(bool(row.get("is_vip_only")))
+        else:
+            genre = self._genre_code(row["genre"]) if "genre" in row else self._genres[slot]
+            vip = bool(row["is_vip_only"]) if "is_vip_only" in row else bool(self._vip[slot])
+            if (genre, vip) == (self._genres[slot], bool(self._vip[slot])):
+                return
+            self._discard(slot)
+            self._genres[slot], self._vip[slot] = genre, vip
+        self._place(slot)
+
+    def record(self, track_id: str, kind: str, count: int = 1, at: Optional[float] = None) -> None:
+        """Apply `count` events of `kind` (play, like, comment); negative counts undo."""
+        slot = self._slots.get(str(track_id))
+        if slot is None:
+            # Not indexed yet (uploaded on another worker); the next reload
+            # brings the track in along with its events.
+            return
+        delta = EVENT_WEIGHTS[kind] * count * self._weight(at if at is not None else time.time())
+        self._scores[slot] = max(self._scores[slot] + delta, 0.0)
+        self._place(slot)
+        if delta < 0:
+            self._stale.update(key for key in self._buckets(slot) if len(self._top.get(key, ())) >= self.capacity)
+
+    def top(self, genre: Optional[str] = None, vip: Optional[bool] = None, limit: int = 20) -> List[str]:
+        genre = (genre or "").strip().casefold()
+        if genre and genre not in self._genre_codes:
+            return []
+        key = (self._genre_codes[genre] if genre else _ALL, vip)
+        return [self._ids[slot] for slot in self._top.get(key, ())[:limit]]
+
+    def score(self, track_id: str) -> float:
+        """Current decayed score, in event-weight units."""
+        slot = self._slots.get(str(track_id))
+        if slot is None:
+            return 0.0
+        return self._scores[slot] * 2.0 ** (-(time.time() - self._epoch) / self.half_life)
+
+    def refresh_stale(self) -> None:
+        # Recompute lists that may have lost a member to a lower score.
+        stale, self._stale = self._stale, set()
+        for genre, vip in stale:
+            members = (
+                slot for slot in range(len(self._ids))
+                if (genre is _ALL or self._genres[slot] == genre) and (vip is _ALL or bool(self._vip[slot]) == vip)
+            )
+            self._top[(genre, vip)] = heapq.nlargest(self.capacity, members, key=self._scores.__getitem__)
+
+    def replace_all(self, tracks: List[dict], events: List[Tuple[str, str, float]]) -> None:
+        """Rebuild from track rows and (track_id, kind, timestamp) events."""
+        self._reset()
+        for row in tracks:
+            track_id = str(row["id"])
+            self._slots[track_id] = len(self._ids)
+            self._ids.append(track_id)
+            self._scores.append(UPLOAD_WEIGHT * self._weight(_timestamp(row.get("created_at"))))
+            self._genres.append(self._genre_code(row.get("genre")))
+            self._vip.append(bool(row.get("is_vip_only")))
+        for track_id, kind, at in events:
+            slot = self._slots.get(str(track_id))
+            if slot is not None:
+                self._scores[slot] += EVENT_WEIGHTS[kind] * self._weight(at)
+        self._stale = {key for slot in range(len(self._ids)) for key in self._buckets(slot)}
+        self.refresh_stale()
+        self.ready = True
+
+    async def load(self, batch_size: int = 1000) -> None:
+        """Rebuild from the catalogue and the events of the last `window` seconds."""
+        tracks: List[dict] = []
+        last_id = None
+        while True:
+            query = get_client().table("tracks").select("id, genre, is_vip_only, created_at").order("id").limit(batch_size)
+            if last_id is not None:
+                query = query.gt("id", last_id)
+            response = await query.execute()
+            tracks.extend(response.data)
+            if len(response.data) < batch_size:
+                break
+            last_id = response.data[-1]["id"]
+
+        since = (datetime.now(timezone.utc) - timedelta(seconds=self.window)).isoformat()
+        events: List[Tuple[str, str, float]] = []
+        for table, column, kind in (("play_history", "played_at", "play"), ("likes", "created_at", "like"), ("comments", "created_at", "comment")):
+            after = None
+            while True:
+                query = get_client().table(table).select(f"id, track_id, {column}").gte(column, since)
+                response = await apply_keyset(query, after, batch_size, column).execute()
+                rows, cursor = page(response.data, batch_size, column)
+                events.extend((row["track_id"], kind, _timestamp(row[column])) for row in rows)
+                if cursor is None:
+                    break
+                after = (rows[-1][column], str(rows[-1]["id"]))
+        self.replace_all(tracks, events)
+
+    async def _run(self) -> None:
+        next_reload = 0.0
+        while True:
+            try:
+                if time.monotonic() >= next_reload:
+                    await self.load()
+                    next_reload = time.monotonic() + self.reload_interval
+                else:
+                    self.refresh_stale()
+            except Exception:
+                logger.exception("Trending index refresh failed")
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
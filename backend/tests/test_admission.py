@@ -0,0 +1,149 @@
+import asyncio
+
+import httpx
+import pytest
+
+from src.admission import AdmissionMiddleware, AdmissionTransport, RateLimiter, TrustedProxies, UpstreamLimiter, UpstreamOverloaded, parse_limit, route_group
+
+
+def scope(peer, headers=()):
+    return {"client": (peer, 1234), "headers": [(name.encode(), value.encode()) for name, value in headers]}
+
+
+def test_without_trusted_proxies_the_peer_is_the_client():
+    proxies = TrustedProxies("")
+    assert proxies.client_ip(scope("10.0.0.1", [("x-forwarded-for", "1.2.3.4")])) == "10.0.0.1"
+
+
+def test_forwarded_client_of_a_trusted_proxy():
+    proxies = TrustedProxies("10.0.0.0/8")
+    assert proxies.client_ip(scope("10.0.0.1", [("x-forwarded-for", "1.2.3.4")])) == "1.2.3.4"
+    assert proxies.client_ip(scope("10.0.0.1", [("x-real-ip", "5.6.7.8")])) == "5.6.7.8"
+    assert proxies.client_ip(scope("10.0.0.1")) == "10.0.0.1"
+
+
+def test_headers_from_untrusted_peers_are_ignored():
+    proxies = TrustedProxies("10.0.0.0/8")
+    assert proxies.client_ip(scope("9.9.9.9", [("x-forwarded-for", "1.2.3.4"), ("x-real-ip", "1.2.3.4")])) == "9.9.9.9"
+
+
+def test_spoofed_hops_left_of_the_proxy_chain_are_skipped():
+    proxies = TrustedProxies("10.0.0.0/8")
+    # The client sent "6.6.6.6" itself; our proxies appended 1.2.3.4 and 10.0.0.2.
+    headers = [("x-forwarded-for", "6.6.6.6, 1.2.3.4"), ("x-forwarded-for", "10.0.0.2")]
+    assert proxies.client_ip(scope("10.0.0.1", headers)) == "1.2.3.4"
+
+
+def test_any_peer_trusts_only_the_hop_it_appended():
+    proxies = TrustedProxies("*")
+    assert proxies.client_ip(scope("76.76.21.21", [("x-forwarded-for", "6.6.6.6, 1.2.3.4")])) == "1.2.3.4"
+
+
+def test_bucket_allows_a_burst_then_refills_at_the_rate():
+    limiter = RateLimiter(rate=2, burst=3)
+    assert [limiter.allow("a", now=0)[0] for _ in range(4)] == [True, True, True, False]
+    allowed, retry_after = limiter.allow("a", now=0)
+    assert not allowed and retry_after == pytest.approx(0.5)
+    assert limiter.allow("a", now=0.5) == (True, 0.0)
+    assert not limiter.allow("a", now=0.5)[0]
+    # Idle time refills up to the burst, no further.
+    assert [limiter.allow("a", now=100)[0] for _ in range(4)] == [True, True, True, False]
+
+
+def test_buckets_are_per_caller_and_bounded():
+    limiter = RateLimiter(rate=1, burst=1, max_keys=2)
+    assert limiter.allow("a", now=0)[0] and limiter.allow("b", now=0)[0]
+    assert not limiter.allow("a", now=0)[0]
+    limiter.allow("c", now=0)
+    assert list(limiter._buckets) == ["a", "c"]
+
+
+def test_parse_limit():
+    assert parse_limit("off") is None and parse_limit("") is None and parse_limit("0") is None
+    limiter = parse_limit("3,15")
+    assert (limiter.rate, limiter.burst) == (3, 15)
+    assert parse_limit("2").burst == 2
+
+
+def test_route_groups():
+    assert route_group("POST", "/auth/login", b"") == "auth"
+    assert route_group("GET", "/tracks", b"query=rain") == "search"
+    assert route_group("GET", "/tracks", b"query=+") == "reads"
+    assert route_group("POST", "/tracks/batch", b"") == "reads"
+    assert route_group("DELETE", "/tracks/1", b"") == "writes"
+
+
+def test_upstream_limiter_sheds_when_the_queue_is_full():
+    async def main():
+        limiter = UpstreamLimiter(limit=1, max_queue=1, max_wait=10)
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(UpstreamOverloaded):
+            await limiter.acquire()
+        # The released slot goes straight to the queued caller.
+        limiter.release()
+        await waiter
+        assert limiter.active == 1 and not limiter._waiters
+        limiter.release()
+        assert limiter.active == 0
+    asyncio.run(main())
+
+
+def test_upstream_limiter_sheds_waiters_after_max_wait():
+    async def main():
+        limiter = UpstreamLimiter(limit=1, max_queue=5, max_wait=0.01)
+        await limiter.acquire()
+        with pytest.raises(UpstreamOverloaded):
+            await limiter.acquire()
+        assert not limiter._waiters
+        limiter.release()
+        assert limiter.active == 0
+    asyncio.run(main())
+
+
+def test_upstream_limiter_serves_waiters_in_order_and_skips_cancelled_ones():
+    async def main():
+        limiter, order = UpstreamLimiter(limit=1, max_queue=5, max_wait=10), []
+
+        async def wait(name):
+            await limiter.acquire()
+            order.append(name)
+
+        await limiter.acquire()
+        tasks = {name: asyncio.create_task(wait(name)) for name in "abc"}
+        await asyncio.sleep(0)
+        tasks["a"].cancel()
+        await asyncio.sleep(0)
+        limiter.release()
+        await tasks["b"]
+        limiter.release()
+        await tasks["c"]
+        assert order == ["b", "c"] and limiter.active == 1 and not limiter._waiters
+    asyncio.run(main())
+
+
+def test_requests_shed_upstream_get_503_and_rate_limited_ones_429():
+    upstream = httpx.AsyncClient(
+        transport=AdmissionTransport(httpx.MockTransport(lambda request: httpx.Response(200)), UpstreamLimiter(limit=0, max_queue=0, max_wait=1)),
+        base_url="http://upstream",
+    )
+
+    async def app(scope, receive, send):
+        # Like the routes: any failure becomes a 500.
+        try:
+            await upstream.get("/rows")
+            status = 200
+        except Exception:
+            status = 500
+        await send({"type": "http.response.start", "status": status, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    limiters = {"reads": RateLimiter(rate=1, burst=1)}
+    api = httpx.AsyncClient(transport=httpx.ASGITransport(app=AdmissionMiddleware(app, limiters)), base_url="http://test")
+
+    async def main():
+        first, second = await api.get("/tracks"), await api.get("/tracks")
+        assert first.status_code == 503 and first.headers["retry-after"] == "1"
+        assert second.status_code == 429 and int(second.headers["retry-after"]) >= 1
+    asyncio.run(main())
@@ -0,0 +1,71 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from src.audio_cache import RangeNotSatisfiable, parse_range
+from src.routers import tracks as tracks_module
+
+SIZE = 1000
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("", None),
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, SIZE - 1)),
+    ("bytes=0-0", (0, 0)),
+    (" bytes=10-20 ", (10, 20)),
+    # Past the end: clamped to the last byte
+    ("bytes=900-5000", (900, SIZE - 1)),
+    ("bytes=999-999", (999, 999)),
+    # Suffix ranges: the last N bytes, the whole file when N exceeds it
+    ("bytes=-1", (SIZE - 1, SIZE - 1)),
+    ("bytes=-100", (900, SIZE - 1)),
+    ("bytes=-5000", (0, SIZE - 1)),
+    # Malformed and multi-range headers fall back to the whole file
+    ("bytes=-", None),
+    ("bytes=0-9,20-29", None),
+    ("items=0-9", None),
+    ("bytes=a-b", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, SIZE) == expected
+
+
+@pytest.mark.parametrize("header, size", [
+    ("bytes=1000-", SIZE),
+    ("bytes=5000-6000", SIZE),
+    ("bytes=20-10", SIZE),
+    ("bytes=-0", SIZE),
+    ("bytes=-10", 0),
+    ("bytes=0-", 0),
+])
+def test_unsatisfiable_ranges(header, size):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range(header, size)
+
+
+def test_stream_answers_unsatisfiable_ranges_with_416(monkeypatch):
+    track = {"id": "t1", "audio_url": "https://example.supabase.co/storage/v1/object/public/audio/t1.mp3"}
+
+    async def load_track(track_id, columns="*"):
+        return track, '"etag"'
+
+    async def describe(url):
+        return SIZE, "audio/mpeg"
+
+    monkeypatch.setattr(tracks_module, "load_track", load_track)
+    monkeypatch.setattr(tracks_module, "is_allowed_audio_url", lambda url: True)
+    monkeypatch.setattr(tracks_module.audio_cache, "describe", describe)
+    app = FastAPI()
+    app.include_router(tracks_module.router)
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.get("/tracks/t1/stream", headers={"Range": "bytes=2000-"})
+    response = asyncio.run(main())
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{SIZE}"
+    assert response.headers["accept-ranges"] == "bytes"
@@ -0,0 +1,98 @@
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+import pytest
+from fastapi import HTTPException
+from postgrest.exceptions import APIError
+
+from src import ledger
+
+TOKEN = "user-token"
+
+
+class FakeRpc:
+    def __init__(self, client: "FakeClient", function: str, params: dict):
+        self.client, self.function, self.params = client, function, params
+        self.headers = {"Authorization": "Bearer anon-key"}
+
+    async def execute(self):
+        self.client.calls.append((self.function, dict(self.params), self.headers["Authorization"]))
+        if self.client.error:
+            raise APIError({"code": "P0001", "message": self.client.error})
+        # Like the ledger functions: the first call under a key applies the
+        # change and stores its result, later calls get that result back.
+        key = (self.headers["Authorization"], self.params["p_idempotency_key"])
+        if key not in self.client.results:
+            self.client.balance += self.params["p_amount"]
+            self.client.results[key] = {"wallet_balance": self.client.balance}
+        return type("Response", (), {"data": self.client.results[key]})()
+
+
+class FakeClient:
+    def __init__(self, error: Optional[str] = None):
+        self.error = error
+        self.balance = 0.0
+        self.results: Dict[Tuple[str, str], dict] = {}
+        self.calls: List[tuple] = []
+
+    def rpc(self, function: str, params: dict) -> FakeRpc:
+        return FakeRpc(self, function, params)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = FakeClient()
+    monkeypatch.setattr(ledger, "get_client", lambda: client)
+    return client
+
+
+def test_rpc_runs_as_the_caller(client):
+    asyncio.run(ledger.recharge_wallet(TOKEN, 10, "key-1"))
+    assert client.calls == [("ledger_recharge_wallet", {"p_amount": 10, "p_idempotency_key": "key-1"}, f"Bearer {TOKEN}")]
+
+
+def test_retry_with_the_same_key_replays_the_stored_result(client):
+    first = asyncio.run(ledger.recharge_wallet(TOKEN, 10, "key-1"))
+    retry = asyncio.run(ledger.recharge_wallet(TOKEN, 10, "key-1"))
+    assert first == retry == {"wallet_balance": 10}
+    assert asyncio.run(ledger.recharge_wallet(TOKEN, 10, "key-2")) == {"wallet_balance": 20}
+    assert [call[1]["p_idempotency_key"] for call in client.calls] == ["key-1", "key-1", "key-2"]
+
+
+def test_calls_without_a_key_are_not_deduplicated(client):
+    asyncio.run(ledger.recharge_wallet(TOKEN, 10))
+    asyncio.run(ledger.recharge_wallet(TOKEN, 10))
+    first, second = (call[1]["p_idempotency_key"] for call in client.calls)
+    assert first != second and client.balance == 20
+
+
+@pytest.mark.parametrize("message, status_code", [
+    ("insufficient_balance", 400),
+    ("user_not_found", 404),
+    ("not_authenticated", 401),
+    ("unknown_plan", 400),
+    ("price_mismatch", 409),
+    ("invalid_amount", 400),
+])
+def test_ledger_errors_map_to_api_errors(client, message, status_code):
+    client.error = message
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(ledger.purchase_vip(TOKEN, "monthly", 9.99, "key-1"))
+    assert error.value.status_code == status_code and error.value.detail != message
+
+
+def test_other_database_errors_are_raised_unchanged(client):
+    client.error = "connection reset"
+    with pytest.raises(APIError):
+        asyncio.run(ledger.recharge_wallet(TOKEN, 10, "key-1"))
+
+
+@pytest.mark.parametrize("call", [
+    lambda: ledger.purchase_vip(TOKEN, "weekly", 9.99),
+    lambda: ledger.purchase_vip(TOKEN, "monthly", 0),
+    lambda: ledger.recharge_wallet(TOKEN, -5),
+])
+def test_invalid_requests_are_rejected_before_the_rpc(client, call):
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(call())
+    assert error.value.status_code == 400 and not client.calls
@@ -0,0 +1,72 @@
+import asyncio
+import uuid
+from typing import Dict, List
+
+from src.live_hub import LiveHub, _Connection
+
+STREAM = str(uuid.uuid4())
+OTHER = str(uuid.uuid4())
+
+
+class MemoryHub(LiveHub):
+    """Hub whose viewer deltas are recorded instead of sent to the RPC."""
+
+    def __init__(self):
+        super().__init__()
+        self.applied: List[Dict[str, int]] = []
+        self.remember([{"id": STREAM, "category": "house"}, {"id": OTHER, "category": "techno"}])
+
+    async def _apply_viewer_deltas(self, deltas: Dict[str, int]) -> None:
+        if deltas:
+            self.applied.append(deltas)
+
+
+def connect(hub: LiveHub, viewer: str) -> _Connection:
+    return _Connection(None, viewer, hub.send_queue_size)
+
+
+def test_a_viewer_counts_once_however_many_sockets_it_opens():
+    hub = MemoryHub()
+    sockets = [connect(hub, "ip:203.0.113.7") for _ in range(5)]
+    for connection in sockets:
+        hub._watch(connection, STREAM)
+    assert hub._viewer_deltas == {STREAM: 1}
+    for connection in sockets[:-1]:
+        hub._watch(connection, None)
+    assert hub._viewer_deltas == {STREAM: 1}
+    hub._watch(sockets[-1], None)
+    assert hub._viewer_deltas == {STREAM: 0} and STREAM not in hub._watchers
+
+
+def test_distinct_viewers_each_count():
+    hub = MemoryHub()
+    for viewer in ("user:1", "user:2", "ip:203.0.113.7"):
+        hub._watch(connect(hub, viewer), STREAM)
+    assert hub._viewer_deltas == {STREAM: 3}
+
+
+def test_switching_streams_moves_the_viewer():
+    hub = MemoryHub()
+    connection = connect(hub, "user:1")
+    hub._watch(connection, STREAM)
+    hub._watch(connection, OTHER)
+    assert hub._viewer_deltas == {STREAM: 0, OTHER: 1}
+
+
+def test_ending_a_stream_flushes_its_pending_delta_first():
+    hub = MemoryHub()
+    hub._watch(connect(hub, "user:1"), STREAM)
+    hub._watch(connect(hub, "user:2"), OTHER)
+    asyncio.run(hub.stream_ended(STREAM))
+    assert hub.applied == [{STREAM: 1}]
+    assert STREAM not in hub._stream_categories and STREAM not in hub._watchers
+    assert hub._viewer_deltas == {OTHER: 1}
+
+
+def test_leaving_an_ended_stream_changes_nothing():
+    hub = MemoryHub()
+    connection = connect(hub, "user:1")
+    hub._watch(connection, STREAM)
+    asyncio.run(hub.stream_ended(STREAM))
+    hub._watch(connection, None)
+    assert hub._viewer_deltas == {}
@@ -0,0 +1,53 @@
+import base64
+import json
+import uuid
+
+import pytest
+from fastapi import HTTPException
+
+from src.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, clamp_limit, decode_cursor, encode_cursor, page
+
+ROW = {"id": str(uuid.uuid4()), "created_at": "2024-01-01T12:00:00.123456+00:00", "played_at": "2024-02-01T00:00:00+00:00"}
+
+
+def token(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip("=")
+
+
+def test_cursor_round_trips():
+    assert decode_cursor(encode_cursor(ROW)) == (ROW["created_at"], ROW["id"])
+    assert decode_cursor(encode_cursor(ROW, "played_at")) == (ROW["played_at"], ROW["id"])
+
+
+def test_cursor_is_url_safe():
+    cursor = encode_cursor(ROW)
+    assert "=" not in cursor and "+" not in cursor and "/" not in cursor
+
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "not base64!",
+    token(["2024-01-01T00:00:00+00:00"]),
+    token({"created_at": "2024-01-01T00:00:00+00:00", "id": "1"}),
+    token(["yesterday", "1"]),
+    token(["2024-01-01T00:00:00+00:00", "1),id.gt.(0"]),
+    token(["2024-01-01T00:00:00+00:00", "x" * 65]),
+    token([1, "1"]),
+])
+def test_bad_cursors_are_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+    assert error.value.status_code == 400
+
+
+def test_page_returns_a_cursor_only_when_more_rows_follow():
+    rows = [{"id": str(i), "created_at": f"2024-01-01T00:00:0{9 - i}+00:00"} for i in range(4)]
+    first, cursor = page(rows, 3)
+    assert first == rows[:3] and decode_cursor(cursor) == (rows[2]["created_at"], "2")
+    assert page(rows[:3], 3) == (rows[:3], None)
+
+
+def test_clamp_limit():
+    assert clamp_limit(None) == DEFAULT_PAGE_SIZE and clamp_limit(None, 5) == 5
+    assert clamp_limit(0) == 1 and clamp_limit(-3) == 1
+    assert clamp_limit(10_000) == MAX_PAGE_SIZE
@@ -0,0 +1,174 @@
+import asyncio
+import random
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+import pytest
+from postgrest.exceptions import APIError
+
+from src import play_history as play_history_module
+from src.play_history import PlayHistoryPipeline, collapse
+
+USER = "user-1"
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def play(track_id: str, seconds: int) -> dict:
+    return {"track_id": track_id, "played_at": (START + timedelta(seconds=seconds)).isoformat()}
+
+
+class MemoryHistory(PlayHistoryPipeline):
+    """Pipeline whose play_history table is a list of plays."""
+
+    def __init__(self, stored: List[dict], **kwargs):
+        super().__init__(**kwargs)
+        self.stored = stored
+        self.fetches = 0
+
+    async def _fetch(self, user_id: str, before: Optional[str], limit: int) -> List[dict]:
+        self.fetches += 1
+        rows = sorted(self.stored, key=lambda row: row["played_at"], reverse=True)
+        if before is not None:
+            cutoff = datetime.fromisoformat(before)
+            rows = [row for row in rows if datetime.fromisoformat(row["played_at"]) < cutoff]
+        return [dict(row) for row in rows[:limit]]
+
+
+def all_pages(history: PlayHistoryPipeline, limit: int) -> List[dict]:
+    async def walk():
+        pages, before = [], None
+        while True:
+            rows, more = await history.history(USER, limit, before)
+            assert len(rows) <= limit
+            pages += rows
+            if not more:
+                return pages
+            assert rows, "a page with more after it must not be empty"
+            before = rows[-1]["first_played_at"]
+    return asyncio.run(walk())
+
+
+def summary(entries: List[dict]) -> List[tuple]:
+    return [(entry["track_id"], entry["plays"]) for entry in entries]
+
+
+def test_collapse_keeps_newest_and_oldest_play_of_a_run():
+    plays = [play("a", 5), play("a", 4), play("b", 3), play("a", 2), play("a", 1), play("a", 0)]
+    entries = collapse(plays)
+    assert summary(entries) == [("a", 2), ("b", 1), ("a", 3)]
+    assert entries[0]["played_at"] == plays[0]["played_at"]
+    assert entries[0]["first_played_at"] == plays[1]["played_at"]
+    assert entries[2]["first_played_at"] == plays[5]["played_at"]
+
+
+def test_collapse_merges_already_collapsed_entries():
+    first = collapse([play("a", 9), play("a", 8)])
+    second = collapse([play("a", 7), play("b", 6)])
+    assert summary(collapse(first + second)) == [("a", 3), ("b", 1)]
+    assert collapse(first + second)[0]["first_played_at"] == play("a", 7)["played_at"]
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("limit", [1, 2, 3, 7])
+def test_pages_cover_the_collapsed_history_exactly_once(seed, limit):
+    rng = random.Random(seed)
+    # Long runs of replays so runs straddle pages, the buffer and fetches.
+    plays, track = [], "t0"
+    for second in range(rng.randint(0, 60)):
+        if rng.random() < 0.4:
+            track = f"t{rng.randint(0, 4)}"
+        plays.append(play(track, second))
+    newest_first = plays[::-1]
+    history = MemoryHistory(plays, recent_size=rng.randint(1, 12))
+    assert summary(all_pages(history, limit)) == summary(collapse(newest_first))
+
+
+def test_unflushed_plays_are_not_counted_twice():
+    # a@0..a@2 are stored; a@2 is also still in this worker's buffer, and
+    # a@3 hasn't been flushed yet.
+    stored = [play("b", -1), play("a", 0), play("a", 1), play("a", 2)]
+    history = MemoryHistory(stored, recent_size=3)
+    history._remember(USER, play("a", 2))
+    history._remember(USER, play("a", 3))
+    assert summary(all_pages(history, 1)) == [("a", 4), ("b", 1)]
+    assert summary(all_pages(history, 5)) == [("a", 4), ("b", 1)]
+
+
+def test_buffer_serves_recent_pages_without_the_table():
+    history = MemoryHistory([], recent_size=10)
+    asyncio.run(history.recent(USER))
+    for second, track in enumerate("aabcd"):
+        history._remember(USER, play(track, second))
+    history.fetches = 0
+    rows, more = asyncio.run(history.history(USER, 2))
+    assert summary(rows) == [("d", 1), ("c", 1)] and more
+    assert history.fetches == 0
+
+
+def test_empty_history():
+    history = MemoryHistory([])
+    assert asyncio.run(history.history(USER, 20)) == ([], False)
+
+
+class FakeQuery:
+    def __init__(self, client, table):
+        self.client, self.table, self.action, self.rows, self.ids = client, table, None, None, None
+
+    def insert(self, rows):
+        self.action, self.rows = "insert", rows
+        return self
+
+    def select(self, columns):
+        self.action = "select"
+        return self
+
+    def in_(self, column, ids):
+        self.ids = set(ids)
+        return self
+
+    async def execute(self):
+        if self.action == "select":
+            return type("Response", (), {"data": [{"id": row_id} for row_id in self.ids if row_id in self.client.existing[self.table]]})()
+        if any(row["track_id"] not in self.client.existing["tracks"] for row in self.rows):
+            raise APIError({"code": "23503", "message": "insert or update on table violates foreign key constraint"})
+        self.client.inserted.extend(self.rows)
+        return type("Response", (), {"data": self.rows})()
+
+
+class FakeClient:
+    def __init__(self, tracks, users):
+        self.existing = {"tracks": set(tracks), "users": set(users)}
+        self.inserted: List[dict] = []
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+def test_foreign_key_violation_drops_only_the_orphaned_events(monkeypatch, tmp_path):
+    client = FakeClient(tracks={"t1", "t2"}, users={USER})
+    monkeypatch.setattr(play_history_module, "get_client", lambda: client)
+    spill = tmp_path / "spill.jsonl"
+    history = PlayHistoryPipeline(spill_path=str(spill))
+    batch = [
+        {"user_id": USER, "track_id": "t1", "played_at": "2024-01-01T00:00:00+00:00"},
+        {"user_id": USER, "track_id": "deleted", "played_at": "2024-01-01T00:00:01+00:00"},
+        {"user_id": USER, "track_id": "t2", "played_at": "2024-01-01T00:00:02+00:00"},
+    ]
+    assert asyncio.run(history._flush(batch))
+    assert [event["track_id"] for event in client.inserted] == ["t1", "t2"]
+    assert not spill.exists()
+
+
+def test_spill_replay_drains_past_orphaned_events(monkeypatch, tmp_path):
+    client = FakeClient(tracks={"t1"}, users={USER})
+    monkeypatch.setattr(play_history_module, "get_client", lambda: client)
+    spill = tmp_path / "spill.jsonl"
+    history = PlayHistoryPipeline(spill_path=str(spill), batch_size=2)
+    history._spill([
+        {"user_id": USER, "track_id": "deleted", "played_at": "2024-01-01T00:00:00+00:00"},
+        {"user_id": USER, "track_id": "t1", "played_at": "2024-01-01T00:00:01+00:00"},
+        {"user_id": USER, "track_id": "t1", "played_at": "2024-01-01T00:00:02+00:00"},
+    ])
+    asyncio.run(history._replay_spill())
+    assert len(client.inserted) == 2
+    assert not spill.exists() and not (tmp_path / "spill.jsonl.replaying").exists()
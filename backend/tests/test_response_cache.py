@@ -0,0 +1,86 @@
+import asyncio
+
+from src.cache import ResponseCache
+from src.counters import with_totals
+
+
+def load_during(cache: ResponseCache, key: str, tags, write):
+    """Load `key` with `write` running while the loader is in flight."""
+    async def main():
+        release = asyncio.Event()
+
+        async def loader():
+            await release.wait()
+            return {"key": key}
+
+        task = asyncio.create_task(cache.get_or_load(key, loader, lambda value: tags))
+        await asyncio.sleep(0)
+        write()
+        release.set()
+        return await task
+    return asyncio.run(main())
+
+
+def test_unrelated_invalidation_keeps_the_loaded_value():
+    cache = ResponseCache()
+    load_during(cache, "a", ["track:1"], lambda: cache.invalidate("track:2", "comments:2"))
+    assert "a" in cache._entries
+
+
+def test_invalidating_a_tag_of_the_load_discards_its_value():
+    cache = ResponseCache()
+    value, _ = load_during(cache, "a", ["track:1", "tracks:list"], lambda: cache.invalidate("tracks:list"))
+    assert value == {"key": "a"}
+    assert "a" not in cache._entries
+
+
+def test_clear_discards_loads_in_flight():
+    cache = ResponseCache()
+    load_during(cache, "a", [], cache.clear)
+    assert "a" not in cache._entries
+
+
+def test_invalidation_log_is_only_kept_while_loads_run():
+    cache = ResponseCache()
+    cache.invalidate("track:1")
+    assert not cache._invalidated
+    load_during(cache, "a", ["track:1"], lambda: cache.invalidate("track:3"))
+    assert not cache._invalidated and not cache._load_starts
+
+
+def test_invalidate_without_tags_is_a_no_op():
+    cache = ResponseCache()
+    load_during(cache, "a", ["track:1"], cache.invalidate)
+    assert "a" in cache._entries and cache._clock == 0
+
+
+def test_update_rewrites_tagged_entries_with_flushed_totals():
+    async def main():
+        cache = ResponseCache()
+
+        async def page():
+            return {"data": [{"id": "1", "plays_count": 5, "likes_count": 1}, {"id": "2", "plays_count": 7}]}
+
+        _, old_etag = await cache.get_or_load("page", page, lambda value: ["track:1", "track:2"])
+        totals = {"1": {"track_id": "1", "plays_count": 9, "likes_count": 2}}
+        cache.update(["track:1"], lambda value: with_totals(value, totals))
+        value, etag = await cache.get_or_load("page", page)
+        assert value["data"] == [{"id": "1", "plays_count": 9, "likes_count": 2}, {"id": "2", "plays_count": 7}]
+        assert etag != old_etag
+    asyncio.run(main())
+
+
+def test_values_not_kept_are_loaded_again():
+    async def main():
+        cache, calls = ResponseCache(), 0
+
+        async def missing():
+            nonlocal calls
+            calls += 1
+            return None
+
+        for _ in range(2):
+            value, _ = await cache.get_or_load("track", missing, keep=lambda value: value is not None)
+            assert value is None
+        assert calls == 2 and "track" not in cache._entries
+    asyncio.run(main())
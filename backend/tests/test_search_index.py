@@ -0,0 +1,63 @@
+from src.search import SearchIndex
+
+
+def track(track_id: str, title: str, artist: str = "", plays: int = 0, likes: int = 0, **fields) -> dict:
+    return {"id": track_id, "title": title, "artist": artist, "plays_count": plays, "likes_count": likes, **fields}
+
+
+def index(*rows: dict) -> SearchIndex:
+    search_index = SearchIndex()
+    search_index.replace_all(rows)
+    return search_index
+
+
+def test_ranks_exact_then_prefix_then_word_prefix_then_substring():
+    search_index = index(
+        track("substring", "Moonlighthouse"),
+        track("word", "Dark Light"),
+        track("prefix", "Lights Out"),
+        track("exact", "light"),
+    )
+    assert search_index.search("light") == ["exact", "prefix", "word", "substring"]
+
+
+def test_title_matches_outrank_artist_matches():
+    search_index = index(track("artist", "Song", artist="Echo"), track("title", "Echo", artist="Someone"))
+    assert search_index.search("echo") == ["title", "artist"]
+
+
+def test_every_term_must_match():
+    search_index = index(track("both", "Night Drive", artist="Aung"), track("one", "Night Shift"))
+    assert search_index.search("night aung") == ["both"]
+    assert search_index.search("night nobody") == []
+
+
+def test_matches_substrings_of_non_latin_titles_and_normalizes_case():
+    search_index = index(track("mm", "ချစ်သူ သီချင်း"), track("cjk", "夜空の歌"), track("latin", "ÉCLAIR"))
+    assert search_index.search("သီချင်း") == ["mm"]
+    assert search_index.search("空の") == ["cjk"]
+    assert search_index.search("éclair") == ["latin"]
+
+
+def test_genre_filter_and_top():
+    search_index = index(*(track(str(i), f"Beat {i}", plays=i, genre="house" if i % 2 else "pop") for i in range(6)))
+    assert search_index.search("beat", genre="House") == ["5", "3", "1"]
+    assert search_index.search("beat", top=2) == ["5", "4"]
+
+
+def test_update_counts_reorders_ties_by_popularity():
+    search_index = index(track("a", "Rain", plays=100, likes=5), track("b", "Rain", plays=10))
+    assert search_index.search("rain") == ["a", "b"]
+    search_index.update_counts("b", 500, 50)
+    assert search_index.search("rain") == ["b", "a"]
+    # Unknown tracks are ignored rather than added.
+    search_index.update_counts("missing", 1, 1)
+    assert len(search_index) == 2
+
+
+def test_upsert_replaces_the_indexed_text_and_remove_drops_it():
+    search_index = index(track("a", "Old Title"))
+    search_index.upsert(track("a", "New Title"))
+    assert search_index.search("old") == [] and search_index.search("new") == ["a"]
+    search_index.remove("a")
+    assert search_index.search("title") == [] and not search_index._postings
@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from src.cache import ResponseCache
+from src.singleflight import FlightCancelled, SingleFlight
+
+
+def test_concurrent_calls_share_one_run():
+    async def main():
+        flights, calls = SingleFlight(), 0
+
+        async def work():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "value"
+
+        results = await asyncio.gather(*(flights.run("key", work) for _ in range(5)))
+        assert results == ["value"] * 5 and calls == 1
+        assert "key" not in flights
+    asyncio.run(main())
+
+
+def test_errors_reach_every_caller():
+    async def main():
+        flights = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.01)
+            raise ValueError("upstream failed")
+
+        results = await asyncio.gather(*(flights.run("key", work) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+    asyncio.run(main())
+
+
+def test_cancelled_leader_fails_followers_with_an_ordinary_error():
+    async def main():
+        flights, started = SingleFlight(), asyncio.Event()
+
+        async def work():
+            started.set()
+            await asyncio.sleep(10)
+
+        leader = asyncio.create_task(flights.run("key", work))
+        await started.wait()
+        follower = asyncio.create_task(flights.run("key", work))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(FlightCancelled):
+            await follower
+        assert leader.cancelled()
+        assert "key" not in flights
+    asyncio.run(main())
+
+
+def test_cancelled_follower_leaves_the_leader_running():
+    async def main():
+        flights = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.02)
+            return "value"
+
+        leader = asyncio.create_task(flights.run("key", work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flights.run("key", work))
+        await asyncio.sleep(0)
+        follower.cancel()
+        assert await leader == "value"
+        assert follower.cancelled()
+    asyncio.run(main())
+
+
+def test_response_cache_followers_survive_a_cancelled_load():
+    async def main():
+        cache, started = ResponseCache(), asyncio.Event()
+
+        async def slow():
+            started.set()
+            await asyncio.sleep(10)
+
+        async def fast():
+            return [1]
+
+        leader = asyncio.create_task(cache.get_or_load("key", slow))
+        await started.wait()
+        follower = asyncio.create_task(cache.get_or_load("key", slow))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(FlightCancelled):
+            await follower
+        # The key isn't stuck: the next call loads again.
+        value, _ = await cache.get_or_load("key", fast)
+        assert value == [1]
+    asyncio.run(main())